@@ -1,5 +1,12 @@
 from django.contrib import admin
-from .models import Profile, Department
+from .models import (
+    Profile,
+    Department,
+    OutboundEmail,
+    ProfileChangeEvent,
+    SyncJob,
+    SyncJobFailure,
+)
 
 
 @admin.register(Profile)
@@ -167,4 +174,112 @@ class DepartmentAdmin(admin.ModelAdmin):
 
     ordering = (
         "department_code",
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = (
+        "subject",
+        "recipients",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "created_at",
+        "sent_at",
+    )
+
+    list_filter = ("status",)
+
+    search_fields = (
+        "recipients",
+        "subject",
+    )
+
+    # Bodies may hold temporary passwords, so they are never shown here
+    exclude = ("body",)
+    readonly_fields = (
+        "subject",
+        "from_email",
+        "recipients",
+        "attempts",
+        "claimed_at",
+        "last_error",
+        "created_at",
+        "sent_at",
+    )
+
+
+class SyncJobFailureInline(admin.TabularInline):
+    model = SyncJobFailure
+    extra = 0
+    can_delete = False
+    readonly_fields = ("member_id", "error", "attempts", "created_at", "updated_at")
+
+
+@admin.register(SyncJob)
+class SyncJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "status",
+        "position",
+        "created",
+        "updated",
+        "unchanged",
+        "skipped",
+        "started_at",
+        "finished_at",
+    )
+
+    list_filter = ("name", "status")
+
+    readonly_fields = (
+        "name",
+        "options",
+        "position",
+        "checkpoint_member_id",
+        "latest_change",
+        "created",
+        "updated",
+        "unchanged",
+        "skipped",
+        "last_error",
+        "started_at",
+        "updated_at",
+        "finished_at",
+    )
+
+    inlines = [SyncJobFailureInline]
+
+
+@admin.register(ProfileChangeEvent)
+class ProfileChangeEventAdmin(admin.ModelAdmin):
+    list_display = (
+        "event_id",
+        "event_type",
+        "member_id",
+        "status",
+        "attempts",
+        "received_at",
+        "applied_at",
+    )
+
+    list_filter = ("event_type", "status")
+
+    search_fields = (
+        "event_id",
+        "member_id",
+    )
+
+    # Payloads hold personal details, so they are never shown here
+    exclude = ("payload",)
+    readonly_fields = (
+        "event_id",
+        "event_type",
+        "member_id",
+        "attempts",
+        "claimed_at",
+        "last_error",
+        "received_at",
+        "applied_at",
+    )
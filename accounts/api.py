@@ -1,11 +1,21 @@
+import json
 import logging
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from .bulk import BULK_CREATE_MAX_ACCOUNTS, bulk_create_accounts, validate_accounts
 from .models import Profile
+from .webhooks import (
+    SIGNATURE_HEADER,
+    InvalidChangeEvents,
+    parse_change_events,
+    queue_change_events,
+    verify_signature,
+)
 
 # from .serializers import UserProfileSerializer
 from .serializers import (
@@ -75,6 +85,45 @@ class UserProfileCreateAPIView(APIView):
         return Response(response, status=201)
     
 
+# -----------------------------------
+# BULK CREATE Users + Profiles
+# -----------------------------------
+class UserProfileBulkCreateAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        rows = request.data.get("users")
+        skip_existing = bool(request.data.get("skip_existing", False))
+
+        if not isinstance(rows, list) or not rows:
+            return Response({"users": "Expected a non-empty list"}, status=400)
+        if len(rows) > BULK_CREATE_MAX_ACCOUNTS:
+            return Response(
+                {"users": f"At most {BULK_CREATE_MAX_ACCOUNTS} accounts per request"},
+                status=400,
+            )
+        if not all(isinstance(row, dict) for row in rows):
+            return Response({"users": "Every entry must be an object"}, status=400)
+
+        valid, errors, skipped = validate_accounts(rows, skip_existing=skip_existing)
+        if errors:
+            return Response({"errors": errors}, status=400)
+
+        try:
+            summary = bulk_create_accounts(valid)
+        except Exception as e:
+            # The run is one transaction, so nothing was created
+            logger.error(f"BULK CREATE failed: {str(e)}")
+            return Response({"error": str(e), "created": 0}, status=400)
+
+        logger.info(
+            f"BULK CREATE SUCCESS - created={summary['created']}, "
+            f"skipped={len(skipped)}, by={request.user.username}"
+        )
+
+        return Response({**summary, "skipped": skipped}, status=201)
+
+
 # -----------------------------------
 # EDIT / UPDATE User + Profile
 # -----------------------------------
@@ -183,4 +232,37 @@ class UserProfileDeleteAPIView(APIView):
                 "message": "Users deleted successfully"
             },
             status=200
-        )
\ No newline at end of file
+        )
+
+
+# -----------------------------------
+# Directory change webhook
+# -----------------------------------
+class ProfileChangeWebhookAPIView(APIView):
+    # Authenticated by the HMAC signature instead of a session
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        secret = settings.PROFILE_WEBHOOK_SECRET
+        if not secret:
+            return Response({"detail": "Webhook is not configured"}, status=503)
+
+        body = request.body
+        if not verify_signature(body, request.headers.get(SIGNATURE_HEADER, ""), secret):
+            logger.warning(
+                f"PROFILE WEBHOOK - invalid signature from {request.META.get('REMOTE_ADDR')}"
+            )
+            return Response({"detail": "Invalid signature"}, status=401)
+
+        try:
+            rows = parse_change_events(json.loads(body))
+        except (ValueError, InvalidChangeEvents) as e:
+            return Response({"detail": str(e)}, status=400)
+
+        accepted, duplicates = queue_change_events(rows)
+        logger.info(
+            f"PROFILE WEBHOOK - accepted={accepted}, duplicates={duplicates}"
+        )
+
+        return Response({"accepted": accepted, "duplicates": duplicates}, status=202)
@@ -0,0 +1,201 @@
+"""
+Local stand-in for the IMU Azure Functions API, for benchmarks and manual
+testing of the sync commands without touching the real service.
+
+    with AzureStubServer(records=500, latency=0.05) as stub:
+        with override_settings(AZURE_BASE_URL=stub.url):
+            get_imu_student_details()
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def stub_member_id(index):
+    return f"{index:011d}"
+
+
+def stub_employee_code(index):
+    return f"{index:06d}"
+
+
+def stub_last_updated(index):
+    return f"2025-01-01T00:{index // 60 % 60:02d}:{index % 60:02d}"
+
+
+def stub_student(member_id):
+    index = int(member_id)
+    return {
+        "EMPLID": member_id,
+        "LONG_FULL_NAME": f"Student {index}",
+        "STU_EMAIL_ADDR": f"student{index}@student.imu.edu.my",
+        "GENDER": "Female" if index % 2 else "Male",
+        "NRICPSPRT": f"NRIC{index:08d}",
+        "MOBILE": f"01{index % 100000000:08d}",
+        "EMER_PHONE": "",
+        "EMAIL_ADDR": f"student{index}@example.com",
+        "ADDRESS1": f"{index} Jalan Jalil Perkasa",
+        "ADDRESS2": "Bukit Jalil",
+        "ADDRESS3": "",
+        "ADDRESS4": "",
+        "POSTAL": "57000",
+        "CITY": "Kuala Lumpur",
+        "STATEDESCR": "Wilayah Persekutuan",
+        "COUNTRYDESCR": "Malaysia",
+        "CAMPUS": "BJ",
+        "INTAKE": "BM114",
+        "PROG_DESCR": "Bachelor of Science (Hons) Chiropractic",
+        "TRNSCR_DESCR": "Chiropractic",
+        "ADVISOR_NAME": "Advisor",
+        "ADVISOR_EMAIL": "advisor@imu.edu.my",
+        "LASTUPDDTTM": stub_last_updated(index),
+    }
+
+
+def stub_employee(member_id):
+    index = int(member_id)
+    return {
+        "EMPLOYEE_CODE": member_id,
+        "EMP_NAME": f"Employee {index}",
+        "EMAIL": f"employee{index}@imu.edu.my",
+        "ADDRESS1": f"{index} Jalan Jalil Perkasa",
+        "ADDRESS2": "Bukit Jalil",
+        "ADDRESS3": "",
+        "ZIP": "57000",
+        "CITY": "Kuala Lumpur",
+        "STATE_NAME": "Wilayah Persekutuan",
+        "COUNTRY": "Malaysia",
+        "ULOCATION": "BJ",
+        "POSITION": "Clinician",
+        "DEPT_CODE": f"D{index % 5:02d}",
+        "DEPT": f"Department {index % 5}",
+        "BU_NAME": "IMU",
+        "LASTUPDDTTM": stub_last_updated(index),
+    }
+
+
+# path -> (record builder, ID format, returns a single record by EMPLID)
+STUB_ENDPOINTS = {
+    "/StudentProgramInfo": (stub_student, stub_member_id, False),
+    "/StudentProgramInfoById": (stub_student, stub_member_id, True),
+    "/EmployeeInfo": (stub_employee, stub_employee_code, False),
+    "/EmployeeInfoById": (stub_employee, stub_employee_code, True),
+}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    # Buffer headers and body into one write and skip Nagle so keep-alive
+    # connections are not stalled by delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = STUB_ENDPOINTS.get(url.path)
+        server = self.server
+
+        with server.stats_lock:
+            server.request_count += 1
+            fail = server.failures > 0
+            if fail:
+                server.failures -= 1
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if fail:
+            self._send_json(503, {"detail": "Service unavailable"})
+            return
+
+        if endpoint is None:
+            self._send_json(404, {"detail": "Not found"})
+            return
+
+        build, member_id_format, by_id = endpoint
+        if by_id:
+            member_id = parse_qs(url.query).get("EMPLID", [""])[0]
+            self._send_json(200, [build(member_id)] if member_id.isdigit() else [])
+        else:
+            self._send_json_list(
+                build(member_id_format(i)) for i in range(1, server.records + 1)
+            )
+
+    def _send_json(self, status_code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json_list(self, records, batch_size=500):
+        # Chunked transfer encoding, so large listings are never built in
+        # memory on the server side either
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(text):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        batch = []
+        separator = "["
+        for record in records:
+            batch.append(separator + json.dumps(record))
+            separator = ","
+            if len(batch) >= batch_size:
+                write_chunk("".join(batch))
+                batch = []
+
+        write_chunk("".join(batch) + ("]" if separator == "," else "[]"))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AzureStubServer:
+    def __init__(
+        self, records=100, latency=0.0, failures=0, host="127.0.0.1", port=0
+    ):
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.records = records
+        self.httpd.latency = latency
+        # The next `failures` requests are answered with 503
+        self.httpd.failures = failures
+        self.httpd.request_count = 0
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="azure-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
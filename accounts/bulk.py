@@ -0,0 +1,212 @@
+import logging
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import choices
+from .hashing import hash_passwords
+from .models import OutboundEmail, Profile
+from .serializers import PROFILE_FIELDS
+from .services import build_temp_password_email, generate_temp_password
+from .signals import profiles_bulk_synced
+from .sync import load_departments
+
+logger = logging.getLogger("userprofile")
+
+BULK_CREATE_BATCH_SIZE = 500
+BULK_CREATE_MAX_ACCOUNTS = 5000
+
+ROLES = {value for value, _ in choices.ROLE_CHOICES}
+GENDERS = {value for value, _ in choices.GENDER_CHOICES}
+
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def validate_accounts(rows, skip_existing=False):
+    """
+    Check a batch of account rows against each other and the database with
+    three queries. Returns (valid rows, {row index: errors}, skipped usernames).
+    """
+    errors = {}
+    skipped = []
+
+    usernames = [_clean(row.get("username")) for row in rows]
+    emails = [_clean(row.get("email")) for row in rows]
+    member_ids = [
+        _clean(row.get("member_id")) or username
+        for row, username in zip(rows, usernames)
+    ]
+
+    taken_usernames = set(
+        User.objects.filter(username__in=[u for u in usernames if u]).values_list(
+            "username", flat=True
+        )
+    )
+    taken_emails = set(
+        User.objects.filter(email__in=[e for e in emails if e]).values_list(
+            "email", flat=True
+        )
+    )
+    taken_member_ids = set(
+        Profile.objects.filter(
+            member_id__in=[m for m in member_ids if m]
+        ).values_list("member_id", flat=True)
+    )
+
+    valid = []
+    seen = {"username": set(), "email": set(), "member_id": set()}
+    for index, row in enumerate(rows):
+        username, email, member_id = usernames[index], emails[index], member_ids[index]
+        row_errors = {}
+
+        if skip_existing and username in taken_usernames:
+            skipped.append(username)
+            continue
+
+        if not username:
+            row_errors["username"] = "This field is required."
+        elif username in taken_usernames or username in seen["username"]:
+            row_errors["username"] = "Username already exists"
+
+        if not email:
+            row_errors["email"] = "This field is required."
+        elif email in taken_emails or email in seen["email"]:
+            row_errors["email"] = "Email already exists"
+
+        if member_id in taken_member_ids or member_id in seen["member_id"]:
+            row_errors["member_id"] = "Member ID already exists"
+
+        if not row.get("official_name"):
+            row_errors["official_name"] = "This field is required."
+        if row.get("role", "student") not in ROLES:
+            row_errors["role"] = f"Must be one of {', '.join(sorted(ROLES))}"
+        if row.get("gender", "male") not in GENDERS:
+            row_errors["gender"] = f"Must be one of {', '.join(sorted(GENDERS))}"
+
+        if row.get("password"):
+            try:
+                validate_password(row["password"])
+            except ValidationError as e:
+                row_errors["password"] = e.messages
+
+        if row_errors:
+            errors[index] = row_errors
+            continue
+
+        seen["username"].add(username)
+        seen["email"].add(email)
+        seen["member_id"].add(member_id)
+        valid.append(
+            {**row, "username": username, "email": email, "member_id": member_id}
+        )
+
+    return valid, errors, skipped
+
+
+def _profile_fields(row, departments):
+    fields = {
+        field: row[field]
+        for field in PROFILE_FIELDS
+        if field in row and field != "department_code"
+    }
+    fields.setdefault("role", "student")
+    fields.setdefault("gender", "male")
+
+    department = departments.get(row.get("department_code"))
+    if department is not None:
+        fields["department_id"] = department.id
+    return fields
+
+
+def bulk_create_accounts(rows, batch_size=BULK_CREATE_BATCH_SIZE, workers=None):
+    """
+    Create already validated accounts. Passwords are hashed on a process
+    pool before any transaction opens; users, profiles and credential emails
+    are then inserted with bulk_create in batches, all in one transaction so
+    a failure leaves nothing behind and queues no credential emails.
+
+    Rows without a password get a temporary one, sent through the outbox,
+    and must change it on first login. Returns a summary with accounts/sec.
+    """
+    started = time.perf_counter()
+
+    temp_passwords = {}
+    passwords = []
+    for row in rows:
+        if not row.get("password"):
+            temp_passwords[row["username"]] = generate_temp_password()
+        passwords.append(row.get("password") or temp_passwords[row["username"]])
+
+    hashed = hash_passwords(passwords, workers=workers)
+    hashed_at = time.perf_counter()
+
+    departments = load_departments()
+    created_member_ids = []
+
+    # One transaction for the whole run: a failing batch rolls back the
+    # batches before it, so an import is never left half done
+    with transaction.atomic():
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            users = [
+                User(username=row["username"], email=row["email"], password=encoded)
+                for row, encoded in zip(batch, hashed[start : start + batch_size])
+            ]
+
+            # bulk_create skips the post_save signal that would otherwise
+            # create an AUTO-<id> profile for every user
+            User.objects.bulk_create(users, batch_size=batch_size)
+
+            # MySQL does not return primary keys from bulk_create
+            user_ids = dict(
+                User.objects.filter(
+                    username__in=[user.username for user in users]
+                ).values_list("username", "id")
+            )
+            Profile.objects.bulk_create(
+                [
+                    Profile(
+                        user_id=user_ids[row["username"]],
+                        first_time_password_change=row["username"] in temp_passwords,
+                        **_profile_fields(row, departments),
+                    )
+                    for row in batch
+                ],
+                batch_size=batch_size,
+            )
+
+            credentials = [
+                build_temp_password_email(
+                    user, row["official_name"], temp_passwords[user.username]
+                )
+                for user, row in zip(users, batch)
+                if user.username in temp_passwords
+            ]
+            OutboundEmail.objects.bulk_create(credentials, batch_size=batch_size)
+
+            created_member_ids.extend(row["member_id"] for row in batch)
+
+        transaction.on_commit(
+            lambda: profiles_bulk_synced.send(
+                sender=Profile, member_ids=created_member_ids
+            )
+        )
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "created": len(created_member_ids),
+        "credentials_queued": len(temp_passwords),
+        "hash_seconds": round(hashed_at - started, 3),
+        "total_seconds": round(elapsed, 3),
+        "accounts_per_second": round(len(rows) / elapsed, 1) if elapsed else None,
+    }
+    logger.info(
+        "BULK CREATE - "
+        + ", ".join(f"{key}={value}" for key, value in summary.items())
+    )
+    return summary
@@ -0,0 +1,46 @@
+"""
+Password hashing on a process pool. PBKDF2 is CPU-bound and holds the GIL,
+so hashing a cohort's passwords on threads is no faster than doing it
+serially; separate processes use every core.
+
+Kept free of model imports so pool workers start without the app registry.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+
+# Below this many passwords the pool start-up costs more than it saves
+PARALLEL_HASH_THRESHOLD = 8
+
+
+def _hash_chunk(args):
+    passwords, algorithm = args
+    return [make_password(password, hasher=algorithm) for password in passwords]
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    make_password() for every password, in input order.
+    """
+    passwords = list(passwords)
+    workers = min(workers or settings.PASSWORD_HASH_WORKERS, len(passwords))
+    # Resolved here so the workers use the same hasher as this process
+    algorithm = get_hasher().algorithm
+
+    if workers <= 1 or len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return _hash_chunk((passwords, algorithm))
+
+    # A few chunks per worker keeps them busy without one task per password
+    chunk_size = max(len(passwords) // (workers * 4), 1)
+    chunks = [
+        (passwords[start : start + chunk_size], algorithm)
+        for start in range(0, len(passwords), chunk_size)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [
+            encoded
+            for hashed in executor.map(_hash_chunk, chunks)
+            for encoded in hashed
+        ]
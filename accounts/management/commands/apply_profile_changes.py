@@ -0,0 +1,56 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from accounts.webhooks import apply_change_events
+
+logger = logging.getLogger("userprofile")
+
+
+# Apply every queued webhook change, then exit (e.g. from cron)
+# python manage.py apply_profile_changes
+
+# Keep running and poll for new changes every 2 seconds
+# python manage.py apply_profile_changes --loop --interval 2
+class Command(BaseCommand):
+    help = "Apply profile changes received through the directory webhook"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Events applied per batch (default: 500)",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for events instead of exiting when none are left",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=2,
+            help="Seconds between polls with --loop (default: 2)",
+        )
+
+    def handle(self, *args, **options):
+        total_applied = total_failed = 0
+
+        while True:
+            applied, failed = apply_change_events(options["batch_size"])
+            total_applied += applied
+            total_failed += failed
+
+            if applied or failed:
+                logger.info(f"PROFILE CHANGES | applied={applied}, failed={failed}")
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Applied={total_applied}, Failed={total_failed}"
+            )
+        )
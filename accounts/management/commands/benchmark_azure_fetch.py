@@ -0,0 +1,90 @@
+import logging
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from accounts import services
+from accounts.azure_stub import AzureStubServer, stub_member_id
+
+logger = logging.getLogger("userprofile")
+
+
+# Compare by-ID fetch strategies against a local stub of the Azure API
+# python manage.py benchmark_azure_fetch
+
+# 500 IDs, 20ms simulated latency, several pool sizes
+# python manage.py benchmark_azure_fetch --ids 500 --latency 0.02 --workers 1 4 8 16
+class Command(BaseCommand):
+    help = "Benchmark concurrent Azure by-ID fetches against a local stub server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ids",
+            type=int,
+            default=200,
+            help="Number of IDs to fetch (default: 200)",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.02,
+            help="Simulated server latency per request in seconds (default: 0.02)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            nargs="+",
+            default=[1, 4, 8, 16],
+            help="Thread pool sizes to compare (default: 1 4 8 16)",
+        )
+
+    def handle(self, *args, **options):
+        ids = [stub_member_id(i) for i in range(1, options["ids"] + 1)]
+
+        with AzureStubServer(records=len(ids), latency=options["latency"]) as stub:
+            self.stdout.write(
+                f"Stub server {stub.url}: {len(ids)} IDs, "
+                f"{options['latency'] * 1000:.0f}ms latency"
+            )
+
+            results = [("sequential, no session", self._unpooled(stub.url, ids))]
+
+            for workers in options["workers"]:
+                with override_settings(
+                    AZURE_BASE_URL=stub.url, AZURE_MAX_WORKERS=workers
+                ):
+                    services.close_session()
+                    started = time.perf_counter()
+                    records = services.get_imu_student_details(ids)
+                    elapsed = time.perf_counter() - started
+                    services.close_session()
+
+                assert [r["EMPLID"] for r in records] == ids, "results out of order"
+                results.append((f"pooled, {workers} worker(s)", elapsed))
+
+        baseline = results[0][1]
+        for label, elapsed in results:
+            line = (
+                f"{label:<26} {elapsed:8.3f}s  "
+                f"{len(ids) / elapsed:8.1f} req/s  x{baseline / elapsed:.1f}"
+            )
+            logger.info(f"AZURE FETCH BENCHMARK | {line}")
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
+
+    def _unpooled(self, base_url, ids):
+        # The previous implementation: one request (and connection) per ID
+        headers = {"x-functions-key": settings.AZURE_FUNCTION_KEY}
+        started = time.perf_counter()
+        for item_id in ids:
+            response = requests.get(
+                f"{base_url}/StudentProgramInfoById",
+                headers=headers,
+                params={"EMPLID": item_id},
+            )
+            response.raise_for_status()
+        return time.perf_counter() - started
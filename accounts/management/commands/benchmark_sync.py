@@ -0,0 +1,176 @@
+import io
+import logging
+import time
+import tracemalloc
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from accounts import services
+from accounts.azure_stub import AzureStubServer
+from accounts.sync import SYNC_CHUNK_SIZE
+
+logger = logging.getLogger("userprofile")
+
+# Departments first, since the employee sync resolves them
+SYNC_COMMANDS = ["sync_departments", "sync_employee_profile", "sync_student_profile"]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+# Run all three sync commands against a local stub of the Azure API.
+# Everything is rolled back afterwards unless --keep is given.
+# python manage.py benchmark_sync
+
+# 5000 records per directory, 50ms latency, two passes (create, then unchanged)
+# python manage.py benchmark_sync --records 5000 --latency 0.05 --passes 2
+
+# Only the student sync, with a cheap password hasher to isolate sync overhead
+# python manage.py benchmark_sync --commands sync_student_profile --fast-hasher
+class Command(BaseCommand):
+    help = "Benchmark the Azure sync commands against a local stub server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--records",
+            type=int,
+            default=1000,
+            help="Records served per directory listing (default: 1000)",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Simulated server latency per request in seconds (default: 0)",
+        )
+        parser.add_argument(
+            "--commands",
+            nargs="+",
+            choices=SYNC_COMMANDS,
+            default=SYNC_COMMANDS,
+            help="Sync commands to run (default: all three)",
+        )
+        parser.add_argument(
+            "--passes",
+            type=int,
+            default=2,
+            help="Times to run each command; later passes hit the unchanged "
+            "path (default: 2)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=SYNC_CHUNK_SIZE,
+            help=f"Chunk size for the profile syncs (default: {SYNC_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--fast-hasher",
+            action="store_true",
+            help="Hash temporary passwords with MD5 so password hashing does "
+            "not dominate the creation pass",
+        )
+        parser.add_argument(
+            "--skip-memory",
+            action="store_true",
+            help="Do not trace memory (tracemalloc slows Python code down)",
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Commit the synced data instead of rolling it back",
+        )
+
+    def handle(self, *args, **options):
+        if options["passes"] < 1:
+            raise CommandError("--passes must be at least 1.")
+
+        overrides = {}
+        if options["fast_hasher"]:
+            overrides["PASSWORD_HASHERS"] = [
+                "django.contrib.auth.hashers.MD5PasswordHasher"
+            ]
+
+        results = []
+        with AzureStubServer(
+            records=options["records"], latency=options["latency"]
+        ) as stub, override_settings(AZURE_BASE_URL=stub.url, **overrides):
+            self.stdout.write(
+                f"Stub server {stub.url}: {options['records']} records, "
+                f"{options['latency'] * 1000:.0f}ms latency"
+            )
+            services.close_session()
+
+            try:
+                with transaction.atomic():
+                    for run in range(1, options["passes"] + 1):
+                        for name in options["commands"]:
+                            results.append(
+                                (run, name, *self._measure(stub, name, options))
+                            )
+                    if not options["keep"]:
+                        # on_commit work (outbox, progress refresh) is skipped
+                        # along with the data
+                        raise _Rollback
+            except _Rollback:
+                pass
+            finally:
+                services.close_session()
+
+        self.stdout.write(
+            f"{'pass':<5}{'command':<24}{'time':>10}{'records/s':>12}"
+            f"{'queries':>10}{'requests':>10}{'peak MB':>10}"
+        )
+        for run, name, records, elapsed, queries, requests, peak in results:
+            line = (
+                f"{run:<5}{name:<24}{elapsed:9.3f}s{records / elapsed:12.1f}"
+                f"{queries:10d}{requests:10d}"
+                f"{'-' if peak is None else f'{peak / 1024 / 1024:.1f}':>10}"
+            )
+            logger.info(f"SYNC BENCHMARK | {line}")
+            self.stdout.write(line)
+
+        if not options["keep"]:
+            self.stdout.write("Synced data rolled back.")
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
+
+    def _measure(self, stub, name, options):
+        command_options = {"stdout": io.StringIO()}
+        if name != "sync_departments":
+            command_options["chunk_size"] = options["chunk_size"]
+
+        counter = _QueryCounter()
+        requests_before = stub.request_count
+        trace = not options["skip_memory"]
+
+        if trace:
+            tracemalloc.start()
+        try:
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                call_command(name, **command_options)
+                elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace else None
+        finally:
+            if trace:
+                tracemalloc.stop()
+
+        return (
+            stub.httpd.records,
+            elapsed,
+            counter.count,
+            stub.request_count - requests_before,
+            peak,
+        )
@@ -0,0 +1,83 @@
+import csv
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.bulk import BULK_CREATE_BATCH_SIZE, bulk_create_accounts, validate_accounts
+
+logger = logging.getLogger("userprofile")
+
+BOOLEAN_COLUMNS = {"is_admin"}
+
+
+# Create accounts from a CSV with a header row. Required columns: username,
+# email, official_name. Optional: password, member_id (defaults to the
+# username), and any profile field (role, gender, cohort_code,
+# department_code, ...). Rows without a password get a temporary one by email.
+# python manage.py bulk_create_accounts new_cohort.csv
+
+# Leave out usernames that already exist instead of failing
+# python manage.py bulk_create_accounts new_cohort.csv --skip-existing --workers 8
+class Command(BaseCommand):
+    help = "Bulk create users and profiles from a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", help="Path to the CSV file")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BULK_CREATE_BATCH_SIZE,
+            help=f"Accounts inserted per transaction (default: {BULK_CREATE_BATCH_SIZE})",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Password hashing processes (default: PASSWORD_HASH_WORKERS)",
+        )
+        parser.add_argument(
+            "--skip-existing",
+            action="store_true",
+            help="Skip rows whose username already exists.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_file"], newline="", encoding="utf-8-sig") as f:
+                rows = [self._row(row) for row in csv.DictReader(f)]
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['csv_file']}: {e}")
+
+        if not rows:
+            raise CommandError("The CSV file has no rows.")
+
+        valid, errors, skipped = validate_accounts(
+            rows, skip_existing=options["skip_existing"]
+        )
+        if errors:
+            for index, row_errors in errors.items():
+                # +2: header row, and line numbers start at 1
+                self.stderr.write(f"Line {index + 2}: {row_errors}")
+            raise CommandError(f"{len(errors)} invalid row(s), nothing created.")
+
+        summary = bulk_create_accounts(
+            valid, batch_size=options["batch_size"], workers=options["workers"]
+        )
+
+        self.stdout.write(
+            f"Hashing {summary['hash_seconds']}s, "
+            f"total {summary['total_seconds']}s, "
+            f"{summary['accounts_per_second']} accounts/s"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Created={summary['created']}, Skipped={len(skipped)}, "
+                f"Credentials queued={summary['credentials_queued']}"
+            )
+        )
+
+    def _row(self, row):
+        # Empty cells mean "not given"
+        cleaned = {key.strip(): value.strip() for key, value in row.items() if key and value}
+        for column in BOOLEAN_COLUMNS & cleaned.keys():
+            cleaned[column] = cleaned[column].lower() in ("1", "true", "yes")
+        return cleaned
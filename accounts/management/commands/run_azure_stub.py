@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from accounts.azure_stub import AzureStubServer
+
+
+# Serve synthetic StudentProgramInfo / EmployeeInfo data locally, then point
+# AZURE_BASE_URL at the printed URL to run the sync commands against it
+# python manage.py run_azure_stub --records 5000 --latency 0.05 --port 8765
+class Command(BaseCommand):
+    help = "Run a local stub of the IMU Azure API until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--records",
+            type=int,
+            default=1000,
+            help="Records served per directory listing (default: 1000)",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Simulated server latency per request in seconds (default: 0)",
+        )
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+
+    def handle(self, *args, **options):
+        stub = AzureStubServer(
+            records=options["records"],
+            latency=options["latency"],
+            host=options["host"],
+            port=options["port"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Azure stub serving {options['records']} records at {stub.url} "
+                "(Ctrl+C to stop)"
+            )
+        )
+        try:
+            stub.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.httpd.server_close()
+            self.stdout.write(f"Stopped after {stub.request_count} requests")
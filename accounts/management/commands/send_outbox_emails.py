@@ -0,0 +1,57 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from imu_chiropractic_form.outbound import log_metrics
+from accounts.outbox import send_outbox_batch
+
+logger = logging.getLogger("userprofile")
+
+
+# Send everything that is due, then exit (e.g. from cron)
+# python manage.py send_outbox_emails
+
+# Keep running and poll the outbox every 10 seconds
+# python manage.py send_outbox_emails --loop --interval 10
+class Command(BaseCommand):
+    help = "Deliver queued emails from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Emails sent per SMTP connection (default: 50)",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting when it is empty",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10,
+            help="Seconds between polls with --loop (default: 10)",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+
+        while True:
+            sent, failed = send_outbox_batch(options["batch_size"])
+            total_sent += sent
+            total_failed += failed
+
+            if sent or failed:
+                logger.info(f"OUTBOX BATCH | sent={sent}, failed={failed}")
+                continue
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+        log_metrics()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Done. Sent={total_sent}, Failed={total_failed}")
+        )
@@ -0,0 +1,73 @@
+import json
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.azure_stub import stub_employee, stub_student
+from accounts.models import ProfileChangeEvent
+from accounts.webhooks import SIGNATURE_HEADER, sign_payload
+
+
+# Local sender for the profile webhook, posting synthetic directory records
+# signed with PROFILE_WEBHOOK_SECRET
+# python manage.py send_profile_webhook --students 00000000001 00000000002
+
+# Rename the records so the receiver sees a change
+# python manage.py send_profile_webhook --employees 000001 --rename "Dr Test"
+
+# Another server
+# python manage.py send_profile_webhook --students 00000000001 --url https://example.test/accounts/api/profile-webhook/
+class Command(BaseCommand):
+    help = "Send signed test events to the profile change webhook"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000/accounts/api/profile-webhook/",
+            help="Webhook URL (default: the local development server)",
+        )
+        parser.add_argument("--students", nargs="*", default=[], help="Student IDs")
+        parser.add_argument("--employees", nargs="*", default=[], help="Employee codes")
+        parser.add_argument(
+            "--rename",
+            help="Official name to put on every record, to force an update",
+        )
+
+    def handle(self, *args, **options):
+        secret = settings.PROFILE_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError("PROFILE_WEBHOOK_SECRET is not set.")
+        if not options["students"] and not options["employees"]:
+            raise CommandError("Give at least one --students or --employees ID.")
+
+        events = []
+        for event_type, build, ids, name_key in [
+            (ProfileChangeEvent.STUDENT, stub_student, options["students"], "LONG_FULL_NAME"),
+            (ProfileChangeEvent.EMPLOYEE, stub_employee, options["employees"], "EMP_NAME"),
+        ]:
+            for member_id in ids:
+                record = build(member_id)
+                if options["rename"]:
+                    record[name_key] = options["rename"]
+                events.append(
+                    {"id": str(uuid.uuid4()), "type": event_type, "record": record}
+                )
+
+        body = json.dumps({"events": events}).encode()
+        response = requests.post(
+            options["url"],
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                SIGNATURE_HEADER: sign_payload(body, secret),
+            },
+            timeout=10,
+        )
+
+        self.stdout.write(f"{response.status_code} {response.text}")
+        if not response.ok:
+            raise CommandError("The webhook rejected the events.")
+
+        self.stdout.write(self.style.SUCCESS(f"Sent {len(events)} event(s)"))
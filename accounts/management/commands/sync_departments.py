@@ -1,7 +1,8 @@
 import logging
 from django.core.management.base import BaseCommand
+from imu_chiropractic_form.outbound import log_metrics
 from accounts.models import Department
-from accounts.services import get_imu_employee_details
+from accounts.services import iter_imu_employee_details
 
 logger = logging.getLogger("userprofile")
 
@@ -9,11 +10,12 @@ class Command(BaseCommand):
     help = "Sync departments from IMU API"
 
     def handle(self, *args, **kwargs):
-        employees = get_imu_employee_details()
-        logger.info(f"Retrieved {len(employees)} employee records from IMU API.")
         created_count = 0
+        employee_count = 0
 
-        for emp in employees:
+        # Streamed, so the employee directory is never held in memory at once
+        for emp in iter_imu_employee_details():
+            employee_count += 1
             dept_code = emp.get("DEPT_CODE")
             dept_name = emp.get("DEPT")
 
@@ -37,6 +39,10 @@ class Command(BaseCommand):
                     department.department_code,
                 )
 
+        logger.info(f"Retrieved {employee_count} employee records from IMU API.")
+
+        log_metrics()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f"Sync completed. {created_count} new departments created."
@@ -1,18 +1,28 @@
 import logging
 
-from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
-from accounts.models import Department, Profile
-from accounts.services import (
-    generate_temp_password,
-    send_temp_password_email,
-    get_imu_employee_details,
+from accounts.models import SyncJob
+from accounts.services import get_imu_employee_details, iter_imu_employee_details
+from accounts.sync import (
+    SYNC_CHUNK_SIZE,
+    ProfileSyncPipeline,
+    SyncCheckpointMismatch,
+    diff_report_lines,
+    employee_profile_fields,
+    finish_sync_job,
+    get_sync_watermark,
+    load_departments,
+    parse_since,
+    save_sync_watermark,
+    start_sync_job,
 )
+from imu_chiropractic_form.outbound import log_metrics
 
 logger = logging.getLogger("userprofile")
 
+SYNC_NAME = "sync_employee_profile"
+
 
 # Sync all employees
 # python manage.py sync_employee_profile
@@ -23,6 +33,15 @@ logger = logging.getLogger("userprofile")
 
 # Sync multiple employees
 # python manage.py sync_employee_profile 003834 003835 003836
+
+# Only records changed upstream since the last successful run
+# python manage.py sync_employee_profile --incremental
+
+# Show field-level changes without saving
+# python manage.py sync_employee_profile --dry-run
+
+# Continue an interrupted run and retry the records that failed
+# python manage.py sync_employee_profile --resume
 class Command(BaseCommand):
     help = "Sync IMU employees into User and Profile models"
 
@@ -57,9 +76,35 @@ class Command(BaseCommand):
             help="Run the sync without saving changes.",
         )
 
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=SYNC_CHUNK_SIZE,
+            help=f"Records written per batch (default: {SYNC_CHUNK_SIZE}).",
+        )
+        parser.add_argument(
+            "--since",
+            type=parse_since,
+            help="Only process records changed upstream after this date/time.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only process records changed upstream since the last run.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the last unfinished run from its checkpoint, with its "
+            "original options, and retry its failed records.",
+        )
+
     def handle(self, *args, **options):
+        job = None
+        if options["resume"]:
+            job = self._resume(options)
+
         employee_ids = options.get("employee_ids") or []
-        employee_ids_set = set(employee_ids)
         role = options["role"]
 
         create_only = options["create_only"]
@@ -71,141 +116,133 @@ class Command(BaseCommand):
                 "--create-only and --update-only cannot be used together."
             )
 
+        # Only a run over every record may move the incremental watermark:
+        # one limited to some IDs, or to creates or updates, skips changes
+        # that the next --incremental run would then never see
+        full_run = not (employee_ids or create_only or update_only)
+
+        since = options["since"]
+        if options["incremental"]:
+            if since:
+                raise CommandError("--since and --incremental cannot be used together.")
+            since = get_sync_watermark(SYNC_NAME)
+
+        if job is None and not dry_run:
+            job = start_sync_job(
+                SYNC_NAME,
+                options={
+                    "employee_ids": employee_ids,
+                    "role": role,
+                    "create_only": create_only,
+                    "update_only": update_only,
+                    "since": since.isoformat() if since else None,
+                },
+            )
+
         logger.info(
-            "Employee sync started. Filter=%s",
+            "Employee sync started. Filter=%s Job=%s",
             ", ".join(employee_ids) if employee_ids else "ALL",
+            job.pk if job else "-",
         )
 
-        # Get data
-        employees = get_imu_employee_details(employee_ids)
-
-        created_count = 0
-        updated_count = 0
-        skipped_count = 0
-
-        logger.info("Retrieved %s employee records from IMU API.", len(employees))
-
-        for emp in employees:
-            emp_code = emp.get("EMPLOYEE_CODE")
-
-            if not emp_code:
-                skipped_count += 1
-                logger.warning("Skipping record with missing EMPLOYEE_CODE")
-                continue
-
-            if employee_ids and emp_code not in employee_ids_set:
-                continue
-
-            try:
-                with transaction.atomic():
-                    department = Department.objects.filter(
-                        department_code=emp.get("DEPT_CODE")
-                    ).first()
-
-                    profile = (
-                        Profile.objects.filter(member_id=emp_code)
-                        .select_related("user")
-                        .first()
-                    )
-
-                    # Existing user
-                    if profile:
-                        if create_only:
-                            skipped_count += 1
-                            logger.info(
-                                "SKIPPED (already exists) - member_id=%s",
-                                emp_code,
-                            )
-                            continue
-
-                        user = profile.user
-                        created = False
-
-                    # New user
-                    else:
-                        if update_only:
-                            skipped_count += 1
-                            logger.info(
-                                "SKIPPED (user does not exist) - member_id=%s",
-                                emp_code,
-                            )
-                            continue
-
-                        temp_password = generate_temp_password()
-
-                        user = User(
-                            username=emp_code,
-                            email=emp.get("EMAIL") or "",
-                        )
-                        user.set_password(temp_password)
-
-                        if not dry_run:
-                            user.save()
-                            send_temp_password_email(
-                                user,
-                                emp["EMP_NAME"],
-                                temp_password,
-                            )
-                        created = True
-
-                    user.email = emp.get("EMAIL") or ""
-
-                    if not dry_run:
-                        user.save()
-
-                        profile, _ = Profile.objects.update_or_create(
-                            user=user,
-                            defaults={
-                                "member_id": emp_code,
-                                "official_name": emp.get("EMP_NAME", ""),
-                                "role": role,
-                                "personal_email": emp.get("EMAIL", ""),
-                                "address_1": emp.get("ADDRESS1"),
-                                "address_2": emp.get("ADDRESS2"),
-                                "address_3": emp.get("ADDRESS3"),
-                                "postal_code": emp.get("ZIP"),
-                                "city": emp.get("CITY"),
-                                "state": emp.get("STATE_NAME"),
-                                "country": emp.get("COUNTRY"),
-                                "location": emp.get("ULOCATION"),
-                                "position": emp.get("POSITION"),
-                                "department": department,
-                                "business_unit": emp.get("BU_NAME"),
-                            },
-                        )
-
-                    if created:
-                        if not dry_run:
-                            profile.first_time_password_change = True
-                            profile.save(update_fields=["first_time_password_change"])
-
-                        created_count += 1
-                        logger.info(
-                            "USER CREATED - username=%s member_id=%s",
-                            user.username,
-                            emp_code,
-                        )
-                    else:
-                        updated_count += 1
-                        logger.info(
-                            "USER UPDATED - username=%s member_id=%s",
-                            user.username,
-                            emp_code,
-                        )
-
-            except Exception:
-                skipped_count += 1
-                logger.exception("Failed to sync employee %s", emp_code)
+        pipeline = ProfileSyncPipeline(
+            member_id_key="EMPLOYEE_CODE",
+            email_key="EMAIL",
+            name_key="EMP_NAME",
+            profile_fields=employee_profile_fields,
+            # Departments are resolved from memory instead of once per employee
+            context={"role": role, "departments": load_departments()},
+            create_only=create_only,
+            update_only=update_only,
+            dry_run=dry_run,
+            chunk_size=options["chunk_size"],
+            since=since,
+            job=job,
+            # Upstream has no gender for employees; new profiles keep the
+            # default the accounts.signals profile used to give them
+            create_defaults={"gender": "male"},
+        )
+
+        try:
+            if pipeline.pending_failures:
+                logger.info(
+                    "Retrying %s failed employee records.", len(pipeline.pending_failures)
+                )
+                pipeline.retry_failures(
+                    get_imu_employee_details(sorted(pipeline.pending_failures))
+                )
+
+            # The full listing is streamed and processed chunk by chunk
+            if employee_ids:
+                employees = get_imu_employee_details(employee_ids)
+                logger.info("Retrieved %s employee records from IMU API.", len(employees))
+            else:
+                employees = iter_imu_employee_details()
+
+            counts = pipeline.run(employees, member_ids=employee_ids)
+        except SyncCheckpointMismatch as exc:
+            finish_sync_job(job, exc)
+            raise CommandError(
+                f"Cannot resume: the upstream order changed ({exc}). "
+                "Run the sync again without --resume."
+            )
+        except BaseException as exc:
+            if job is not None:
+                finish_sync_job(job, exc)
+            raise
+
+        logger.info("Processed %s employee records from IMU API.", pipeline.received)
+
+        if dry_run:
+            for line in diff_report_lines(pipeline.diffs):
+                self.stdout.write(line)
+        elif finish_sync_job(job).status == SyncJob.COMPLETED:
+            if full_run:
+                save_sync_watermark(SYNC_NAME, pipeline.latest_change)
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{job.failures.count()} record(s) failed. "
+                    "Retry them with --resume."
+                )
+            )
 
         logger.info(
-            "Employee sync completed. Created=%s Updated=%s Skipped=%s",
-            created_count,
-            updated_count,
-            skipped_count,
+            "Employee sync completed. Created=%s Updated=%s Unchanged=%s Skipped=%s",
+            counts["created"],
+            counts["updated"],
+            counts["unchanged"],
+            counts["skipped"],
         )
 
+        log_metrics()
+
         self.stdout.write(
             self.style.SUCCESS(
-                f"Done. Created={created_count}, Updated={updated_count}, Skipped={skipped_count}"
+                f"Done. Created={counts['created']}, Updated={counts['updated']}, "
+                f"Unchanged={counts['unchanged']}, Skipped={counts['skipped']}"
             )
         )
+
+    def _resume(self, options):
+        if (
+            options["employee_ids"]
+            or options["create_only"]
+            or options["update_only"]
+            or options["dry_run"]
+            or options["since"]
+            or options["incremental"]
+        ):
+            raise CommandError(
+                "--resume reuses the options of the run being resumed and "
+                "cannot be combined with other filters."
+            )
+
+        job = start_sync_job(SYNC_NAME, resume=True)
+        if job is None:
+            raise CommandError("There is no unfinished employee sync to resume.")
+
+        options.update(job.options)
+        if options["since"]:
+            options["since"] = parse_since(options["since"])
+        return job
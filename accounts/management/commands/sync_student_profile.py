@@ -1,18 +1,27 @@
 import logging
 
-from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 
-from accounts.models import Profile
-from accounts.services import (
-    generate_temp_password,
-    get_imu_student_details,
-    send_temp_password_email,
+from accounts.models import SyncJob
+from accounts.services import get_imu_student_details, iter_imu_student_details
+from accounts.sync import (
+    SYNC_CHUNK_SIZE,
+    ProfileSyncPipeline,
+    SyncCheckpointMismatch,
+    diff_report_lines,
+    finish_sync_job,
+    get_sync_watermark,
+    parse_since,
+    save_sync_watermark,
+    start_sync_job,
+    student_profile_fields,
 )
+from imu_chiropractic_form.outbound import log_metrics
 
 logger = logging.getLogger("userprofile")
 
+SYNC_NAME = "sync_student_profile"
+
 
 # Sync all students
 # python manage.py sync_student_profile
@@ -23,6 +32,15 @@ logger = logging.getLogger("userprofile")
 
 # Sync multiple students
 # python manage.py sync_student_profile 00000051843 00000051844 00000051845
+
+# Only records changed upstream since the last successful run
+# python manage.py sync_student_profile --incremental
+
+# Show field-level changes without saving
+# python manage.py sync_student_profile --dry-run
+
+# Continue an interrupted run and retry the records that failed
+# python manage.py sync_student_profile --resume
 class Command(BaseCommand):
     help = "Sync IMU students into User and Profile models"
 
@@ -48,10 +66,35 @@ class Command(BaseCommand):
             action="store_true",
             help="Run the sync without saving changes.",
         )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=SYNC_CHUNK_SIZE,
+            help=f"Records written per batch (default: {SYNC_CHUNK_SIZE}).",
+        )
+        parser.add_argument(
+            "--since",
+            type=parse_since,
+            help="Only process records changed upstream after this date/time.",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only process records changed upstream since the last run.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue the last unfinished run from its checkpoint, with its "
+            "original options, and retry its failed records.",
+        )
 
     def handle(self, *args, **options):
+        job = None
+        if options["resume"]:
+            job = self._resume(options)
+
         student_ids = options.get("student_ids") or []
-        student_ids_set = set(student_ids)
 
         create_only = options["create_only"]
         update_only = options["update_only"]
@@ -62,146 +105,127 @@ class Command(BaseCommand):
                 "--create-only and --update-only cannot be used together."
             )
 
+        # Only a run over every record may move the incremental watermark:
+        # one limited to some IDs, or to creates or updates, skips changes
+        # that the next --incremental run would then never see
+        full_run = not (student_ids or create_only or update_only)
+
+        since = options["since"]
+        if options["incremental"]:
+            if since:
+                raise CommandError("--since and --incremental cannot be used together.")
+            since = get_sync_watermark(SYNC_NAME)
+
+        if job is None and not dry_run:
+            job = start_sync_job(
+                SYNC_NAME,
+                options={
+                    "student_ids": student_ids,
+                    "create_only": create_only,
+                    "update_only": update_only,
+                    "since": since.isoformat() if since else None,
+                },
+            )
+
         logger.info(
-            "Student sync started. Filter=%s",
+            "Student sync started. Filter=%s Job=%s",
             ", ".join(student_ids) if student_ids else "ALL",
+            job.pk if job else "-",
         )
 
-        students = get_imu_student_details(student_ids)
-
-        created_count = 0
-        updated_count = 0
-        skipped_count = 0
-
-        logger.info("Retrieved %s student records from IMU API.", len(students))
-
-        gender_map = {
-            "Male": "male",
-            "Female": "female",
-        }
-
-        for student in students:
-            member_id = student.get("EMPLID")
-
-            if not member_id:
-                skipped_count += 1
-                logger.warning("Skipping record with missing EMPLID")
-                continue
-
-            if student_ids and member_id not in student_ids_set:
-                continue
-
-            try:
-                with transaction.atomic():
-                    profile = (
-                        Profile.objects.filter(member_id=member_id)
-                        .select_related("user")
-                        .first()
-                    )
-
-                    # Existing user
-                    if profile:
-                        if create_only:
-                            skipped_count += 1
-                            logger.info(
-                                "SKIPPED (already exists) - member_id=%s",
-                                member_id,
-                            )
-                            continue
-
-                        user = profile.user
-                        created = False
-
-                    # New user
-                    else:
-                        if update_only:
-                            skipped_count += 1
-                            logger.info(
-                                "SKIPPED (user does not exist) - member_id=%s",
-                                member_id,
-                            )
-                            continue
-
-                        temp_password = generate_temp_password()
-
-                        user = User.objects.create_user(
-                            username=member_id,
-                            email=student.get("STU_EMAIL_ADDR") or "",
-                        )
-
-                        user.set_password(temp_password)
-
-                        if not dry_run:
-                            user.save()
-                            send_temp_password_email(
-                                user, student["LONG_FULL_NAME"], temp_password
-                            )
-
-                        created = True
-
-                    user.email = student.get("STU_EMAIL_ADDR") or ""
-
-                    if not dry_run:
-                        user.save()
-
-                        profile, _ = Profile.objects.update_or_create(
-                            user=user,
-                            defaults={
-                                "member_id": member_id,
-                                "official_name": student.get("LONG_FULL_NAME", ""),
-                                "role": "student",
-                                "gender": gender_map.get(student.get("GENDER")),
-                                "nricpsprt": student.get("NRICPSPRT"),
-                                "phone": student.get("MOBILE"),
-                                "emergency_contact": student.get("EMER_PHONE"),
-                                "personal_email": student.get("EMAIL_ADDR"),
-                                "address_1": student.get("ADDRESS1"),
-                                "address_2": student.get("ADDRESS2"),
-                                "address_3": student.get("ADDRESS3"),
-                                "address_4": student.get("ADDRESS4"),
-                                "postal_code": student.get("POSTAL"),
-                                "city": student.get("CITY"),
-                                "state": student.get("STATEDESCR"),
-                                "country": student.get("COUNTRYDESCR"),
-                                "location": student.get("CAMPUS"),
-                                "cohort_code": student.get("INTAKE"),
-                                "program_description": student.get("PROG_DESCR"),
-                                "transcript_description": student.get("TRNSCR_DESCR"),
-                                "advisor_name": student.get("ADVISOR_NAME"),
-                                "advisor_email": student.get("ADVISOR_EMAIL"),
-                            },
-                        )
-
-                    if created:
-                        profile.first_time_password_change = True
-                        profile.save(update_fields=["first_time_password_change"])
-                        created_count += 1
-                        logger.info(
-                            "USER CREATED - username=%s member_id=%s role=student",
-                            user.username,
-                            member_id,
-                        )
-                    else:
-                        updated_count += 1
-                        logger.info(
-                            "USER UPDATED - username=%s member_id=%s role=student",
-                            user.username,
-                            member_id,
-                        )
-
-            except Exception:
-                skipped_count += 1
-                logger.exception("Failed to sync student %s", member_id)
+        pipeline = ProfileSyncPipeline(
+            member_id_key="EMPLID",
+            email_key="STU_EMAIL_ADDR",
+            name_key="LONG_FULL_NAME",
+            profile_fields=student_profile_fields,
+            create_only=create_only,
+            update_only=update_only,
+            dry_run=dry_run,
+            chunk_size=options["chunk_size"],
+            since=since,
+            job=job,
+        )
+
+        try:
+            if pipeline.pending_failures:
+                logger.info(
+                    "Retrying %s failed student records.", len(pipeline.pending_failures)
+                )
+                pipeline.retry_failures(
+                    get_imu_student_details(sorted(pipeline.pending_failures))
+                )
+
+            # The full listing is streamed and processed chunk by chunk
+            if student_ids:
+                students = get_imu_student_details(student_ids)
+                logger.info("Retrieved %s student records from IMU API.", len(students))
+            else:
+                students = iter_imu_student_details()
+
+            counts = pipeline.run(students, member_ids=student_ids)
+        except SyncCheckpointMismatch as exc:
+            finish_sync_job(job, exc)
+            raise CommandError(
+                f"Cannot resume: the upstream order changed ({exc}). "
+                "Run the sync again without --resume."
+            )
+        except BaseException as exc:
+            if job is not None:
+                finish_sync_job(job, exc)
+            raise
+
+        logger.info("Processed %s student records from IMU API.", pipeline.received)
+
+        if dry_run:
+            for line in diff_report_lines(pipeline.diffs):
+                self.stdout.write(line)
+        elif finish_sync_job(job).status == SyncJob.COMPLETED:
+            if full_run:
+                save_sync_watermark(SYNC_NAME, pipeline.latest_change)
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{job.failures.count()} record(s) failed. "
+                    "Retry them with --resume."
+                )
+            )
 
         logger.info(
-            "Student sync completed. Created=%s Updated=%s Skipped=%s",
-            created_count,
-            updated_count,
-            skipped_count,
+            "Student sync completed. Created=%s Updated=%s Unchanged=%s Skipped=%s",
+            counts["created"],
+            counts["updated"],
+            counts["unchanged"],
+            counts["skipped"],
         )
 
+        log_metrics()
+
         self.stdout.write(
             self.style.SUCCESS(
-                f"Done. Created={created_count}, Updated={updated_count}, Skipped={skipped_count}"
+                f"Done. Created={counts['created']}, Updated={counts['updated']}, "
+                f"Unchanged={counts['unchanged']}, Skipped={counts['skipped']}"
             )
         )
+
+    def _resume(self, options):
+        if (
+            options["student_ids"]
+            or options["create_only"]
+            or options["update_only"]
+            or options["dry_run"]
+            or options["since"]
+            or options["incremental"]
+        ):
+            raise CommandError(
+                "--resume reuses the options of the run being resumed and "
+                "cannot be combined with other filters."
+            )
+
+        job = start_sync_job(SYNC_NAME, resume=True)
+        if job is None:
+            raise CommandError("There is no unfinished student sync to resume.")
+
+        options.update(job.options)
+        if options["since"]:
+            options["since"] = parse_since(options["since"])
+        return job
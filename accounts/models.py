@@ -93,8 +93,188 @@ class Profile(models.Model):
     profile_log = models.TextField(blank=True, null=True)
     is_locked = models.BooleanField(default=False)
 
+    # SHA-256 of the upstream record as last synced, see accounts.sync
+    sync_fingerprint = models.CharField(max_length=64, blank=True, default="", editable=False)
+    synced_at = models.DateTimeField(blank=True, null=True, editable=False)
+
     class Meta:
         ordering = ["official_name"]
 
     def __str__(self):
         return f"{self.member_id} - {self.official_name}"
+
+
+class SyncState(models.Model):
+    """
+    Upstream change watermark per sync command, used by --incremental.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField(blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.watermark}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Transactional email outbox. Rows are written in the same transaction as
+    the change that triggers them and delivered by `send_outbox_emails`.
+    """
+
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    subject = models.CharField(max_length=255)
+    # Cleared once sent: bodies can carry temporary passwords and reset links
+    body = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254)
+    recipients = models.TextField(help_text="Comma-separated recipient addresses")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipients} ({self.status})"
+
+
+class SyncJob(models.Model):
+    """
+    One run of a profile sync command. The stream position is checkpointed
+    after every chunk so an interrupted run can be resumed with --resume.
+    """
+
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (RUNNING, "Running"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    )
+
+    name = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+
+    # Command options the run was started with, reused on resume
+    options = models.JSONField(default=dict, blank=True)
+
+    # Checkpoint: records consumed from the upstream stream, and the ID of
+    # the last one so a changed upstream order is detected on resume
+    position = models.PositiveIntegerField(default=0)
+    checkpoint_member_id = models.CharField(max_length=50, blank=True, default="")
+    latest_change = models.DateTimeField(blank=True, null=True)
+
+    created = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-started_at"]
+        indexes = [
+            models.Index(fields=["name", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class SyncJobFailure(models.Model):
+    """
+    A record that could not be synced. Retried by ID when the job resumes.
+    """
+
+    job = models.ForeignKey(SyncJob, on_delete=models.CASCADE, related_name="failures")
+    member_id = models.CharField(max_length=50)
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=1)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["member_id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "member_id"], name="unique_sync_job_failure"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.job} - {self.member_id}"
+
+
+class ProfileChangeEvent(models.Model):
+    """
+    A directory record pushed to the profile webhook, queued until
+    `apply_profile_changes` upserts it through the sync pipeline.
+    """
+
+    PENDING = "pending"
+    APPLYING = "applying"
+    APPLIED = "applied"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (APPLYING, "Applying"),
+        (APPLIED, "Applied"),
+        (FAILED, "Failed"),
+    )
+
+    STUDENT = "StudentProgramInfo"
+    EMPLOYEE = "EmployeeInfo"
+    EVENT_TYPE_CHOICES = (
+        (STUDENT, "Student"),
+        (EMPLOYEE, "Employee"),
+    )
+
+    # Sender's event ID, so redelivered events are only queued once
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES)
+    member_id = models.CharField(max_length=50)
+    # Cleared once applied: records carry personal details
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, default="")
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    applied_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-received_at"]
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.member_id} ({self.status})"
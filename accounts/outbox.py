@@ -0,0 +1,234 @@
+import logging
+import random
+import smtplib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from imu_chiropractic_form.outbound import CircuitOpenError, get_upstream
+
+from .models import OutboundEmail
+
+logger = logging.getLogger("userprofile")
+
+
+def build_email(subject, message, recipient_list, from_email=None):
+    """
+    Unsaved outbox row, for callers that bulk_create several at once.
+    """
+    return OutboundEmail(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=",".join(recipient_list),
+        next_attempt_at=timezone.now(),
+    )
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """
+    Drop-in replacement for send_mail: the email is stored in the outbox and
+    only goes out if the surrounding transaction commits.
+    """
+    email = build_email(subject, message, recipient_list, from_email)
+    email.save()
+    return email
+
+
+# -----------------------------
+# SMTP calls
+# -----------------------------
+def _is_transient(exc):
+    # A rejected recipient or message is not an outage
+    if isinstance(exc, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)):
+        return False
+    if isinstance(exc, smtplib.SMTPDataError) and exc.smtp_code >= 500:
+        return False
+    return isinstance(exc, OSError)
+
+
+def _smtp():
+    # Retries stay with the outbox backoff; the shared layer adds the
+    # deadline and the circuit breaker
+    return get_upstream(
+        "smtp",
+        retries=0,
+        deadline=settings.EMAIL_DEADLINE,
+        failure_threshold=settings.EMAIL_CIRCUIT_THRESHOLD,
+        reset_timeout=settings.EMAIL_CIRCUIT_RESET_TIMEOUT,
+        is_transient=_is_transient,
+    )
+
+
+def _open_connection(connection):
+    def attempt(deadline):
+        connection.timeout = deadline.timeout(settings.EMAIL_TIMEOUT)
+        connection.open()
+
+    _smtp().call(attempt)
+
+
+def _send_message(message):
+    def attempt(deadline):
+        # Bound every socket operation of this message by what is left
+        smtp = getattr(message.connection, "connection", None)
+        sock = getattr(smtp, "sock", None)
+        if sock is not None:
+            sock.settimeout(deadline.timeout(settings.EMAIL_TIMEOUT))
+        message.send()
+
+    _smtp().call(attempt)
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+def _claim_batch(batch_size):
+    now = timezone.now()
+    # Rows left in "sending" by a worker that died are picked up again
+    stale = now - timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+                | Q(status=OutboundEmail.SENDING, claimed_at__lt=stale)
+            )
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=ids).update(
+            status=OutboundEmail.SENDING, claimed_at=now
+        )
+
+    return list(OutboundEmail.objects.filter(id__in=ids).order_by("id"))
+
+
+def _retry_delay(attempts):
+    # Exponential backoff with +/-20% jitter so failed batches spread out
+    delay = settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _mark_failed_attempt(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    email.claimed_at = None
+
+    update_fields = ["attempts", "last_error", "claimed_at", "status", "next_attempt_at"]
+
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboundEmail.FAILED
+        # Never sent, so the temporary password it may carry is not kept
+        email.body = ""
+        update_fields.append("body")
+        logger.error(
+            f"EMAIL FAILED - id={email.id} to={email.recipients} "
+            f"attempts={email.attempts} error={error}"
+        )
+    else:
+        email.status = OutboundEmail.PENDING
+        email.next_attempt_at = timezone.now() + timedelta(
+            seconds=_retry_delay(email.attempts)
+        )
+        logger.warning(
+            f"EMAIL RETRY - id={email.id} to={email.recipients} "
+            f"attempts={email.attempts} next_attempt_at={email.next_attempt_at} "
+            f"error={error}"
+        )
+
+    email.save(update_fields=update_fields)
+
+
+def _release_unsent(batch, retry_in):
+    # The SMTP circuit is open: put the rest back without using up attempts
+    ids = [email.id for email in batch if email.status == OutboundEmail.SENDING]
+    OutboundEmail.objects.filter(id__in=ids, status=OutboundEmail.SENDING).update(
+        status=OutboundEmail.PENDING,
+        claimed_at=None,
+        next_attempt_at=timezone.now() + timedelta(seconds=retry_in),
+    )
+    logger.warning(
+        f"EMAIL DEFERRED - {len(ids)} email(s), SMTP circuit open for {retry_in:.0f}s"
+    )
+
+
+def send_outbox_batch(batch_size=50):
+    """
+    Send one batch of due emails over a single SMTP connection, throttled
+    to EMAIL_OUTBOX_RATE_PER_MINUTE. Returns (sent, failed) counts.
+    """
+    batch = _claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    min_interval = 60 / settings.EMAIL_OUTBOX_RATE_PER_MINUTE
+    last_sent = None
+    sent = failed = 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        _open_connection(connection)
+
+        for email in batch:
+            if last_sent is not None:
+                wait = min_interval - (time.monotonic() - last_sent)
+                if wait > 0:
+                    time.sleep(wait)
+            last_sent = time.monotonic()
+
+            try:
+                _send_message(
+                    EmailMessage(
+                        subject=email.subject,
+                        body=email.body,
+                        from_email=email.from_email,
+                        to=email.recipients.split(","),
+                        connection=connection,
+                    )
+                )
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                failed += 1
+                _mark_failed_attempt(email, e)
+
+                # The connection may be unusable after an SMTP error
+                connection.close()
+                try:
+                    _open_connection(connection)
+                except CircuitOpenError:
+                    raise
+                except Exception:
+                    logger.exception("Could not reopen the email connection")
+                continue
+
+            sent += 1
+            email.status = OutboundEmail.SENT
+            email.sent_at = timezone.now()
+            email.attempts += 1
+            email.body = ""
+            email.last_error = ""
+            email.save(
+                update_fields=["status", "sent_at", "attempts", "body", "last_error"]
+            )
+            logger.info(f"EMAIL SENT - id={email.id} to={email.recipients}")
+
+    except CircuitOpenError as e:
+        _release_unsent(batch, e.retry_in)
+    except Exception as e:
+        # Could not connect at all: every claimed row goes back for retry
+        for email in batch:
+            if email.status == OutboundEmail.SENDING:
+                failed += 1
+                _mark_failed_attempt(email, e)
+    finally:
+        connection.close()
+
+    return sent, failed
@@ -1,9 +1,16 @@
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.utils.crypto import get_random_string
-from django.core.mail import send_mail
-from django.conf import settings
+
+from imu_chiropractic_form.outbound import get_upstream
+
+from .outbox import build_email, queue_email
 
 SITE_URL = os.getenv("SITE_URL", "http://127.0.0.1:8000")
 
@@ -13,8 +20,8 @@ def generate_temp_password(length=12):
         allowed_chars="abcdefghjkmnpqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ23456789@#$"
     )
 
-def send_temp_password_email(user, full_name, temp_password):
-    send_mail(
+def build_temp_password_email(user, full_name, temp_password):
+    return build_email(
         subject="IMU Chiropractic Application Account Registration – Temporary Login Credentials",
         message=f"""
         Dear {full_name},
@@ -39,16 +46,22 @@ def send_temp_password_email(user, full_name, temp_password):
         IMU IT Services
         International Medical University
         """,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        recipient_list=[user.email],
+    )
+
+
+def send_temp_password_email(user, full_name, temp_password):
+    # Queued in the outbox, delivered by `python manage.py send_outbox_emails`
+    email = build_temp_password_email(user, full_name, temp_password)
+    email.save()
+    return email
 
 
 def send_reset_password_email(user, reset_link):
-    send_mail(
-            subject="IMU Chiropractic Application Account Password Reset",
-            message=f"""
+    # Queued in the outbox, delivered by `python manage.py send_outbox_emails`
+    return queue_email(
+        subject="IMU Chiropractic Application Account Password Reset",
+        message=f"""
             Dear {user.profile.official_name},
 
             We received a request to reset the password for your IMU account.
@@ -64,58 +77,241 @@ def send_reset_password_email(user, reset_link):
             IMU IT Services
             International Medical University
             """,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                fail_silently=False,
-            )
-    
+        recipient_list=[user.email],
+    )
+
 # API Configuration
-HEADERS = {
-    "x-functions-key": settings.AZURE_FUNCTION_KEY
-}
+# One pooled keep-alive session shared by every fetch; the pool is sized to
+# the number of worker threads so concurrent by-ID fetches reuse connections.
+_session = None
+_session_lock = threading.Lock()
 
-BASE_URL = settings.AZURE_BASE_URL
 
-def _fetch_by_ids(all_endpoint, by_id_endpoint, ids):
-    if not ids:
-        response = requests.get(
-            f"{BASE_URL}/{all_endpoint}",
-            headers=HEADERS,
+def _get_session():
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.AZURE_MAX_WORKERS,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"x-functions-key": settings.AZURE_FUNCTION_KEY})
+            _session = session
+
+    return _session
+
+
+def close_session():
+    """
+    Drop the shared session, e.g. after AZURE_MAX_WORKERS has changed.
+    """
+    global _session
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _is_transient(exc):
+    # Client errors mean the upstream is up; only 5xx/429 and network
+    # failures are retried and counted against the circuit
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status_code = exc.response.status_code
+        return status_code >= 500 or status_code == 429
+    return isinstance(exc, requests.RequestException)
+
+
+def _azure():
+    return get_upstream(
+        "azure",
+        retries=settings.AZURE_RETRIES,
+        deadline=settings.AZURE_DEADLINE,
+        failure_threshold=settings.AZURE_CIRCUIT_THRESHOLD,
+        reset_timeout=settings.AZURE_CIRCUIT_RESET_TIMEOUT,
+        is_transient=_is_transient,
+    )
+
+
+def _azure_timeout(deadline):
+    return deadline.timeout(settings.AZURE_CONNECT_TIMEOUT, settings.AZURE_READ_TIMEOUT)
+
+
+def _azure_get(endpoint, params=None):
+    def attempt(deadline):
+        response = _get_session().get(
+            f"{settings.AZURE_BASE_URL}/{endpoint}",
+            params=params,
+            timeout=_azure_timeout(deadline),
         )
         response.raise_for_status()
         return response.json()
 
-    results = []
+    return _azure().call(attempt)
+
+
+JSON_WHITESPACE = " \t\r\n"
+JSON_DELIMITERS = JSON_WHITESPACE + ",]"
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a JSON array as they arrive, from an iterable of
+    text chunks. Only the element being parsed is held in memory. Anything
+    that is not a well-formed array raises ValueError, so a truncated or
+    corrupted response never passes for a shorter one.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    exhausted = False
+    # "[" first, then a value (or "]" right after "["), then "," or "]"
+    expecting = "open"
+
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_WHITESPACE:
+            position += 1
+
+        if position < len(buffer):
+            char = buffer[position]
+
+            if expecting == "open":
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                expecting = "first"
+                position += 1
+                continue
+
+            if expecting == "separator":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' but found {char!r}")
+                expecting = "value"
+                position += 1
+                continue
+
+            if char == "]" and expecting == "first":
+                return
+            if char in ",]":
+                raise ValueError(f"Expected a value but found {char!r}")
+
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+                end = None
+
+            # Only a number can still grow with the next chunk ("1." may be
+            # the start of "1.5"), so it needs a delimiter after it
+            if end is not None and (
+                exhausted
+                or (
+                    end < len(buffer)
+                    and (char not in "-0123456789" or buffer[end] in JSON_DELIMITERS)
+                )
+            ):
+                yield item
+                expecting = "separator"
+                buffer, position = buffer[end:], 0
+                continue
+
+        if exhausted:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer, position = buffer[position:] + chunk, 0
+
 
-    for item_id in ids:
-        response = requests.get(
-            f"{BASE_URL}/{by_id_endpoint}",
-            headers=HEADERS,
-            params={"EMPLID": item_id},
+def _stream_all(endpoint, chunk_size=64 * 1024):
+    def attempt(deadline):
+        response = _get_session().get(
+            f"{settings.AZURE_BASE_URL}/{endpoint}",
+            timeout=_azure_timeout(deadline),
+            stream=True,
         )
-        response.raise_for_status()
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response
+
+    # Only opening the stream is retried: once records have been handed to
+    # the caller, a broken download is for the caller (sync jobs) to resume
+    upstream = _azure()
+    with upstream.call(attempt) as response:
+        response.encoding = response.encoding or "utf-8"
+        try:
+            yield from iter_json_array(
+                response.iter_content(chunk_size=chunk_size, decode_unicode=True)
+            )
+        except requests.RequestException:
+            upstream.breaker.record_failure()
+            raise
+
 
-        data = response.json()
+def _fetch_by_ids(all_endpoint, by_id_endpoint, ids, max_workers=None):
+    if not ids:
+        return _azure_get(all_endpoint)
+
+    max_workers = min(max_workers or settings.AZURE_MAX_WORKERS, len(ids))
 
-        if isinstance(data, list):
-            results.extend(data)
-        elif data:
-            results.append(data)
+    def fetch_one(item_id):
+        return _azure_get(by_id_endpoint, params={"EMPLID": item_id})
+
+    results = []
+
+    # executor.map yields in input order, so results keep the order of ids
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="azure-fetch"
+    )
+    try:
+        for data in executor.map(fetch_one, ids):
+            if isinstance(data, list):
+                results.extend(data)
+            elif data:
+                results.append(data)
+    finally:
+        # Stop queued fetches as soon as one of them fails
+        executor.shutdown(cancel_futures=True)
 
     return results
 
 
-def get_imu_employee_details(employee_ids=None):
+def get_imu_employee_details(employee_ids=None, max_workers=None):
     return _fetch_by_ids(
         "EmployeeInfo",
         "EmployeeInfoById",
         employee_ids,
+        max_workers=max_workers,
     )
 
 
-def get_imu_student_details(student_ids=None):
+def get_imu_student_details(student_ids=None, max_workers=None):
     return _fetch_by_ids(
         "StudentProgramInfo",
         "StudentProgramInfoById",
         student_ids,
-    )
\ No newline at end of file
+        max_workers=max_workers,
+    )
+
+
+# Streaming variants of the full directory listings: records are yielded
+# while the response is still downloading, so memory stays bounded by the
+# consumer's batch size instead of the directory size.
+def iter_imu_employee_details():
+    return _stream_all("EmployeeInfo")
+
+
+def iter_imu_student_details():
+    return _stream_all("StudentProgramInfo")
@@ -3,12 +3,16 @@ import re
 
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 
 from .models import Profile
 
 logger = logging.getLogger("userprofile")
 
+# Sent after accounts.sync writes profiles with bulk_create/bulk_update,
+# which skip post_save. Receivers get the synced `member_ids`.
+profiles_bulk_synced = Signal()
+
 
 def generate_admin_member_id():
     """
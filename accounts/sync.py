@@ -0,0 +1,591 @@
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .hashing import hash_passwords
+from .models import (
+    Department,
+    OutboundEmail,
+    Profile,
+    SyncJob,
+    SyncJobFailure,
+    SyncState,
+)
+from .services import build_temp_password_email, generate_temp_password
+from .signals import profiles_bulk_synced
+
+logger = logging.getLogger("userprofile")
+
+SYNC_CHUNK_SIZE = 500
+
+STUDENT_GENDER_MAP = {
+    "Male": "male",
+    "Female": "female",
+}
+
+
+# -----------------------------
+# Record -> Profile field mapping
+# -----------------------------
+def student_profile_fields(student, context):
+    return {
+        "official_name": student.get("LONG_FULL_NAME", ""),
+        "role": "student",
+        "gender": STUDENT_GENDER_MAP.get(student.get("GENDER"), ""),
+        "nricpsprt": student.get("NRICPSPRT"),
+        "phone": student.get("MOBILE"),
+        "emergency_contact": student.get("EMER_PHONE"),
+        "personal_email": student.get("EMAIL_ADDR"),
+        "address_1": student.get("ADDRESS1"),
+        "address_2": student.get("ADDRESS2"),
+        "address_3": student.get("ADDRESS3"),
+        "address_4": student.get("ADDRESS4"),
+        "postal_code": student.get("POSTAL"),
+        "city": student.get("CITY"),
+        "state": student.get("STATEDESCR"),
+        "country": student.get("COUNTRYDESCR"),
+        "location": student.get("CAMPUS"),
+        "cohort_code": student.get("INTAKE"),
+        "program_description": student.get("PROG_DESCR"),
+        "transcript_description": student.get("TRNSCR_DESCR"),
+        "advisor_name": student.get("ADVISOR_NAME"),
+        "advisor_email": student.get("ADVISOR_EMAIL"),
+    }
+
+
+def employee_profile_fields(emp, context):
+    department = context["departments"].get(emp.get("DEPT_CODE"))
+    fields = {
+        "official_name": emp.get("EMP_NAME", ""),
+        "personal_email": emp.get("EMAIL", ""),
+        "address_1": emp.get("ADDRESS1"),
+        "address_2": emp.get("ADDRESS2"),
+        "address_3": emp.get("ADDRESS3"),
+        "postal_code": emp.get("ZIP"),
+        "city": emp.get("CITY"),
+        "state": emp.get("STATE_NAME"),
+        "country": emp.get("COUNTRY"),
+        "location": emp.get("ULOCATION"),
+        "position": emp.get("POSITION"),
+        "department_id": department.id if department else None,
+        "business_unit": emp.get("BU_NAME"),
+    }
+    # Without a role in the context (profile webhooks) existing profiles
+    # keep theirs
+    if "role" in context:
+        fields["role"] = context["role"]
+    return fields
+
+
+def load_departments():
+    return {d.department_code: d for d in Department.objects.all()}
+
+
+def record_fingerprint(email, fields):
+    """
+    SHA-256 of an upstream record as mapped onto User/Profile. Hashing the
+    mapped values means role or department resolution changes are seen too.
+    """
+    payload = json.dumps({"email": email, **fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def upstream_changed_at(record):
+    value = record.get(settings.AZURE_LAST_UPDATED_FIELD)
+    changed_at = parse_datetime(value) if isinstance(value, str) else None
+    if changed_at is not None and timezone.is_naive(changed_at):
+        changed_at = timezone.make_aware(changed_at)
+    return changed_at
+
+
+def get_sync_watermark(name):
+    return (
+        SyncState.objects.filter(name=name).values_list("watermark", flat=True).first()
+    )
+
+
+def save_sync_watermark(name, watermark):
+    state, _ = SyncState.objects.get_or_create(name=name)
+    state.last_run_at = timezone.now()
+    if watermark is not None and (state.watermark is None or watermark > state.watermark):
+        state.watermark = watermark
+    state.save()
+
+
+def parse_since(value):
+    """
+    argparse type for --since: an ISO date or datetime, local time if naive.
+    """
+    since = parse_datetime(value) or parse_datetime(f"{value}T00:00:00")
+    if since is None:
+        raise ValueError(f"Invalid date/time: {value}")
+    return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+
+# -----------------------------
+# Sync jobs
+# -----------------------------
+class SyncCheckpointMismatch(Exception):
+    pass
+
+
+def get_resumable_sync_job(name):
+    """
+    The latest run of `name` if it did not complete cleanly, else None.
+    """
+    job = SyncJob.objects.filter(name=name).order_by("-started_at", "-id").first()
+    if job is None or job.status == SyncJob.COMPLETED:
+        return None
+    return job
+
+
+def start_sync_job(name, resume=False, **options):
+    """
+    Record a new run of `name`, or reopen the unfinished one with `resume`
+    (None when there is nothing to resume).
+    """
+    if not resume:
+        return SyncJob.objects.create(name=name, **options)
+
+    job = get_resumable_sync_job(name)
+    if job is not None:
+        job.status = SyncJob.RUNNING
+        job.finished_at = None
+        job.save(update_fields=["status", "finished_at", "updated_at"])
+    return job
+
+
+def finish_sync_job(job, error=None):
+    """
+    Close a run. It only counts as completed when the whole stream was
+    consumed and no failed records are left to retry.
+    """
+    failures = job.failures.count()
+    if error is not None:
+        job.last_error = f"{type(error).__name__}: {error}"
+    elif failures:
+        job.last_error = f"{failures} record(s) failed to sync"
+    else:
+        job.last_error = ""
+
+    job.status = SyncJob.FAILED if error is not None or failures else SyncJob.COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "last_error", "finished_at", "updated_at"])
+    return job
+
+
+def diff_report_lines(diffs):
+    for member_id, action, changes in diffs:
+        if action == "create":
+            yield f"CREATE {member_id}"
+            continue
+
+        yield f"UPDATE {member_id}"
+        for field, (old_value, new_value) in sorted(changes.items()):
+            yield f"    {field}: {old_value!r} -> {new_value!r}"
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+class ProfileSyncPipeline:
+    """
+    Upsert API records into User/Profile in chunks: preload the existing
+    rows of a chunk with two queries, diff in memory, then apply the
+    changes with bulk_create/bulk_update inside one transaction per chunk.
+
+    Profiles whose stored fingerprint matches the incoming record are
+    skipped before any row is loaded. With `since`, records whose upstream
+    change timestamp is not newer are skipped before touching the database.
+
+    With a `job`, the stream position is checkpointed after every chunk and
+    the records of a failed chunk are retried one by one, so only the ones
+    that really fail are queued as SyncJobFailure rows.
+
+    `create_defaults` are Profile fields set on new profiles only, for
+    values upstream does not provide.
+    """
+
+    def __init__(
+        self,
+        member_id_key,
+        email_key,
+        name_key,
+        profile_fields,
+        context=None,
+        create_only=False,
+        update_only=False,
+        dry_run=False,
+        chunk_size=SYNC_CHUNK_SIZE,
+        since=None,
+        job=None,
+        create_defaults=None,
+    ):
+        self.member_id_key = member_id_key
+        self.email_key = email_key
+        self.name_key = name_key
+        self.profile_fields = profile_fields
+        self.context = context or {}
+        self.create_only = create_only
+        self.update_only = update_only
+        self.dry_run = dry_run
+        self.chunk_size = chunk_size
+        self.since = since
+        self.create_defaults = create_defaults or {}
+        self.counts = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        self.received = 0
+        # Newest upstream change seen, the next --incremental watermark
+        self.latest_change = None
+        # Records lost to failed chunks; the watermark must not move past them
+        self.failed = 0
+        # Field-level changes collected on dry runs:
+        # (member_id, "create" | "update", {field: (old, new)})
+        self.diffs = []
+
+        self.job = job
+        self._last_member_id = ""
+        self.pending_failures = set()
+        if job is not None:
+            # Counters carry on from the run being resumed
+            self._base_counts = {name: getattr(job, name) for name in self.counts}
+            self.latest_change = job.latest_change
+            self.pending_failures = set(
+                job.failures.values_list("member_id", flat=True)
+            )
+
+    def run(self, records, member_ids=None):
+        member_ids = set(member_ids or [])
+        chunk = {}
+        resume_at = self.job.position if self.job else 0
+
+        # `records` may be a lazy stream; only one chunk is held at a time
+        for record in records:
+            self.received += 1
+            member_id = record.get(self.member_id_key)
+            self._last_member_id = member_id or ""
+
+            if self.received <= resume_at:
+                # Already handled by the run being resumed
+                if (
+                    self.received == resume_at
+                    and self._last_member_id != self.job.checkpoint_member_id
+                ):
+                    raise SyncCheckpointMismatch(
+                        f"Expected {self.job.checkpoint_member_id!r} at position "
+                        f"{resume_at}, got {self._last_member_id!r}"
+                    )
+                continue
+
+            if not member_id:
+                self.counts["skipped"] += 1
+                logger.warning("Skipping record with missing %s", self.member_id_key)
+                continue
+
+            if member_ids and member_id not in member_ids:
+                continue
+
+            changed_at = upstream_changed_at(record)
+            if changed_at is not None:
+                if self.latest_change is None or changed_at > self.latest_change:
+                    self.latest_change = changed_at
+                if self.since is not None and changed_at <= self.since:
+                    self.counts["unchanged"] += 1
+                    continue
+
+            # Later duplicates of the same ID win, as they did record by record
+            chunk[member_id] = record
+            if len(chunk) >= self.chunk_size:
+                self._sync_chunk(chunk)
+                chunk = {}
+
+        if chunk:
+            self._sync_chunk(chunk)
+        self._checkpoint()
+
+        return self.counts
+
+    def retry_failures(self, records):
+        """
+        Sync records re-fetched for the job's queued failures. Failures that
+        the upstream no longer returns stay queued.
+        """
+        for start in range(0, len(records), self.chunk_size):
+            chunk = {}
+            for record in records[start : start + self.chunk_size]:
+                member_id = record.get(self.member_id_key)
+                if member_id in self.pending_failures:
+                    chunk[member_id] = record
+            if chunk:
+                self._sync_chunk(chunk)
+        self._checkpoint()
+
+        return self.counts
+
+    # -----------------------------
+    # One chunk
+    # -----------------------------
+    def _sync_chunk(self, records, checkpoint=True):
+        try:
+            plan = self._plan(records)
+            if not self.dry_run:
+                self._apply(plan)
+        except Exception as exc:
+            logger.exception(
+                "Failed to sync chunk of %s records (%s...)",
+                len(records),
+                next(iter(records)),
+            )
+            if self.job is None:
+                self.counts["skipped"] += len(records)
+                self.failed += len(records)
+            elif len(records) > 1:
+                # Isolate the failing records so the rest of the chunk lands
+                for member_id, record in records.items():
+                    self._sync_chunk({member_id: record}, checkpoint=False)
+            else:
+                self._record_failure(next(iter(records)), exc)
+            if checkpoint:
+                self._checkpoint()
+            return
+
+        self.counts["created"] += len(plan["create"])
+        self.counts["updated"] += sum(1 for *_, changed in plan["update"] if changed)
+        self.counts["unchanged"] += plan["unchanged"]
+        self.counts["skipped"] += plan["skipped"]
+
+        resolved = self.pending_failures.intersection(records)
+        if resolved:
+            self.job.failures.filter(member_id__in=resolved).delete()
+            self.pending_failures -= resolved
+        if checkpoint:
+            self._checkpoint()
+
+    # -----------------------------
+    # Job bookkeeping
+    # -----------------------------
+    def _record_failure(self, member_id, exc):
+        self.counts["skipped"] += 1
+        self.failed += 1
+        failure, created = SyncJobFailure.objects.get_or_create(
+            job=self.job, member_id=member_id, defaults={"error": str(exc)}
+        )
+        if not created:
+            failure.error = str(exc)
+            failure.attempts += 1
+            failure.save(update_fields=["error", "attempts", "updated_at"])
+        self.pending_failures.add(member_id)
+
+    def _checkpoint(self):
+        if self.job is None:
+            return
+
+        job = self.job
+        if self.received > job.position:
+            job.position = self.received
+            job.checkpoint_member_id = self._last_member_id
+        job.latest_change = self.latest_change
+        for name, value in self.counts.items():
+            setattr(job, name, self._base_counts[name] + value)
+        job.save(
+            update_fields=[
+                "position",
+                "checkpoint_member_id",
+                "latest_change",
+                *self.counts,
+                "updated_at",
+            ]
+        )
+
+    def _plan(self, records):
+        plan = {"create": [], "update": [], "unchanged": 0, "skipped": 0}
+        fingerprints = dict(
+            Profile.objects.filter(member_id__in=list(records)).values_list(
+                "member_id", "sync_fingerprint"
+            )
+        )
+
+        incoming = {}
+        for member_id, record in records.items():
+            email = record.get(self.email_key) or ""
+            fields = {"member_id": member_id, **self.profile_fields(record, self.context)}
+            fingerprint = record_fingerprint(email, fields)
+
+            if member_id in fingerprints:
+                if self.create_only:
+                    plan["skipped"] += 1
+                    logger.info("SKIPPED (already exists) - member_id=%s", member_id)
+                    continue
+                if fingerprints[member_id] == fingerprint:
+                    plan["unchanged"] += 1
+                    continue
+
+            incoming[member_id] = (email, fields, fingerprint, record)
+
+        if not incoming:
+            return plan
+
+        profiles = {
+            p.member_id: p
+            for p in Profile.objects.filter(member_id__in=list(incoming)).select_related(
+                "user"
+            )
+        }
+        # Users that exist under the member ID but whose profile does not
+        # carry it yet (e.g. the AUTO-<id> profile from accounts.signals)
+        orphan_users = {
+            u.username: u
+            for u in User.objects.filter(
+                username__in=[m for m in incoming if m not in profiles]
+            ).select_related("profile")
+        }
+
+        synced_at = timezone.now()
+
+        for member_id, (email, fields, fingerprint, record) in incoming.items():
+            fields = {**fields, "sync_fingerprint": fingerprint, "synced_at": synced_at}
+
+            profile = profiles.get(member_id)
+            user = profile.user if profile else orphan_users.get(member_id)
+            if profile is None and user is not None:
+                profile = getattr(user, "profile", None)
+
+            if user is None:
+                if self.update_only:
+                    plan["skipped"] += 1
+                    logger.info("SKIPPED (user does not exist) - member_id=%s", member_id)
+                    continue
+
+                plan["create"].append((member_id, email, fields, record))
+                if self.dry_run:
+                    self.diffs.append((member_id, "create", {}))
+                continue
+
+            if self.create_only:
+                plan["skipped"] += 1
+                logger.info("SKIPPED (already exists) - member_id=%s", member_id)
+                continue
+
+            diff = {}
+            if user.email != email:
+                diff["email"] = (user.email, email)
+            user.email = email
+
+            changed_fields = []
+            if profile is None:
+                profile = Profile(user=user, **{**self.create_defaults, **fields})
+            else:
+                for name, value in fields.items():
+                    old_value = getattr(profile, name)
+                    if old_value != value:
+                        setattr(profile, name, value)
+                        changed_fields.append(name)
+                        if name not in ("sync_fingerprint", "synced_at"):
+                            diff[name] = (old_value, value)
+
+            # Content identical but no fingerprint stored yet: only the
+            # fingerprint is written, and the record counts as unchanged
+            content_changed = bool(diff) or profile.pk is None
+            if not content_changed:
+                plan["unchanged"] += 1
+            elif self.dry_run:
+                self.diffs.append((member_id, "update", diff))
+
+            plan["update"].append(
+                (user, "email" in diff, profile, changed_fields, content_changed)
+            )
+
+        return plan
+
+    def _apply(self, plan):
+        # Hashed on the process pool before the transaction opens, so the
+        # slow part of account creation holds no locks
+        temp_passwords = [generate_temp_password() for _ in plan["create"]]
+        hashed = hash_passwords(temp_passwords)
+
+        with transaction.atomic():
+            # New users: bulk_create bypasses the post_save profile signal,
+            # so the profiles are created here with their real member IDs
+            if plan["create"]:
+                new_users = []
+                credentials = []
+                for (member_id, email, _, record), temp_password, encoded in zip(
+                    plan["create"], temp_passwords, hashed
+                ):
+                    user = User(username=member_id, email=email, password=encoded)
+                    new_users.append(user)
+                    credentials.append(
+                        build_temp_password_email(
+                            user, record.get(self.name_key, ""), temp_password
+                        )
+                    )
+                User.objects.bulk_create(new_users, batch_size=self.chunk_size)
+
+                # MySQL does not return primary keys from bulk_create
+                user_ids = dict(
+                    User.objects.filter(
+                        username__in=[member_id for member_id, *_ in plan["create"]]
+                    ).values_list("username", "id")
+                )
+                Profile.objects.bulk_create(
+                    [
+                        Profile(
+                            user_id=user_ids[member_id],
+                            first_time_password_change=True,
+                            **{**self.create_defaults, **fields},
+                        )
+                        for member_id, _, fields, _ in plan["create"]
+                    ],
+                    batch_size=self.chunk_size,
+                )
+
+                # Credentials are queued in the same transaction as the
+                # accounts, so they are only sent if the chunk commits
+                OutboundEmail.objects.bulk_create(
+                    credentials, batch_size=self.chunk_size
+                )
+
+            # Existing users
+            users = [user for user, user_changed, *_ in plan["update"] if user_changed]
+            if users:
+                User.objects.bulk_update(users, ["email"], batch_size=self.chunk_size)
+
+            missing_profiles = [p for _, _, p, *_ in plan["update"] if p.pk is None]
+            if missing_profiles:
+                Profile.objects.bulk_create(missing_profiles, batch_size=self.chunk_size)
+
+            changed_profiles = [
+                p for _, _, p, changed, _ in plan["update"] if changed and p.pk
+            ]
+            changed_fields = sorted(
+                {name for _, _, _, changed, _ in plan["update"] for name in changed}
+            )
+            if changed_profiles:
+                Profile.objects.bulk_update(
+                    changed_profiles, changed_fields, batch_size=self.chunk_size
+                )
+
+            synced_member_ids = [member_id for member_id, *_ in plan["create"]] + [
+                p.member_id for _, _, p, _, changed in plan["update"] if changed
+            ]
+            transaction.on_commit(
+                lambda: profiles_bulk_synced.send(
+                    sender=Profile, member_ids=synced_member_ids
+                )
+            )
+
+        for member_id, *_ in plan["create"]:
+            logger.info("USER CREATED - username=%s member_id=%s", member_id, member_id)
+        for user, _, profile, _, changed in plan["update"]:
+            if not changed:
+                continue
+            logger.info(
+                "USER UPDATED - username=%s member_id=%s",
+                user.username,
+                profile.member_id,
+            )
@@ -1,3 +1,405 @@
-from django.test import TestCase
+import json
+import smtplib
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from imu_chiropractic_form.outbound import reset_upstreams
+
+from .azure_stub import (
+    AzureStubServer,
+    stub_employee,
+    stub_employee_code,
+    stub_member_id,
+    stub_student,
+)
+from .bulk import bulk_create_accounts, validate_accounts
+from .models import (
+    OutboundEmail,
+    Profile,
+    ProfileChangeEvent,
+    SyncJob,
+    SyncJobFailure,
+)
+from .outbox import queue_email, send_outbox_batch
+from .services import iter_json_array
+from .sync import (
+    ProfileSyncPipeline,
+    employee_profile_fields,
+    get_sync_watermark,
+    student_profile_fields,
+    upstream_changed_at,
+)
+from .webhooks import (
+    SIGNATURE_HEADER,
+    apply_change_events,
+    sign_payload,
+    verify_signature,
+)
+
+
+def run_command(name, *args):
+    call_command(name, *args, stdout=StringIO(), stderr=StringIO())
+
+
+class AzureStubTestCase(TestCase):
+    """
+    Sync commands run against a local stub of the IMU API with 5 records.
+    """
+
+    def setUp(self):
+        self.stub = AzureStubServer(records=5).start()
+        self.addCleanup(self.stub.stop)
+        settings_override = override_settings(AZURE_BASE_URL=self.stub.url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class SyncWatermarkTests(AzureStubTestCase):
+    def test_filtered_runs_leave_the_watermark(self):
+        run_command("sync_student_profile", stub_member_id(2))
+        run_command("sync_student_profile", "--update-only")
+        run_command("sync_student_profile", "--create-only")
+        self.assertIsNone(get_sync_watermark("sync_student_profile"))
+
+    def test_full_run_moves_the_watermark(self):
+        run_command("sync_student_profile")
+        self.assertEqual(
+            get_sync_watermark("sync_student_profile"),
+            upstream_changed_at(stub_student(stub_member_id(5))),
+        )
+
+
+
+class SyncResumeTests(AzureStubTestCase):
+    def interrupted_job(self, position, checkpoint_member_id):
+        return SyncJob.objects.create(
+            name="sync_student_profile",
+            status=SyncJob.FAILED,
+            options={
+                "student_ids": [],
+                "create_only": False,
+                "update_only": False,
+                "since": None,
+            },
+            position=position,
+            checkpoint_member_id=checkpoint_member_id,
+            created=position,
+        )
+
+    def test_resume_carries_on_after_the_checkpoint(self):
+        job = self.interrupted_job(3, stub_member_id(3))
+        SyncJobFailure.objects.create(job=job, member_id=stub_member_id(2), error="x")
+
+        run_command("sync_student_profile", "--resume")
+
+        self.assertEqual(
+            set(Profile.objects.values_list("member_id", flat=True)),
+            {stub_member_id(i) for i in (2, 4, 5)},
+        )
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.COMPLETED)
+        self.assertEqual((job.position, job.created), (5, 6))
+        self.assertFalse(job.failures.exists())
+
+    def test_changed_upstream_order_is_refused(self):
+        job = self.interrupted_job(3, stub_member_id(4))
+
+        with self.assertRaisesMessage(CommandError, "upstream order changed"):
+            run_command("sync_student_profile", "--resume")
+
+        self.assertFalse(Profile.objects.exists())
+        job.refresh_from_db()
+        self.assertEqual(job.status, SyncJob.FAILED)
+
+    def test_nothing_to_resume(self):
+        run_command("sync_student_profile")
+
+        with self.assertRaisesMessage(CommandError, "no unfinished"):
+            run_command("sync_student_profile", "--resume")
+
+
+class BulkCreateTests(TestCase):
+    def rows(self, count):
+        return [
+            {
+                "username": f"bulk{i}",
+                "email": f"bulk{i}@example.com",
+                "official_name": f"Bulk {i}",
+            }
+            for i in range(count)
+        ]
+
+    def test_creates_accounts_and_queues_credentials(self):
+        valid, errors, _ = validate_accounts(self.rows(3))
+        self.assertEqual(errors, {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = bulk_create_accounts(valid, batch_size=2, workers=1)
+
+        self.assertEqual(summary["created"], 3)
+        self.assertEqual(summary["credentials_queued"], 3)
+        self.assertEqual(OutboundEmail.objects.count(), 3)
+        self.assertTrue(User.objects.get(username="bulk2").profile.first_time_password_change)
+
+    def test_failing_batch_rolls_back_the_whole_run(self):
+        valid, _, _ = validate_accounts(self.rows(3))
+        # Taken after validation, so the last batch fails on insert
+        User.objects.create_user(username="bulk2", email="other@example.com")
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(IntegrityError):
+                bulk_create_accounts(valid, batch_size=2, workers=1)
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(User.objects.filter(username__in=["bulk0", "bulk1"]).exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+
+class ProfileSyncPipelineTests(TestCase):
+    def sync_students(self, records):
+        pipeline = ProfileSyncPipeline(
+            member_id_key="EMPLID",
+            email_key="STU_EMAIL_ADDR",
+            name_key="LONG_FULL_NAME",
+            profile_fields=student_profile_fields,
+        )
+        pipeline.run(records)
+        return pipeline.counts
+
+    def sync_employees(self, records):
+        pipeline = ProfileSyncPipeline(
+            member_id_key="EMPLOYEE_CODE",
+            email_key="EMAIL",
+            name_key="EMP_NAME",
+            profile_fields=employee_profile_fields,
+            context={"role": "clinician", "departments": {}},
+            create_defaults={"gender": "male"},
+        )
+        pipeline.run(records)
+        return pipeline.counts
+
+    def test_creates_then_updates_changed_records(self):
+        records = [stub_student(stub_member_id(i)) for i in (1, 2)]
+        self.assertEqual(self.sync_students(records)["created"], 2)
+        profile = Profile.objects.get(member_id=stub_member_id(1))
+        self.assertEqual(profile.user.email, records[0]["STU_EMAIL_ADDR"])
+        self.assertTrue(profile.first_time_password_change)
+        self.assertEqual(OutboundEmail.objects.count(), 2)
+
+        records[0] = {**records[0], "CITY": "Seremban"}
+        counts = self.sync_students(records)
+
+        self.assertEqual(counts["updated"], 1)
+        self.assertEqual(counts["unchanged"], 1)
+        profile.refresh_from_db()
+        self.assertEqual(profile.city, "Seremban")
+
+    def test_matching_fingerprint_is_skipped(self):
+        records = [stub_student(stub_member_id(i)) for i in (1, 2)]
+        self.sync_students(records)
+        synced_at = Profile.objects.get(member_id=stub_member_id(1)).synced_at
+
+        counts = self.sync_students(records)
+
+        self.assertEqual(counts, {"created": 0, "updated": 0, "unchanged": 2, "skipped": 0})
+        self.assertEqual(
+            Profile.objects.get(member_id=stub_member_id(1)).synced_at, synced_at
+        )
+
+    def test_new_employees_keep_the_default_gender(self):
+        records = [stub_employee(stub_employee_code(i)) for i in (1, 2)]
+        self.sync_employees(records)
+        self.assertEqual(
+            set(Profile.objects.values_list("gender", flat=True)), {"male"}
+        )
+
+        profile = Profile.objects.get(member_id=stub_employee_code(2))
+        profile.gender = "female"
+        profile.save()
+        records[1] = {**records[1], "POSITION": "Lecturer"}
+        self.sync_employees(records)
+
+        profile.refresh_from_db()
+        self.assertEqual((profile.gender, profile.position), ("female", "Lecturer"))
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        # The SMTP circuit breaker is shared by the whole process
+        reset_upstreams()
+        self.addCleanup(reset_upstreams)
+        self.email = queue_email("Welcome", "Temporary password: x1", ["a@example.com"])
+
+    def fail_batch(self):
+        refused = smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No")})
+        with mock.patch("accounts.outbox._send_message", side_effect=refused):
+            result = send_outbox_batch()
+        self.email.refresh_from_db()
+        return result
+
+    def retry_in(self):
+        return (self.email.next_attempt_at - timezone.now()).total_seconds()
+
+    def test_sent_email_drops_its_body(self):
+        self.assertEqual(send_outbox_batch(), (1, 0))
+
+        self.assertEqual(mail.outbox[0].body, "Temporary password: x1")
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.SENT)
+        self.assertEqual(self.email.body, "")
+
+    def test_failed_attempts_back_off(self):
+        delay = settings.EMAIL_OUTBOX_RETRY_SECONDS
+
+        self.assertEqual(self.fail_batch(), (0, 1))
+        self.assertEqual(self.email.status, OutboundEmail.PENDING)
+        self.assertEqual(self.email.attempts, 1)
+        self.assertIn("No", self.email.last_error)
+        self.assertTrue(delay * 0.7 < self.retry_in() <= delay * 1.2)
+        # Not due yet
+        self.assertEqual(send_outbox_batch(), (0, 0))
+
+        OutboundEmail.objects.filter(pk=self.email.pk).update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.fail_batch()
+        self.assertEqual(self.email.attempts, 2)
+        self.assertTrue(delay * 1.5 < self.retry_in() <= delay * 2.4)
+        self.assertEqual(self.email.body, "Temporary password: x1")
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_final_failure_drops_the_body(self):
+        self.assertEqual(self.fail_batch(), (0, 1))
+
+        self.assertEqual(self.email.status, OutboundEmail.FAILED)
+        self.assertEqual(self.email.body, "")
+        self.assertEqual(send_outbox_batch(), (0, 0))
+
+
+class WebhookSignatureTests(SimpleTestCase):
+    body = b'{"events": []}'
+
+    def test_valid_signature(self):
+        self.assertTrue(verify_signature(self.body, sign_payload(self.body, "s"), "s"))
+
+    def test_rejected_signatures(self):
+        stale = int(time.time()) - 600
+        for header in [
+            sign_payload(self.body, "other"),
+            sign_payload(b'{"events": [1]}', "s"),
+            sign_payload(self.body, "s", timestamp=stale),
+            "t=1,v2=abc",
+            "garbage",
+            "",
+        ]:
+            with self.subTest(header=header):
+                self.assertFalse(verify_signature(self.body, header, "s", tolerance=300))
+
+
+@override_settings(PROFILE_WEBHOOK_SECRET="webhook-secret")
+class ProfileWebhookTests(TestCase):
+    def post(self, events, secret="webhook-secret"):
+        body = json.dumps({"events": events}).encode()
+        return self.client.post(
+            reverse("profile_webhook_api"),
+            body,
+            content_type="application/json",
+            headers={SIGNATURE_HEADER: sign_payload(body, secret)},
+        )
+
+    def employee_event(self, event_id, index, **changes):
+        record = {**stub_employee(stub_employee_code(index)), **changes}
+        return {"id": event_id, "type": ProfileChangeEvent.EMPLOYEE, "record": record}
+
+    def test_events_are_queued_once(self):
+        events = [
+            self.employee_event("e1", 1),
+            {
+                "id": "s1",
+                "type": ProfileChangeEvent.STUDENT,
+                "record": stub_student(stub_member_id(1)),
+            },
+        ]
+        response = self.post(events)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"accepted": 2, "duplicates": 0})
+
+        self.assertEqual(self.post(events).json(), {"accepted": 0, "duplicates": 2})
+        self.assertEqual(ProfileChangeEvent.objects.count(), 2)
+
+    def test_bad_requests_queue_nothing(self):
+        unsigned = self.post([self.employee_event("e1", 1)], secret="wrong")
+        self.assertEqual(unsigned.status_code, 401)
+        self.assertEqual(self.post([{"id": "e1", "type": "other"}]).status_code, 400)
+        self.assertFalse(ProfileChangeEvent.objects.exists())
+
+    def test_applied_events_keep_existing_roles(self):
+        self.post([self.employee_event("e1", 1), self.employee_event("e2", 2)])
+        self.assertEqual(apply_change_events(), (2, 0))
+
+        new = Profile.objects.get(member_id=stub_employee_code(1))
+        self.assertEqual((new.role, new.gender), ("clinician", "male"))
+        self.assertEqual(new.department.department_code, "D01")
+        event = ProfileChangeEvent.objects.get(event_id="e1")
+        self.assertEqual((event.status, event.payload), (ProfileChangeEvent.APPLIED, {}))
+
+        Profile.objects.filter(member_id=stub_employee_code(2)).update(role="admin")
+        self.post([self.employee_event("e3", 2, POSITION="Dean")])
+        self.assertEqual(apply_change_events(), (1, 0))
+
+        admin = Profile.objects.get(member_id=stub_employee_code(2))
+        self.assertEqual((admin.role, admin.position), ("admin", "Dean"))
+
+
+def split_every(text, size):
+    return [text[start : start + size] for start in range(0, len(text), size)]
+
+
+class JsonArrayStreamTests(SimpleTestCase):
+    def parse_in_chunks(self, text):
+        # Every chunk size, so each boundary falls inside strings and numbers
+        return {
+            size: list(iter_json_array(split_every(text, size)))
+            for size in range(1, len(text) + 1)
+        }
+
+    def test_elements_across_chunk_boundaries(self):
+        text = ' [1, -2.5e3 ,"a,]\\"b\\u00e9", {"k": [10, {"x": "]"}]}, true, null] '
+        for size, items in self.parse_in_chunks(text).items():
+            with self.subTest(size=size):
+                self.assertEqual(items, json.loads(text))
+
+    def test_empty_arrays(self):
+        for text in ["[]", " [ \n] "]:
+            for size, items in self.parse_in_chunks(text).items():
+                with self.subTest(text=text, size=size):
+                    self.assertEqual(items, [])
+
+    def test_malformed_arrays_are_rejected(self):
+        for text in [
+            "[1 2]",
+            "[1,,2]",
+            "[1,]",
+            "[,1]",
+            '[{"a":1}{"b":2}]',
+            "[1x]",
+            "[1, 2",
+            '[{"a":',
+            '{"a": 1}',
+            "",
+        ]:
+            for size in range(1, len(text) + 2):
+                with self.subTest(text=text, size=size):
+                    with self.assertRaises(ValueError):
+                        list(iter_json_array(split_every(text, size)))
@@ -13,6 +13,8 @@ urlpatterns = [
     # API
     path("api/user/", api.UserProfileAPIView.as_view(), name="user_api"),
     path("api/user/create/", api.UserProfileCreateAPIView.as_view(), name="user_create_api"),
+    path("api/user/bulk-create/", api.UserProfileBulkCreateAPIView.as_view(), name="user_bulk_create_api"),
     path("api/user/update/", api.UserProfileUpdateAPIView.as_view(), name="user_update_api"),
     path("api/user/delete/", api.UserProfileDeleteAPIView.as_view(), name="user_delete_api"),
+    path("api/profile-webhook/", api.ProfileChangeWebhookAPIView.as_view(), name="profile_webhook_api"),
 ]
@@ -0,0 +1,281 @@
+"""
+Push-based profile sync. The directory posts signed batches of changed
+StudentProgramInfo / EmployeeInfo records (complete, as the listing
+endpoints return them) to accounts/api/profile-webhook/;
+they are stored as ProfileChangeEvent rows and applied in the background by
+`python manage.py apply_profile_changes` through the same upsert pipeline
+as the full sync commands.
+
+Signature header, with `t` a Unix timestamp and `v1` the hex HMAC-SHA256
+of "<t>.<raw body>" under PROFILE_WEBHOOK_SECRET:
+
+    X-IMU-Signature: t=1767225600,v1=5257a869e7ecebeda32affa62cdca3fa...
+"""
+import hashlib
+import hmac
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Department, ProfileChangeEvent
+from .sync import (
+    ProfileSyncPipeline,
+    employee_profile_fields,
+    finish_sync_job,
+    load_departments,
+    start_sync_job,
+    student_profile_fields,
+)
+
+logger = logging.getLogger("userprofile")
+
+SIGNATURE_HEADER = "X-IMU-Signature"
+
+# event type -> (member ID key, email key, name key)
+EVENT_RECORD_KEYS = {
+    ProfileChangeEvent.STUDENT: ("EMPLID", "STU_EMAIL_ADDR", "LONG_FULL_NAME"),
+    ProfileChangeEvent.EMPLOYEE: ("EMPLOYEE_CODE", "EMAIL", "EMP_NAME"),
+}
+
+
+class InvalidChangeEvents(ValueError):
+    pass
+
+
+# -----------------------------
+# Signatures
+# -----------------------------
+def _digest(secret, timestamp, body):
+    message = str(timestamp).encode() + b"." + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def sign_payload(body, secret, timestamp=None):
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return f"t={timestamp},v1={_digest(secret, timestamp, body)}"
+
+
+def verify_signature(body, header, secret, tolerance=None):
+    tolerance = settings.PROFILE_WEBHOOK_TOLERANCE if tolerance is None else tolerance
+    try:
+        parts = dict(part.split("=", 1) for part in header.split(","))
+        timestamp = int(parts["t"])
+        signature = parts["v1"]
+    except (KeyError, ValueError):
+        return False
+
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(_digest(secret, timestamp, body), signature)
+
+
+# -----------------------------
+# Receiving
+# -----------------------------
+def parse_change_events(payload):
+    """
+    Validate a webhook body: {"events": [{"id", "type", "record"}, ...]}.
+    Returns unsaved ProfileChangeEvent rows.
+    """
+    events = payload.get("events") if isinstance(payload, dict) else None
+    if not isinstance(events, list) or not events:
+        raise InvalidChangeEvents("Expected a non-empty 'events' list")
+    if len(events) > settings.PROFILE_WEBHOOK_MAX_EVENTS:
+        raise InvalidChangeEvents(
+            f"At most {settings.PROFILE_WEBHOOK_MAX_EVENTS} events per request"
+        )
+
+    rows = []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise InvalidChangeEvents(f"events[{index}] must be an object")
+
+        event_id = event.get("id")
+        event_type = event.get("type")
+        record = event.get("record")
+
+        if not isinstance(event_id, str) or not event_id or len(event_id) > 100:
+            raise InvalidChangeEvents(f"events[{index}].id is required")
+        if event_type not in EVENT_RECORD_KEYS:
+            raise InvalidChangeEvents(
+                f"events[{index}].type must be one of {', '.join(EVENT_RECORD_KEYS)}"
+            )
+        member_id = (
+            record.get(EVENT_RECORD_KEYS[event_type][0])
+            if isinstance(record, dict)
+            else None
+        )
+        if not member_id:
+            raise InvalidChangeEvents(
+                f"events[{index}].record must include "
+                f"{EVENT_RECORD_KEYS[event_type][0]}"
+            )
+
+        rows.append(
+            ProfileChangeEvent(
+                event_id=event_id,
+                event_type=event_type,
+                member_id=str(member_id),
+                payload=record,
+            )
+        )
+
+    return rows
+
+
+def queue_change_events(rows):
+    """
+    Store the events, dropping ones already received. Returns
+    (accepted, duplicates).
+    """
+    event_ids = {row.event_id for row in rows}
+    seen = set(
+        ProfileChangeEvent.objects.filter(event_id__in=event_ids).values_list(
+            "event_id", flat=True
+        )
+    )
+
+    new_rows = {}
+    for row in rows:
+        if row.event_id not in seen:
+            new_rows.setdefault(row.event_id, row)
+
+    # ignore_conflicts covers a concurrent redelivery of the same events
+    ProfileChangeEvent.objects.bulk_create(new_rows.values(), ignore_conflicts=True)
+    return len(new_rows), len(rows) - len(new_rows)
+
+
+# -----------------------------
+# Applying
+# -----------------------------
+def _claim_events(batch_size):
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.PROFILE_CHANGE_CLAIM_TIMEOUT)
+
+    with transaction.atomic():
+        ids = list(
+            ProfileChangeEvent.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ProfileChangeEvent.PENDING)
+                | Q(status=ProfileChangeEvent.APPLYING, claimed_at__lt=stale)
+            )
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        ProfileChangeEvent.objects.filter(id__in=ids).update(
+            status=ProfileChangeEvent.APPLYING, claimed_at=now
+        )
+
+    return list(ProfileChangeEvent.objects.filter(id__in=ids).order_by("id"))
+
+
+def _ensure_departments(records):
+    # New department codes would otherwise leave employees without one
+    known = load_departments()
+    missing = {
+        record["DEPT_CODE"]: record.get("DEPT") or ""
+        for record in records
+        if record.get("DEPT_CODE") and record["DEPT_CODE"] not in known
+    }
+    for code, name in missing.items():
+        Department.objects.get_or_create(
+            department_code=code, defaults={"department_name": name}
+        )
+    return load_departments() if missing else known
+
+
+def _apply_events(event_type, events):
+    member_id_key, email_key, name_key = EVENT_RECORD_KEYS[event_type]
+    records = [event.payload for event in events]
+
+    if event_type == ProfileChangeEvent.STUDENT:
+        profile_fields = student_profile_fields
+        context = {}
+        create_defaults = {}
+    else:
+        profile_fields = employee_profile_fields
+        # Events do not say which role an employee was synced with (e.g.
+        # sync_employee_profile --role admin), so only new profiles get the
+        # command's defaults
+        context = {"departments": _ensure_departments(records)}
+        create_defaults = {"role": "clinician", "gender": "male"}
+
+    job = start_sync_job(
+        f"profile_webhook_{event_type}", options={"events": len(events)}
+    )
+    pipeline = ProfileSyncPipeline(
+        member_id_key=member_id_key,
+        email_key=email_key,
+        name_key=name_key,
+        profile_fields=profile_fields,
+        context=context,
+        job=job,
+        create_defaults=create_defaults,
+    )
+
+    try:
+        # Events are in arrival order, so the latest record of a member wins
+        pipeline.run(records)
+    except Exception as exc:
+        finish_sync_job(job, exc)
+        return {event.member_id: str(exc) for event in events}
+
+    failures = dict(job.failures.values_list("member_id", "error"))
+    finish_sync_job(job)
+    return failures
+
+
+def _mark_event(event, error=None):
+    event.claimed_at = None
+    if error is None:
+        event.status = ProfileChangeEvent.APPLIED
+        event.applied_at = timezone.now()
+        event.payload = {}
+        event.last_error = ""
+        return
+
+    event.attempts += 1
+    event.last_error = error[:2000]
+    if event.attempts >= settings.PROFILE_CHANGE_MAX_ATTEMPTS:
+        event.status = ProfileChangeEvent.FAILED
+        logger.error(
+            f"PROFILE CHANGE FAILED - event_id={event.event_id} "
+            f"member_id={event.member_id} error={error}"
+        )
+    else:
+        event.status = ProfileChangeEvent.PENDING
+
+
+def apply_change_events(batch_size=500):
+    """
+    Apply one batch of queued events. Returns (applied, failed) counts.
+    """
+    events = _claim_events(batch_size)
+    if not events:
+        return 0, 0
+
+    by_type = {}
+    for event in events:
+        by_type.setdefault(event.event_type, []).append(event)
+
+    applied = failed = 0
+    for event_type, typed_events in by_type.items():
+        failures = _apply_events(event_type, typed_events)
+        for event in typed_events:
+            error = failures.get(event.member_id)
+            _mark_event(event, error)
+            if error is None:
+                applied += 1
+            else:
+                failed += 1
+
+    ProfileChangeEvent.objects.bulk_update(
+        events,
+        ["status", "attempts", "claimed_at", "last_error", "applied_at", "payload"],
+    )
+    return applied, failed
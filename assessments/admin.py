@@ -1,15 +1,22 @@
 import json
 
 from django.contrib import admin
+from django.db import transaction
 from django.utils.html import format_html
+from .blobs import attach_blob, release_blob
 from .models import (
     Assessments,
     AssessmentTreatmentPlanPhase,
     AssessmentAttachment,
+    AttachmentBlob,
+    AttachmentUpload,
+    MediaDerivative,
     PatientNewComplaint,
     PatientReevaluation,
     SoapModality,
     Soaps,
+    StrokeDrawing,
+    StudentProgressSummary,
 )
 
 # =====================================================
@@ -451,8 +458,23 @@ class AssessmentAttachmentAdmin(admin.ModelAdmin):
             return "No file"
 
         url = obj.file.url
+        thumbnail = (
+            MediaDerivative.objects.filter(
+                source_name=obj.file.name,
+                kind=MediaDerivative.THUMBNAIL,
+                status=MediaDerivative.READY,
+            )
+            .only("id", "file")
+            .first()
+        )
 
         # image preview
+        if thumbnail:
+            return format_html(
+                "<a href='{}' target='_blank'><img src='{}' style='max-height:200px;border-radius:6px;' /></a>",
+                url,
+                thumbnail.file.url,
+            )
         if obj.file.name.lower().endswith(("png", "jpg", "jpeg")):
             return format_html(
                 "<img src='{}' style='max-height:200px;border-radius:6px;' />", url
@@ -471,7 +493,18 @@ class AssessmentAttachmentAdmin(admin.ModelAdmin):
             if not change and obj.uploaded_by is None:
                 obj.uploaded_by = request.user.profile
 
-        super().save_model(request, obj, form, change)
+        if "file" not in form.changed_data:
+            super().save_model(request, obj, form, change)
+            return
+
+        # Store a new file content-addressed, like the upload API does
+        uploaded = form.cleaned_data["file"]
+        previous_blob_id = obj.blob_id
+        with transaction.atomic():
+            attach_blob(obj, uploaded, sha256=getattr(uploaded, "sha256", None))
+            super().save_model(request, obj, form, change)
+            if previous_blob_id is not None:
+                release_blob(previous_blob_id)
 
 
 # =========================================
@@ -887,3 +920,157 @@ class PatientNewComplaintAdmin(admin.ModelAdmin):
             obj.updated_by = profile
 
         super().save_model(request, obj, form, change)
+
+
+# =========================================
+# Student Progress Summary Admin
+# =========================================
+@admin.register(StudentProgressSummary)
+class StudentProgressSummaryAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "student",
+        "cohort_code",
+        "assessments_signed",
+        "assessments_total",
+        "soaps_signed",
+        "soaps_total",
+        "updated_at",
+    )
+
+    list_filter = ("cohort_code",)
+
+    search_fields = (
+        "student__official_name",
+        "student__member_id",
+    )
+
+    list_select_related = ("student",)
+
+    # Maintained by assessments.progress, never edited by hand
+    readonly_fields = [field.name for field in StudentProgressSummary._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# =========================================
+# Chunked Attachment Upload Admin
+# =========================================
+@admin.register(AttachmentUpload)
+class AttachmentUploadAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "filename",
+        "assessment",
+        "uploaded_by",
+        "offset",
+        "size",
+        "status",
+        "updated_at",
+    )
+
+    list_filter = ("status",)
+
+    search_fields = (
+        "filename",
+        "uploaded_by__official_name",
+    )
+
+    list_select_related = ("assessment", "uploaded_by")
+
+    readonly_fields = [field.name for field in AttachmentUpload._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# =========================================
+# Media Derivative Admin
+# =========================================
+@admin.register(MediaDerivative)
+class MediaDerivativeAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "source_name",
+        "kind",
+        "status",
+        "width",
+        "height",
+        "updated_at",
+    )
+
+    list_filter = ("status", "kind", "source_model")
+
+    search_fields = ("source_name",)
+
+    # Rendered by assessments.derivatives, never edited by hand
+    readonly_fields = [field.name for field in MediaDerivative._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# =========================================
+# Attachment Blob Admin
+# =========================================
+@admin.register(AttachmentBlob)
+class AttachmentBlobAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "sha256",
+        "size",
+        "ref_count",
+        "normalization",
+        "created_at",
+    )
+
+    list_filter = ("normalization",)
+    search_fields = ("sha256",)
+
+    # Reference counted by assessments.blobs, never edited by hand
+    readonly_fields = [field.name for field in AttachmentBlob._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# =========================================
+# Stroke Drawing Admin
+# =========================================
+@admin.register(StrokeDrawing)
+class StrokeDrawingAdmin(admin.ModelAdmin):
+
+    list_display = (
+        "assessment",
+        "field",
+        "stroke_count",
+        "point_count",
+        "stored_bytes",
+        "preview",
+        "updated_at",
+    )
+
+    list_filter = ("field",)
+
+    search_fields = ("assessment__mrn_number",)
+
+    # Written by the consent and section 3 forms, never edited by hand;
+    # the packed strokes are shown as their rendering instead
+    exclude = ("data",)
+    readonly_fields = [
+        field.name for field in StrokeDrawing._meta.fields if field.name != "data"
+    ] + ["preview"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def stored_bytes(self, obj):
+        return len(obj.data)
+
+    def preview(self, obj):
+        return format_html('<img src="{}" style="max-height:60px;">', obj.url())
+
@@ -1,9 +1,7 @@
 import os
 import logging
-import base64
-import uuid
 from urllib import request
-from django.core.files.base import ContentFile
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from accounts.models import Profile
 from rest_framework import status
@@ -16,10 +14,12 @@ from .models import (
     Assessments,
     AssessmentAttachment,
     AssessmentTreatmentPlanPhase,
+    AttachmentUpload,
     PatientNewComplaint,
     SoapModality,
     Soaps,
     PatientReevaluation,
+    StudentProgressSummary,
 )
 from .serializers import (
     AssessmentsListSerializer,
@@ -27,24 +27,46 @@ from .serializers import (
     AssessmentSection3Serializer,
     AssessmentSection4Serializer,
     AssessmentAttachmentSerializer,
+    AttachmentUploadSerializer,
     AssessmentConsentSerializer,
     AssessmentTreatmentPlanSerializer,
     SoapSerializer,
     PatientReevaluationSerializer,
     PatientNewComplaintSerializer,
     AssessmentNotesSerializer,
+    StudentProgressSummarySerializer,
 )
+from .blobs import create_attachment
+from .direct_uploads import (
+    complete_direct_upload,
+    direct_uploads_enabled,
+    signed_upload,
+    start_direct_upload,
+)
+from .constants import ALLOWED_EXTENSIONS
+from .drawings import ROM_DRAWING, DrawingRejected
+from .reports import monthly_report, write_report_csv
+from .strokes import read_drawing, store_drawing
+from .timeline import (
+    TIMELINE_MAX_PAGE_SIZE,
+    TIMELINE_PAGE_SIZE,
+    InvalidCursor,
+    build_patient_timeline,
+)
+from .uploads import (
+    CHUNK_CHECKSUM_HEADER,
+    UPLOAD_OFFSET_HEADER,
+    OffsetMismatch,
+    UploadRejected,
+    abort_upload,
+    append_chunk,
+    complete_upload,
+    start_upload,
+)
+from .worklist import get_pending_sign_offs
 
 logger = logging.getLogger("assessments")
 
-ALLOWED_EXTENSIONS = {
-    ".pdf",
-    ".jpg",
-    ".jpeg",
-    ".png",
-    ".doc",
-    ".docx",
-}
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
 
@@ -601,10 +623,22 @@ class AssessmentSection3APIView(APIView):
         # =========================
         # CLEAN ROM INPUT
         # =========================
+        # Stroke data, a PNG file part (redrawn over an older PNG drawing),
+        # or a base64 data URL from older clients
         rom_drawing_data = request.data.get("rom_drawing_data")
         if rom_drawing_data in ["", "null", "undefined"]:
             rom_drawing_data = None
 
+        rom_drawing = None
+        if rom_drawing_data:
+            try:
+                rom_drawing = read_drawing(rom_drawing_data, ROM_DRAWING)
+            except DrawingRejected as e:
+                return Response(
+                    {"rom_drawing_data": str(e)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
         # =========================
         # SERIALIZER UPDATE (SINGLE SOURCE OF TRUTH)
         # =========================
@@ -627,29 +661,13 @@ class AssessmentSection3APIView(APIView):
         # =========================
         # ROM DRAWING HANDLING (SEPARATE SAFE STEP)
         # =========================
-        try:
-            if rom_drawing_data:
-                format, imgstr = rom_drawing_data.split(";base64,")
-                ext = format.split("/")[-1]
+        if rom_drawing:
+            # delete old image safely
+            if instance.rom_drawing:
+                instance.rom_drawing.delete(save=False)
 
-                # delete old image safely
-                if instance.rom_drawing:
-                    instance.rom_drawing.delete(save=False)
-
-                instance.rom_drawing = ContentFile(
-                    base64.b64decode(imgstr),
-                    name=f"rom_drawing_{instance.id}_{uuid.uuid4().hex}.{ext}",
-                )
-                instance.save(update_fields=["rom_drawing"])
-
-        except Exception as e:
-            return Response(
-                {
-                    "rom_drawing_data": "Invalid image data",
-                    "error": str(e),
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+            store_drawing(instance, "rom_drawing", rom_drawing)
+            instance.save(update_fields=["rom_drawing"])
 
         # refresh final state
         instance.refresh_from_db()
@@ -1035,7 +1053,7 @@ class AssessmentAttachmentAPIView(APIView):
         )
 
         serializer = AssessmentAttachmentSerializer(
-            assessment.attachments.all().order_by("-created_at"), many=True
+            assessment.attachments.all().order_by("-uploaded_at"), many=True
         )
 
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -1074,8 +1092,13 @@ class AssessmentAttachmentAPIView(APIView):
                 failed_files.append(f"{file.name} (too large)")
                 continue
 
-            AssessmentAttachment.objects.create(
-                assessment=assessment, file=file, uploaded_by=profile, label=file.name
+            # Hashed while it was received, by the upload handlers
+            create_attachment(
+                assessment,
+                profile,
+                file,
+                file.name,
+                sha256=getattr(file, "sha256", None),
             )
             uploaded_count += 1
 
@@ -1117,8 +1140,9 @@ class AssessmentAttachmentAPIView(APIView):
         assessment = attachment.assessment
         filename = attachment.file.name
 
-        # delete physical file first
-        if attachment.file:
+        # delete physical file first; shared blobs are released by
+        # assessments.signals when the last attachment goes
+        if attachment.file and attachment.blob_id is None:
             attachment.file.delete(save=False)
         attachment.delete()
 
@@ -1136,6 +1160,259 @@ class AssessmentAttachmentAPIView(APIView):
         )
 
 
+class AttachmentUploadAPIView(APIView):
+    """
+    Start a chunked attachment upload (protocol in assessments.uploads).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        profile = request.user.profile
+        assessment_id = request.data.get("assessment_id")
+
+        if not assessment_id:
+            return Response(
+                {"detail": "Assessment ID is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        assessment = get_object_or_404(Assessments, id=assessment_id)
+
+        try:
+            size = int(request.data.get("size"))
+        except (TypeError, ValueError):
+            return Response(
+                {"size": ["A whole number of bytes is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            upload = start_upload(
+                assessment, profile, request.data.get("filename"), size
+            )
+        except UploadRejected as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(
+            f"UPLOAD START - Attachment | "
+            f"assessment_id={assessment.id}, "
+            f"upload_id={upload.upload_id}, "
+            f"size={upload.size}, "
+            f"user={profile.official_name} ({profile.role})"
+        )
+
+        return Response(
+            AttachmentUploadSerializer(upload).data, status=status.HTTP_201_CREATED
+        )
+
+
+class AttachmentUploadDetailAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_upload(self, request, upload_id):
+        # Direct uploads can be cancelled here too, but go to storage
+        return get_object_or_404(
+            AttachmentUpload, upload_id=upload_id, uploaded_by=request.user.profile
+        )
+
+    # =========================
+    # GET (RESUME POINT)
+    # =========================
+    def get(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+        return Response(
+            AttachmentUploadSerializer(upload).data, status=status.HTTP_200_OK
+        )
+
+    # =========================
+    # PUT (APPEND CHUNK)
+    # =========================
+    def put(self, request, upload_id):
+        upload = self.get_upload(request, upload_id)
+
+        if upload.storage_name:
+            return Response(
+                {"detail": "This upload is sent straight to storage"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            offset = int(request.headers.get(UPLOAD_OFFSET_HEADER))
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": f"{UPLOAD_OFFSET_HEADER} and Content-Length are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            # request.stream is read directly; request.data would parse
+            # the whole body into memory
+            upload = append_chunk(
+                upload,
+                offset,
+                request.stream,
+                length,
+                checksum=request.headers.get(CHUNK_CHECKSUM_HEADER),
+            )
+        except OffsetMismatch as e:
+            return Response(
+                {"detail": str(e), "offset": e.offset},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except UploadRejected as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            AttachmentUploadSerializer(upload).data, status=status.HTTP_200_OK
+        )
+
+    # =========================
+    # DELETE (ABORT)
+    # =========================
+    def delete(self, request, upload_id):
+        profile = request.user.profile
+        upload = self.get_upload(request, upload_id)
+
+        if upload.status == AttachmentUpload.COMPLETED:
+            return Response(
+                {"detail": "Upload is already complete"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        abort_upload(upload)
+
+        logger.info(
+            f"UPLOAD ABORT - Attachment | "
+            f"upload_id={upload_id}, "
+            f"user={profile.official_name} ({profile.role})"
+        )
+
+        return Response({"message": "Upload cancelled"}, status=status.HTTP_200_OK)
+
+
+class AttachmentUploadCompleteAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        profile = request.user.profile
+        upload = get_object_or_404(
+            AttachmentUpload, upload_id=upload_id, uploaded_by=profile, storage_name=""
+        )
+
+        try:
+            attachment = complete_upload(upload)
+        except OffsetMismatch as e:
+            return Response(
+                {"detail": "Upload is not finished", "offset": e.offset},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        logger.info(
+            f"UPLOAD - Attachments | "
+            f"assessment_id={upload.assessment_id}, "
+            f"upload_id={upload.upload_id}, "
+            f"user={profile.official_name} ({profile.role}), "
+            f"file={attachment.file.name}"
+        )
+
+        return Response(
+            AssessmentAttachmentSerializer(attachment).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class DirectUploadAPIView(APIView):
+    """
+    Start an attachment upload straight to object storage (protocol in
+    assessments.direct_uploads).
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        profile = request.user.profile
+        assessment_id = request.data.get("assessment_id")
+
+        if not direct_uploads_enabled():
+            return Response(
+                {"detail": "Direct uploads need object storage"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not assessment_id:
+            return Response(
+                {"detail": "Assessment ID is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        assessment = get_object_or_404(Assessments, id=assessment_id)
+
+        try:
+            size = int(request.data.get("size"))
+        except (TypeError, ValueError):
+            return Response(
+                {"size": ["A whole number of bytes is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            upload = start_direct_upload(
+                assessment,
+                profile,
+                request.data.get("filename"),
+                size,
+                request.data.get("sha256"),
+            )
+        except UploadRejected as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(
+            f"UPLOAD START - Direct attachment | "
+            f"assessment_id={assessment.id}, "
+            f"upload_id={upload.upload_id}, "
+            f"size={upload.size}, "
+            f"user={profile.official_name} ({profile.role})"
+        )
+
+        return Response(
+            {**AttachmentUploadSerializer(upload).data, **signed_upload(upload)},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class DirectUploadCompleteAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        profile = request.user.profile
+        upload = get_object_or_404(
+            AttachmentUpload,
+            upload_id=upload_id,
+            uploaded_by=profile,
+            storage_name__gt="",
+        )
+
+        try:
+            attachment = complete_direct_upload(upload)
+        except UploadRejected as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(
+            f"UPLOAD - Attachments | "
+            f"assessment_id={upload.assessment_id}, "
+            f"upload_id={upload.upload_id}, "
+            f"user={profile.official_name} ({profile.role}), "
+            f"file={attachment.file.name}"
+        )
+
+        return Response(
+            AssessmentAttachmentSerializer(attachment).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
 class AssessmentTreatmentPlanAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -2394,3 +2671,209 @@ class AssessmentNotesAPIView(APIView):
         )
 
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PendingSignOffAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = request.user.profile
+
+        # -----------------------------
+        # Permission check
+        # -----------------------------
+        if profile.role == "clinician":
+            evaluator_id = profile.id
+
+        elif profile.role == "admin":
+            evaluator_id = request.query_params.get("evaluator") or profile.id
+
+            if (
+                not str(evaluator_id).isdigit()
+                or not Profile.objects.filter(id=evaluator_id).exists()
+            ):
+                return Response(
+                    {"evaluator": "Evaluator not found"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        else:
+            return Response(
+                {"detail": "You are not allowed to view the sign-off worklist"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        worklist = get_pending_sign_offs(int(evaluator_id))
+
+        logger.info(
+            f"VIEW - Pending Sign-offs | "
+            f"evaluator_id={evaluator_id}, "
+            f"user={profile.official_name} ({profile.role}), "
+            f"total={worklist['total']}"
+        )
+
+        return Response(worklist, status=status.HTTP_200_OK)
+
+
+class StudentProgressAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = request.user.profile
+
+        # -----------------------------
+        # Permission check
+        # -----------------------------
+        if profile.role not in ["clinician", "admin"]:
+            return Response(
+                {"detail": "You are not allowed to view student progress"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # Reads the materialized summary only, never the clinical tables
+        summaries = StudentProgressSummary.objects.select_related("student")
+
+        cohort_code = request.query_params.get("cohort_code")
+        if cohort_code:
+            summaries = summaries.filter(cohort_code=cohort_code)
+
+        serializer = StudentProgressSummarySerializer(summaries, many=True)
+
+        logger.info(
+            f"VIEW - Student Progress | "
+            f"cohort_code={cohort_code or 'all'}, "
+            f"user={profile.official_name} ({profile.role})"
+        )
+
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PatientTimelineAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = request.user.profile
+        patient_hash = request.query_params.get("patient_hash")
+        assessment_id = request.query_params.get("assessment_id")
+
+        if not patient_hash and not assessment_id:
+            return Response(
+                {"detail": "patient_hash or assessment_id is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not patient_hash:
+            assessment = get_object_or_404(Assessments, id=assessment_id)
+
+            if profile.role == "student" and assessment.student != profile:
+                return Response(
+                    {"detail": "You cannot view this assessment"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+            patient_hash = assessment.patient_ic_passport_hash
+
+        try:
+            page_size = int(request.query_params.get("page_size", TIMELINE_PAGE_SIZE))
+        except ValueError:
+            return Response(
+                {"page_size": "page_size must be a number"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        page_size = max(1, min(page_size, TIMELINE_MAX_PAGE_SIZE))
+
+        # -----------------------------
+        # Permission check
+        # -----------------------------
+        assessments = Assessments.objects.filter(patient_ic_passport_hash=patient_hash)
+        if profile.role == "student":
+            assessments = assessments.filter(student=profile)
+
+        if not assessments.exists():
+            return Response(
+                {"detail": "No assessments found for this patient"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        try:
+            timeline = build_patient_timeline(
+                assessments,
+                cursor=request.query_params.get("cursor"),
+                page_size=page_size,
+            )
+        except InvalidCursor as e:
+            return Response({"cursor": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(
+            f"VIEW - Patient Timeline | "
+            f"assessment_ids={timeline['assessment_ids']}, "
+            f"user={profile.official_name} ({profile.role}), "
+            f"events={timeline['count']}"
+        )
+
+        return Response(timeline, status=status.HTTP_200_OK)
+
+
+class ClinicMonthlyReportAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = request.user.profile
+
+        # -----------------------------
+        # Permission check
+        # -----------------------------
+        if profile.role != "admin":
+            return Response(
+                {"detail": "You are not allowed to view clinic reports"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        # -----------------------------
+        # Month range (YYYY-MM), last 12 months by default
+        # -----------------------------
+        today = timezone.localdate()
+        month_index = today.year * 12 + today.month - 1 - 11
+        default_from = date(month_index // 12, month_index % 12 + 1, 1)
+
+        try:
+            from_month = self._parse_month(request.query_params.get("from"), default_from)
+            to_month = self._parse_month(
+                request.query_params.get("to"), today.replace(day=1)
+            )
+        except ValueError:
+            return Response(
+                {"detail": "from and to must be in YYYY-MM format"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if from_month > to_month:
+            return Response(
+                {"detail": "from must not be after to"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        report = monthly_report(from_month, to_month)
+
+        logger.info(
+            f"VIEW - Clinic Monthly Report | "
+            f"from={from_month:%Y-%m}, to={to_month:%Y-%m}, "
+            f"user={profile.official_name} ({profile.role})"
+        )
+
+        # DRF reserves ?format=, so CSV is requested with ?export=csv
+        if request.query_params.get("export") == "csv":
+            response = HttpResponse(content_type="text/csv")
+            response["Content-Disposition"] = (
+                f'attachment; filename="clinic_report_{from_month:%Y-%m}_{to_month:%Y-%m}.csv"'
+            )
+            write_report_csv(report, response)
+            return response
+
+        return Response(report, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _parse_month(value, default):
+        if not value:
+            return default
+        return datetime.strptime(value, "%Y-%m").date()
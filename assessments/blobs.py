@@ -0,0 +1,188 @@
+"""
+Content-addressed attachment storage. Attachments with identical bytes
+point at one AttachmentBlob, stored under the SHA-256 of its content and
+reference counted; the file is deleted with its last attachment.
+
+Multipart uploads are hashed while Django receives them (the upload
+handlers in assessments.uploads set .sha256 on each file); chunked uploads
+are hashed from their partial file when completed. Images are normalized
+once stored (assessments.normalize).
+"""
+import hashlib
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import AssessmentAttachment, AttachmentBlob
+from .normalize import initial_normalization
+
+logger = logging.getLogger("assessments")
+
+
+def file_sha256(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def attach_blob(attachment, content, sha256=None):
+    """
+    Point an unsaved attachment at the blob holding `content`, storing it
+    if no attachment has these bytes yet. Call inside the transaction that
+    saves the attachment.
+    """
+    sha256 = sha256 or file_sha256(content)
+
+    with transaction.atomic():
+        blob = _existing_blob(sha256)
+
+        if blob is None:
+            blob = AttachmentBlob(
+                sha256=sha256,
+                size=content.size,
+                ref_count=1,
+                normalization=initial_normalization(content.name),
+            )
+            # Always a new name: an unreferenced file with this hash may be
+            # waiting for its on_commit delete
+            blob.file.save(content.name, content, save=False)
+            try:
+                with transaction.atomic():
+                    blob.save()
+            except IntegrityError:
+                # Stored by a concurrent upload of the same bytes
+                blob.file.delete(save=False)
+                blob = _add_reference(sha256)
+
+    attachment.blob = blob
+    attachment.file = blob.file.name
+    return blob
+
+
+def attach_stored_blob(attachment, name, sha256, size):
+    """
+    attach_blob() for bytes already in storage under `name`, sent there by
+    the browser (assessments.direct_uploads): they become the new blob's
+    file as they are. Returns True if a blob already had these bytes, in
+    which case the caller deletes `name`.
+    """
+    with transaction.atomic():
+        blob = _existing_blob(sha256)
+        duplicate = blob is not None
+
+        if blob is None:
+            blob = AttachmentBlob(
+                sha256=sha256,
+                size=size,
+                ref_count=1,
+                normalization=initial_normalization(name),
+            )
+            blob.file.name = name
+            try:
+                with transaction.atomic():
+                    blob.save()
+            except IntegrityError:
+                blob = _add_reference(sha256)
+                duplicate = True
+
+    attachment.blob = blob
+    attachment.file = blob.file.name
+    return duplicate
+
+
+def _existing_blob(sha256):
+    """
+    The blob with these bytes with one more reference, or None.
+
+    Checked with a plain read before locking: on InnoDB a locking read of a
+    missing key takes a gap lock, and two uploads of the same new file
+    would then deadlock on their inserts. A new blob is inserted instead,
+    the unique sha256 turning a race into an IntegrityError.
+    """
+    if not AttachmentBlob.objects.filter(sha256=sha256).exists():
+        return None
+    try:
+        return _add_reference(sha256)
+    except AttachmentBlob.DoesNotExist:
+        # Its last attachment was deleted meanwhile
+        return None
+
+
+def _add_reference(sha256):
+    blob = AttachmentBlob.objects.select_for_update().get(sha256=sha256)
+    blob.ref_count = F("ref_count") + 1
+    blob.save(update_fields=["ref_count"])
+    return blob
+
+
+def create_attachment(assessment, profile, content, label, sha256=None):
+    with transaction.atomic():
+        attachment = AssessmentAttachment(
+            assessment=assessment, uploaded_by=profile, label=label[:100]
+        )
+        attach_blob(attachment, content, sha256=sha256)
+        attachment.save()
+    return attachment
+
+
+def _file_names(blob):
+    # The normalized image and, if kept, the upload it was made from
+    return [
+        (fieldfile.storage, fieldfile.name)
+        for fieldfile in (blob.file, blob.original)
+        if fieldfile
+    ]
+
+
+def _delete_files(names):
+    for storage, name in names:
+        storage.delete(name)
+
+
+def release_blob(blob_id):
+    """
+    Drop one reference; the last one deletes the blob and, after commit,
+    its file.
+    """
+    with transaction.atomic():
+        blob = AttachmentBlob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None:
+            return
+
+        if blob.ref_count > 1:
+            blob.ref_count = F("ref_count") - 1
+            blob.save(update_fields=["ref_count"])
+            return
+
+        names = _file_names(blob)
+        blob.delete()
+        transaction.on_commit(lambda: _delete_files(names))
+
+
+def recount_blobs():
+    """
+    Set every blob's ref_count from its attachments and delete blobs
+    nothing points at. Returns (corrected, deleted).
+    """
+    corrected = deleted = 0
+    blobs = AttachmentBlob.objects.annotate(refs=Count("attachments"))
+
+    for blob in blobs.iterator():
+        if blob.refs == 0:
+            names = _file_names(blob)
+            blob.delete()
+            _delete_files(names)
+            deleted += 1
+        elif blob.refs != blob.ref_count:
+            AttachmentBlob.objects.filter(pk=blob.pk).update(ref_count=blob.refs)
+            corrected += 1
+
+    if corrected or deleted:
+        logger.warning(
+            f"BLOB RECOUNT | corrected={corrected}, deleted={deleted}"
+        )
+    return corrected, deleted
@@ -119,3 +119,40 @@ DISCHARGE_FIELDS = [
     "reason_for_discharge",
     "discharge_remarks",
 ]
+
+# Sign-off flags on an assessment:
+# (key, label, signed flag field, signed at field)
+ASSESSMENT_SIGN_OFFS = [
+    ("section_1", "Section 1", "is_section_1_signed", "section_1_signed_at"),
+    ("section_2", "Section 2", "is_section_2_signed", "section_2_signed_at"),
+    ("section_3", "Section 3", "is_section_3_signed", "section_3_signed_at"),
+    ("section_4", "Section 4", "is_section_4_signed", "section_4_signed_at"),
+    ("consent", "Consent", "is_consent_section_signed", "consent_section_signed_at"),
+    (
+        "treatment_plan",
+        "Treatment Plan",
+        "is_treatment_plan_signed",
+        "treatment_plan_signed_at",
+    ),
+    ("discharge", "Discharge", "is_discharged", "discharge_signed_at"),
+]
+
+# Signatures and the ROM drawing: an image file, or pen strokes kept in a
+# StrokeDrawing
+DRAWING_FIELDS = {
+    "rom_drawing": "ROM drawing",
+    "initial_patient_consent_signature": "Initial patient consent signature",
+    "attending_consent_signature": "Attending consent signature",
+    "witness_consent_signature": "Witness consent signature",
+    "pdpa_consent_signature": "PDPA consent signature",
+}
+
+# File types accepted as assessment attachments
+ALLOWED_EXTENSIONS = {
+    ".pdf",
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".doc",
+    ".docx",
+}
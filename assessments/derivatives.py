@@ -0,0 +1,275 @@
+"""
+Thumbnails and previews of uploaded images.
+
+When an attachment, signature or ROM drawing is saved, assessments.signals
+records its derivatives as pending MediaDerivative rows and, once the
+transaction commits, renders them on a small thread pool; Pillow releases
+the GIL while it decodes and encodes. Each original is decoded once, the
+preview is cut from it and the thumbnail from the preview.
+
+`python manage.py generate_media_derivatives` renders whatever is still
+pending (a restart drops queued work) and backfills older uploads.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .constants import DRAWING_FIELDS
+from .models import (
+    AssessmentAttachment,
+    Assessments,
+    AttachmentBlob,
+    MediaDerivative,
+)
+
+logger = logging.getLogger("assessments")
+
+# Originals Pillow can read; PDFs and Word files get no derivatives
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# File fields that get derivatives, per model
+DERIVATIVE_FIELDS = {
+    Assessments: tuple(DRAWING_FIELDS),
+    AssessmentAttachment: ("file",),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.MEDIA_DERIVATIVE_WORKERS,
+                thread_name_prefix="media-derivatives",
+            )
+    return _executor
+
+
+def output_format():
+    fmt = settings.MEDIA_DERIVATIVE_FORMAT.upper()
+    if fmt == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return fmt
+
+
+def is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+# -----------------------------
+# Queueing
+# -----------------------------
+def queue_derivatives(instance, field_name, background=True):
+    """
+    Record pending derivatives for one file field, dropping those of the
+    file it replaced. With background=True they are rendered on the thread
+    pool after commit. Returns the pending derivative IDs.
+    """
+    fieldfile = getattr(instance, field_name)
+    model_name = instance._meta.model_name
+
+    stale = MediaDerivative.objects.filter(
+        source_model=model_name, source_id=instance.pk, source_field=field_name
+    )
+    if fieldfile:
+        stale = stale.exclude(source_name=fieldfile.name)
+    # Their files go in assessments.signals
+    stale.delete()
+
+    if not fieldfile or not is_image(fieldfile.name):
+        return []
+    # Rendered from the normalized image (assessments.normalize)
+    blob = getattr(instance, "blob", None)
+    if blob is not None and blob.normalization == AttachmentBlob.PENDING:
+        return []
+
+    assessment_id = (
+        instance.pk if isinstance(instance, Assessments) else instance.assessment_id
+    )
+    # Another attachment with the same blob already has them rendered
+    rendered = {
+        derivative.kind: derivative
+        for derivative in MediaDerivative.objects.filter(
+            source_name=fieldfile.name, status=MediaDerivative.READY
+        )
+    }
+    MediaDerivative.objects.bulk_create(
+        [
+            MediaDerivative(
+                assessment_id=assessment_id,
+                source_model=model_name,
+                source_id=instance.pk,
+                source_field=field_name,
+                source_name=fieldfile.name,
+                kind=kind,
+                **(
+                    {
+                        "status": MediaDerivative.READY,
+                        "file": rendered[kind].file.name,
+                        "width": rendered[kind].width,
+                        "height": rendered[kind].height,
+                    }
+                    if kind in rendered
+                    else {}
+                ),
+            )
+            for kind in settings.MEDIA_DERIVATIVE_SIZES
+        ],
+        ignore_conflicts=True,
+    )
+    ids = list(
+        MediaDerivative.objects.filter(
+            source_model=model_name,
+            source_id=instance.pk,
+            source_field=field_name,
+            status=MediaDerivative.PENDING,
+        ).values_list("id", flat=True)
+    )
+
+    if ids and background and settings.MEDIA_DERIVATIVE_WORKERS > 0:
+        transaction.on_commit(lambda: _get_executor().submit(_render_in_background, ids))
+    return ids
+
+
+# -----------------------------
+# Rendering
+# -----------------------------
+def _prepare(image, fmt):
+    # JPEG has no alpha: flatten transparent signatures onto white
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+    if fmt == "JPEG" and has_alpha:
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode not in ("RGB", "RGBA"):
+        return image.convert("RGBA" if has_alpha else "RGB")
+    return image
+
+
+def _store(derivative, image, fmt):
+    buffer = io.BytesIO()
+    options = {"quality": settings.MEDIA_DERIVATIVE_QUALITY}
+    if fmt == "WEBP":
+        options["method"] = 4
+    else:
+        options["optimize"] = True
+    image.save(buffer, format=fmt, **options)
+
+    stem = os.path.splitext(os.path.basename(derivative.source_name))[0]
+    derivative.file.save(
+        f"{stem}-{derivative.kind}.{fmt.lower()}",
+        ContentFile(buffer.getvalue()),
+        save=False,
+    )
+
+    # update() so a derivative deleted meanwhile (original replaced) is not
+    # brought back by save()
+    updated = MediaDerivative.objects.filter(pk=derivative.pk).update(
+        file=derivative.file.name,
+        width=image.width,
+        height=image.height,
+        status=MediaDerivative.READY,
+        error="",
+    )
+    if not updated:
+        derivative.file.delete(save=False)
+
+
+def _render_source(source_name, derivatives):
+    """
+    Render all derivatives of one original from a single decode.
+    """
+    fmt = output_format()
+    sizes = settings.MEDIA_DERIVATIVE_SIZES
+    # Largest first, each one downscaled from the previous
+    derivatives = sorted(derivatives, key=lambda d: sizes[d.kind], reverse=True)
+    storage = derivatives[0].file.storage
+
+    try:
+        with storage.open(source_name, "rb") as f, Image.open(f) as original:
+            largest = sizes[derivatives[0].kind]
+            # JPEG only: decode straight at a reduced scale
+            original.draft("RGB", (largest, largest))
+            image = _prepare(ImageOps.exif_transpose(original), fmt)
+
+            for derivative in derivatives:
+                size = sizes[derivative.kind]
+                image = image.copy()
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                _store(derivative, image, fmt)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        MediaDerivative.objects.filter(pk__in=[d.pk for d in derivatives]).update(
+            status=MediaDerivative.FAILED, error=str(e)[:2000]
+        )
+        logger.warning(f"DERIVATIVES FAILED | source={source_name}, error={e}")
+        return 0, len(derivatives)
+
+    return len(derivatives), 0
+
+
+def render_derivatives(queryset, workers=1):
+    """
+    Render the given derivatives, grouped by original. Returns
+    (ready, failed) counts.
+    """
+    by_source = {}
+    for derivative in queryset:
+        by_source.setdefault(derivative.source_name, []).append(derivative)
+
+    if workers <= 1:
+        results = [_render_source(*item) for item in by_source.items()]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(
+                executor.map(lambda item: _render_in_thread(*item), by_source.items())
+            )
+
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def _render_in_thread(source_name, derivatives):
+    try:
+        return _render_source(source_name, derivatives)
+    finally:
+        connections.close_all()
+
+
+def _render_in_background(ids):
+    try:
+        render_derivatives(
+            MediaDerivative.objects.filter(id__in=ids, status=MediaDerivative.PENDING)
+        )
+    except Exception:
+        logger.exception(f"DERIVATIVES FAILED | ids={ids}")
+    finally:
+        connections.close_all()
+
+
+# -----------------------------
+# Lookup
+# -----------------------------
+def derivative_urls(assessment_id):
+    """
+    {original storage name: {kind: url}} for an assessment's ready
+    derivatives, in one query.
+    """
+    urls = {}
+    derivatives = MediaDerivative.objects.filter(
+        assessment_id=assessment_id, status=MediaDerivative.READY
+    ).only("id", "source_name", "kind", "file")
+    for derivative in derivatives:
+        urls.setdefault(derivative.source_name, {})[derivative.kind] = (
+            derivative.file.url
+        )
+    return urls
@@ -0,0 +1,190 @@
+"""
+Attachments uploaded by the browser straight to object storage.
+
+With MEDIA_STORAGE = "s3" the attachment form sends each file to the bucket
+on a signed URL instead of through the app, so no worker is tied up for the
+length of an upload:
+
+    POST api/assessment-attachments/direct-uploads/
+         {"assessment_id", "filename", "size", "sha256"}
+         -> {"upload_id", "url", "method", "headers", ...}
+    PUT  <url>, the file as body, with the returned headers
+    POST api/assessment-attachments/direct-uploads/<upload_id>/complete/
+
+The URL expires after MEDIA_SIGNED_URL_EXPIRY seconds and is signed for the
+declared size and SHA-256, which the bucket checks the body against; the
+app checks them again when the upload is completed. The object becomes the
+attachment's blob (assessments.blobs) where it is, so the app never reads
+it; if a blob already has the same bytes the object is deleted instead.
+Unfinished uploads and their objects are removed by clean_attachment_uploads.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .blobs import attach_stored_blob
+from .models import AssessmentAttachment, AttachmentUpload
+from .uploads import UploadRejected, validate_upload
+
+# Storage prefix of files sent straight to the bucket
+DIRECT_UPLOAD_PREFIX = "assessments/blobs/uploads/"
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def direct_uploads_enabled():
+    return settings.MEDIA_STORAGE == "s3"
+
+
+def _client():
+    # django-storages' S3Storage
+    return default_storage.connection.meta.client
+
+
+def _object_key(name):
+    location = default_storage.location
+    return posixpath.join(location, name) if location else name
+
+
+def _checksum(sha256):
+    # S3 takes checksums base64 encoded
+    return base64.b64encode(bytes.fromhex(sha256)).decode()
+
+
+def start_direct_upload(assessment, profile, filename, size, sha256):
+    filename = validate_upload(filename, size)
+    sha256 = (sha256 or "").strip().lower()
+    if not SHA256_RE.match(sha256):
+        raise UploadRejected("SHA-256 of the file is required")
+
+    upload_id = uuid.uuid4()
+    ext = os.path.splitext(filename)[1].lower()
+    return AttachmentUpload.objects.create(
+        upload_id=upload_id,
+        assessment=assessment,
+        uploaded_by=profile,
+        filename=filename,
+        size=size,
+        storage_name=f"{DIRECT_UPLOAD_PREFIX}{upload_id}{ext}",
+        sha256=sha256,
+    )
+
+
+def signed_upload(upload):
+    """
+    Where and how the browser sends the file: a URL only good for this
+    object, this size and this SHA-256, for MEDIA_SIGNED_URL_EXPIRY seconds.
+    """
+    checksum = _checksum(upload.sha256)
+    url = _client().generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": default_storage.bucket_name,
+            "Key": _object_key(upload.storage_name),
+            "ContentLength": upload.size,
+            "ChecksumSHA256": checksum,
+        },
+        ExpiresIn=settings.MEDIA_SIGNED_URL_EXPIRY,
+        HttpMethod="PUT",
+    )
+    return {
+        "url": url,
+        "method": "PUT",
+        # Signed, so the browser must send them as they are
+        "headers": {"x-amz-checksum-sha256": checksum},
+        "expires_in": settings.MEDIA_SIGNED_URL_EXPIRY,
+    }
+
+
+def _stored_sha256(upload, head):
+    checksum = head.get("ChecksumSHA256")
+    if checksum:
+        try:
+            return base64.b64decode(checksum).hex()
+        except (binascii.Error, ValueError):
+            pass
+
+    # A store that keeps no checksums: hash it from storage
+    digest = hashlib.sha256()
+    with default_storage.open(upload.storage_name, "rb") as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _rejected(upload, message):
+    name = upload.storage_name
+    transaction.on_commit(lambda: default_storage.delete(name))
+    return UploadRejected(message)
+
+
+def _check_stored_object(upload):
+    """
+    Check the object the browser sent against the declared size and
+    SHA-256. Raises UploadRejected.
+    """
+    if not default_storage.exists(upload.storage_name):
+        raise UploadRejected("The file has not been uploaded yet")
+
+    head = _client().head_object(
+        Bucket=default_storage.bucket_name,
+        Key=_object_key(upload.storage_name),
+        ChecksumMode="ENABLED",
+    )
+
+    if head["ContentLength"] != upload.size:
+        raise _rejected(
+            upload,
+            f"Uploaded {head['ContentLength']} bytes, expected {upload.size}",
+        )
+    if _stored_sha256(upload, head) != upload.sha256:
+        raise _rejected(upload, "Uploaded file does not match its SHA-256")
+
+
+def complete_direct_upload(upload):
+    """
+    Check the object the browser sent and turn it into an
+    AssessmentAttachment.
+    """
+    if upload.status == AttachmentUpload.COMPLETED:
+        return upload.attachment
+
+    # Storage requests, possibly reading the whole object, run before the
+    # row is locked
+    _check_stored_object(upload)
+
+    with transaction.atomic():
+        upload = AttachmentUpload.objects.select_for_update().get(pk=upload.pk)
+
+        # Completed by a concurrent request meanwhile
+        if upload.status == AttachmentUpload.COMPLETED:
+            return upload.attachment
+
+        attachment = AssessmentAttachment(
+            assessment=upload.assessment,
+            uploaded_by=upload.uploaded_by,
+            label=upload.filename[:100],
+        )
+        duplicate = attach_stored_blob(
+            attachment, upload.storage_name, upload.sha256, upload.size
+        )
+        attachment.save()
+
+        upload.offset = upload.size
+        upload.status = AttachmentUpload.COMPLETED
+        upload.attachment = attachment
+        upload.save(update_fields=["offset", "status", "attachment", "updated_at"])
+
+        if duplicate:
+            name = upload.storage_name
+            transaction.on_commit(lambda: default_storage.delete(name))
+
+    return attachment
@@ -0,0 +1,96 @@
+"""
+Signatures and ROM drawings from the canvas widgets.
+
+The forms send each canvas as a PNG file part of a multipart request; a
+data URL inside JSON (the old format) is still accepted. Either way the
+image is checked against DRAWING_MAX_UPLOAD_SIZE and DRAWING_MAX_DIMENSION,
+downscaled if needed and re-encoded as a palette PNG: canvas exports are
+full 32-bit RGBA although a signature is one ink colour over transparency,
+so quantizing to DRAWING_PNG_COLORS keeps the anti-aliasing and drops most
+of the bytes.
+"""
+import base64
+import binascii
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, UnidentifiedImageError
+
+SIGNATURE = "signature"
+ROM_DRAWING = "rom_drawing"
+
+# Formats a canvas can export
+DRAWING_FORMATS = {"PNG", "JPEG", "WEBP"}
+
+
+class DrawingRejected(ValueError):
+    pass
+
+
+def _read(value):
+    """
+    Raw bytes of an uploaded file or a data URL.
+    """
+    limit = settings.DRAWING_MAX_UPLOAD_SIZE
+
+    if isinstance(value, UploadedFile):
+        if value.size > limit:
+            raise DrawingRejected(f"Image exceeds {limit // (1024 * 1024)} MB")
+        value.seek(0)
+        return value.read()
+
+    if not isinstance(value, str) or ";base64," not in value:
+        raise DrawingRejected("Expected an image file or a base64 data URL")
+
+    encoded = value.split(";base64,", 1)[1]
+    # 4 characters per 3 bytes; checked before decoding
+    if len(encoded) * 3 // 4 > limit:
+        raise DrawingRejected(f"Image exceeds {limit // (1024 * 1024)} MB")
+    try:
+        return base64.b64decode(encoded, validate=True)
+    except (binascii.Error, ValueError):
+        raise DrawingRejected("Invalid base64 image data")
+
+
+def optimize_drawing(value, kind):
+    """
+    Validate and re-encode a canvas image. Returns a ContentFile named
+    "<kind>.png", or the original bytes if re-encoding would not shrink
+    them.
+    """
+    raw = _read(value)
+    max_dimension = settings.DRAWING_MAX_DIMENSION
+
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            if image.format not in DRAWING_FORMATS:
+                raise DrawingRejected(f"Unsupported image type {image.format}")
+            # Checked before decoding any pixels
+            if image.width * image.height > (max_dimension * 4) ** 2:
+                raise DrawingRejected("Image dimensions are too large")
+            original_format = image.format
+
+            image = image.convert("RGBA")
+            resized = max(image.size) > max_dimension
+            if resized:
+                image.thumbnail(
+                    (max_dimension, max_dimension), Image.Resampling.LANCZOS
+                )
+
+            quantized = image.quantize(
+                colors=settings.DRAWING_PNG_COLORS[kind],
+                method=Image.Quantize.FASTOCTREE,
+                dither=Image.Dither.NONE,
+            )
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        raise DrawingRejected("Invalid image data")
+
+    buffer = io.BytesIO()
+    quantized.save(buffer, format="PNG", optimize=True)
+    data = buffer.getvalue()
+
+    if original_format == "PNG" and not resized and len(raw) <= len(data):
+        data = raw
+    return ContentFile(data, name=f"{kind.replace('_', '-')}.png")
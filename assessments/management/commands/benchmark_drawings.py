@@ -0,0 +1,246 @@
+import base64
+import io
+import json
+import random
+import statistics
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image, ImageDraw
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from assessments.api import AssessmentConsentAPIView, AssessmentSection3APIView
+from assessments.derivatives import DERIVATIVE_FIELDS
+from assessments.models import Assessments, StrokeDrawing
+
+
+class _Rollback(Exception):
+    pass
+
+
+# (view, request key, stored field, canvas size, strokes, line width)
+CASES = {
+    "signature": (
+        AssessmentConsentAPIView,
+        "attending_signature_data",
+        "attending_consent_signature",
+        (600, 200),
+        6,
+        2,
+    ),
+    "rom_drawing": (
+        AssessmentSection3APIView,
+        "rom_drawing_data",
+        "rom_drawing",
+        (1100, 600),
+        25,
+        2,
+    ),
+}
+
+
+def _strokes(size, count, seed=1):
+    """
+    Random pen strokes, as absolute points, one every few pixels like
+    pointer events.
+    """
+    rng = random.Random(seed)
+    w, h = size
+    strokes = []
+    for _ in range(count):
+        x, y = rng.randint(0, w), rng.randint(0, h)
+        points = []
+        for _ in range(120):
+            x = min(max(x + rng.randint(-5, 5), 0), w)
+            y = min(max(y + rng.randint(-3, 3), 0), h)
+            points.append((x, y))
+        strokes.append(points)
+    return strokes
+
+
+def _canvas(size, strokes, width):
+    """
+    The canvas export of the strokes: drawn at twice the size and scaled
+    down so the edges are anti-aliased like a browser's.
+    """
+    w, h = size
+    image = Image.new("RGBA", (w * 2, h * 2), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for points in strokes:
+        draw.line(
+            [(x * 2, y * 2) for x, y in points], fill="#000", width=width * 2, joint="curve"
+        )
+
+    buffer = io.BytesIO()
+    image.resize(size, Image.Resampling.LANCZOS).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _stroke_data(size, strokes, width):
+    # As the forms' strokeData() encodes them
+    encoded = []
+    for points in strokes:
+        x, y = points[0]
+        stroke = [x, y]
+        for nx, ny in points[1:]:
+            if (nx, ny) != (x, y):
+                stroke += [nx - x, ny - y]
+                x, y = nx, ny
+        encoded.append(stroke)
+    return json.dumps(
+        {"width": size[0], "height": size[1], "line_width": width, "strokes": encoded},
+        separators=(",", ":"),
+    )
+
+
+# Compare storing signatures and ROM drawings the old way (base64 data URL in
+# JSON, stored as drawn) with PNG uploads optimized on the server and with
+# stroke data.
+# Uploads go to a copy of an existing assessment, which is rolled back along
+# with everything else; the files it gets are deleted.
+# python manage.py benchmark_drawings
+
+# More runs, copying a given assessment
+# python manage.py benchmark_drawings --assessment 12 --runs 20
+class Command(BaseCommand):
+    help = "Benchmark signature and ROM drawing uploads: base64, PNG and strokes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--assessment",
+            type=int,
+            help="Assessment to copy (default: the latest not discharged)",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=5,
+            help="Requests per case; the median time is reported (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        if options["runs"] < 1:
+            raise CommandError("--runs must be at least 1.")
+
+        assessments = Assessments.objects.filter(is_discharged=False)
+        if options["assessment"]:
+            assessments = assessments.filter(pk=options["assessment"])
+        assessment = assessments.select_related("evaluator__user").order_by("-id").first()
+        if assessment is None or assessment.evaluator is None:
+            raise CommandError(
+                "No assessment that is not discharged and has an evaluator."
+            )
+
+        results = []
+        try:
+            with transaction.atomic():
+                # The views delete replaced files, so never upload to a real
+                # assessment
+                assessment.pk = None
+                for field in DERIVATIVE_FIELDS[Assessments]:
+                    setattr(assessment, field, None)
+                assessment.save()
+
+                for kind, case in CASES.items():
+                    results.extend(self._measure(assessment, kind, case, options))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(
+            f"{'drawing':<13}{'transport':<24}{'request':>11}{'stored':>11}{'time':>10}"
+        )
+        for kind, transport, request_bytes, stored, elapsed in results:
+            self.stdout.write(
+                f"{kind:<13}{transport:<24}{request_bytes:>11,}{stored:>11,}"
+                f"{elapsed * 1000:9.1f}ms"
+            )
+        self.stdout.write(
+            "Before: decoding and storing only, without the request around it."
+        )
+        self.stdout.write("Changes rolled back.")
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
+
+    def _measure(self, assessment, kind, case, options):
+        view_class, key, field, size, count, width = case
+        strokes = _strokes(size, count)
+        png = _canvas(size, strokes, width)
+        stroke_data = _stroke_data(size, strokes, width)
+        data_url = "data:image/png;base64," + base64.b64encode(png).decode()
+        factory = APIRequestFactory()
+        view = view_class.as_view()
+        user = assessment.evaluator.user
+
+        # Before: the handlers decoded the data URL and stored it as drawn
+        body = json.dumps({"assessment_id": assessment.id, key: data_url})
+        timings = []
+        for _ in range(options["runs"]):
+            started = time.perf_counter()
+            payload = json.loads(body)
+            decoded = base64.b64decode(payload[key].split(";base64,")[1])
+            name = default_storage.save(f"benchmark/{kind}.png", io.BytesIO(decoded))
+            timings.append(time.perf_counter() - started)
+            default_storage.delete(name)
+        results = [
+            (kind, "before (JSON, as drawn)", len(body), len(png), statistics.median(timings))
+        ]
+
+        for transport, make_request in (
+            ("JSON base64", lambda: factory.put("/", body, content_type="application/json")),
+            (
+                "multipart PNG",
+                lambda: factory.put(
+                    "/",
+                    {
+                        "assessment_id": assessment.id,
+                        key: _named(png, f"{kind}.png"),
+                    },
+                    format="multipart",
+                ),
+            ),
+            (
+                "multipart strokes",
+                lambda: factory.put(
+                    "/",
+                    {"assessment_id": assessment.id, key: stroke_data},
+                    format="multipart",
+                ),
+            ),
+        ):
+            timings = []
+            for _ in range(options["runs"]):
+                request = make_request()
+                force_authenticate(request, user=user)
+                request_bytes = len(request.body)
+
+                started = time.perf_counter()
+                response = view(request)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise CommandError(f"{kind} {transport}: {response.data}")
+
+                assessment.refresh_from_db(fields=[field])
+                fieldfile = getattr(assessment, field)
+                if fieldfile:
+                    stored = fieldfile.size
+                    # Nothing on disk outlives the rolled back rows
+                    default_storage.delete(fieldfile.name)
+                else:
+                    stored = len(
+                        StrokeDrawing.objects.get(
+                            assessment=assessment, field=field
+                        ).data
+                    )
+
+            results.append(
+                (kind, transport, request_bytes, stored, statistics.median(timings))
+            )
+        return results
+
+
+def _named(data, name):
+    f = io.BytesIO(data)
+    f.name = name
+    return f
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from assessments.uploads import expire_uploads
+
+# Usage:
+#   python manage.py clean_attachment_uploads
+#   python manage.py clean_attachment_uploads --hours 6
+
+
+class Command(BaseCommand):
+    help = "Remove attachment uploads that were never completed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS,
+            help=(
+                "Remove uploads idle for this many hours "
+                f"(default: {settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS})"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        removed = expire_uploads(hours=options["hours"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Removed {removed} unfinished upload(s)")
+        )
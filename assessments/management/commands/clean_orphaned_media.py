@@ -0,0 +1,221 @@
+import logging
+import os
+import posixpath
+import sqlite3
+import tempfile
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+logger = logging.getLogger("assessments")
+
+# Files younger than this may belong to a row that is not committed yet
+# (a blob saved inside its transaction, a derivative being rendered)
+DEFAULT_MIN_AGE_HOURS = 24
+
+# Names per INSERT batch and database rows fetched per query
+BATCH_SIZE = 5000
+
+# Find files under MEDIA_ROOT that no FileField of any model points at:
+# replaced signatures, uploads made before their assessment was saved
+# (assessments/temp/), files left by deleted rows. Referenced names are
+# collected into an on-disk SQLite index first and the tree is then walked
+# one directory entry at a time, so memory stays flat however many files
+# there are. MEDIA_PUBLIC_DIRS are never touched. With object storage
+# (MEDIA_STORAGE = "s3") the bucket is listed instead of MEDIA_ROOT.
+# python manage.py clean_orphaned_media
+# python manage.py clean_orphaned_media --delete
+# python manage.py clean_orphaned_media --delete --hours 72
+
+
+def _normalize(name):
+    return posixpath.normpath(name.replace(os.sep, "/")).lstrip("/")
+
+
+def _file_fields():
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and field.concrete:
+                yield model, field.attname
+
+
+def _referenced_names():
+    for model, field in _file_fields():
+        names = (
+            model._base_manager.exclude(**{f"{field}__isnull": True})
+            .exclude(**{field: ""})
+            .values_list(field, flat=True)
+        )
+        for name in names.iterator(chunk_size=BATCH_SIZE):
+            yield (_normalize(name),)
+
+
+class Command(BaseCommand):
+    help = "Report, and optionally delete, media files no model refers to"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Delete the orphaned files (default: only list them).",
+        )
+        parser.add_argument(
+            "--hours",
+            type=int,
+            default=DEFAULT_MIN_AGE_HOURS,
+            help=(
+                "Leave files modified in the last this many hours "
+                f"(default: {DEFAULT_MIN_AGE_HOURS})"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["hours"] < 0:
+            raise CommandError("--hours cannot be negative.")
+
+        local = isinstance(default_storage, FileSystemStorage)
+        self.root = os.path.realpath(settings.MEDIA_ROOT)
+        if local and not os.path.isdir(self.root):
+            raise CommandError(f"MEDIA_ROOT {self.root} is not a directory.")
+
+        self.delete = options["delete"]
+        self.cutoff = time.time() - options["hours"] * 60 * 60
+        self.skipped_dirs = {
+            _normalize(public_dir) for public_dir in settings.MEDIA_PUBLIC_DIRS
+        }
+        # Partial chunked uploads, if configured inside MEDIA_ROOT
+        upload_dir = os.path.realpath(settings.ATTACHMENT_UPLOAD_TEMP_DIR)
+        if upload_dir.startswith(self.root + os.sep):
+            self.skipped_dirs.add(_normalize(os.path.relpath(upload_dir, self.root)))
+
+        self.scanned = self.recent = self.orphaned = self.orphaned_bytes = 0
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.index = sqlite3.connect(os.path.join(tmp, "referenced.sqlite3"))
+            try:
+                self.index.execute("PRAGMA journal_mode = OFF")
+                self.index.execute("PRAGMA synchronous = OFF")
+                self.index.execute(
+                    "CREATE TABLE referenced (name TEXT PRIMARY KEY) WITHOUT ROWID"
+                )
+                self.index.executemany(
+                    "INSERT OR IGNORE INTO referenced VALUES (?)", _referenced_names()
+                )
+                self.index.commit()
+                referenced = self.index.execute(
+                    "SELECT COUNT(*) FROM referenced"
+                ).fetchone()[0]
+
+                if local:
+                    self._scan(self.root, "")
+                else:
+                    self._scan_storage()
+            finally:
+                self.index.close()
+
+        if self.delete and self.orphaned:
+            logger.info(
+                f"DELETE - Orphaned media | files={self.orphaned}, "
+                f"bytes={self.orphaned_bytes}"
+            )
+
+        prefix = "Deleted" if self.delete else "Found"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {self.orphaned} orphaned file(s), "
+                f"{self.orphaned_bytes / (1024 * 1024):.1f} MB: "
+                f"Scanned={self.scanned}, Referenced={referenced}, "
+                f"Too recent={self.recent}"
+            )
+        )
+
+    def _scan(self, path, prefix):
+        """
+        Check every file below `path` (`prefix` relative to MEDIA_ROOT).
+        Returns True if a file was deleted here or below.
+        """
+        deleted = False
+        with os.scandir(path) as entries:
+            for entry in entries:
+                name = prefix + entry.name
+
+                if entry.is_dir(follow_symlinks=False):
+                    if name in self.skipped_dirs:
+                        continue
+                    if self._scan(entry.path, name + "/"):
+                        deleted = True
+                        self._remove_if_empty(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                if not self._is_orphan(name):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if not self._is_old(name, stat.st_mtime, stat.st_size):
+                    continue
+
+                if self.delete:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                    deleted = True
+        return deleted
+
+    def _scan_storage(self):
+        """
+        Check every object in default_storage's bucket (django-storages'
+        S3Storage), streamed one listing page of up to 1000 keys at a time.
+        The listing carries each object's size and age, so checking an
+        orphan takes no further requests.
+        """
+        location = default_storage.location.strip("/")
+        prefix = f"{location}/" if location else ""
+        paginator = default_storage.connection.meta.client.get_paginator(
+            "list_objects_v2"
+        )
+
+        for page in paginator.paginate(
+            Bucket=default_storage.bucket_name, Prefix=prefix
+        ):
+            for item in page.get("Contents", ()):
+                name = item["Key"][len(prefix) :]
+                if any(name.startswith(f"{skipped}/") for skipped in self.skipped_dirs):
+                    continue
+                if not self._is_orphan(name):
+                    continue
+                if not self._is_old(name, item["LastModified"].timestamp(), item["Size"]):
+                    continue
+                if self.delete:
+                    default_storage.delete(name)
+
+    def _is_orphan(self, name):
+        self.scanned += 1
+        return not self.index.execute(
+            "SELECT 1 FROM referenced WHERE name = ?", (name,)
+        ).fetchone()
+
+    def _is_old(self, name, modified, size):
+        """
+        Count an orphan; True if it is old enough to report.
+        """
+        if modified > self.cutoff:
+            self.recent += 1
+            return False
+
+        self.orphaned += 1
+        self.orphaned_bytes += size
+        self.stdout.write(name)
+        return True
+
+    def _remove_if_empty(self, path):
+        try:
+            os.rmdir(path)
+        except OSError:
+            # Not empty
+            pass
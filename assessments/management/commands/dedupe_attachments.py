@@ -0,0 +1,77 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from assessments.blobs import attach_blob, file_sha256, recount_blobs
+from assessments.models import AssessmentAttachment, AttachmentBlob
+
+# Move attachments stored before content-addressed storage into blobs, so
+# identical files share one copy, then check every blob's reference count.
+# python manage.py dedupe_attachments --dry-run
+# python manage.py dedupe_attachments
+
+
+class Command(BaseCommand):
+    help = "Deduplicate attachment files into content-addressed blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many files and bytes would be saved.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        known = set(AttachmentBlob.objects.values_list("sha256", flat=True))
+
+        moved = duplicates = missing = saved_bytes = 0
+        attachments = (
+            AssessmentAttachment.objects.filter(blob__isnull=True)
+            .exclude(file="")
+            .only("id", "file", "assessment")
+            .order_by("id")
+        )
+
+        for attachment in attachments.iterator():
+            storage = attachment.file.storage
+            old_name = attachment.file.name
+
+            try:
+                with storage.open(old_name, "rb") as f:
+                    sha256 = file_sha256(File(f))
+                size = storage.size(old_name)
+            except OSError:
+                self.stderr.write(f"Missing file for attachment {attachment.id}: {old_name}")
+                missing += 1
+                continue
+
+            if sha256 in known:
+                duplicates += 1
+                saved_bytes += size
+            known.add(sha256)
+            moved += 1
+
+            if dry_run:
+                continue
+
+            with transaction.atomic():
+                # Copied rather than moved, so a rollback leaves the original
+                with storage.open(old_name, "rb") as f:
+                    attach_blob(attachment, File(f, name=old_name), sha256=sha256)
+                attachment.save(update_fields=["blob", "file"])
+                transaction.on_commit(lambda name=old_name: storage.delete(name))
+
+        if not dry_run:
+            corrected, deleted = recount_blobs()
+            self.stdout.write(
+                f"Blob reference counts corrected={corrected}, unreferenced deleted={deleted}"
+            )
+
+        prefix = "Would move" if dry_run else "Moved"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} {moved} attachment(s): Duplicates={duplicates}, "
+                f"Saved={saved_bytes / (1024 * 1024):.1f} MB, Missing={missing}"
+            )
+        )
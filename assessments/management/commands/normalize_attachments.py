@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from assessments.models import AttachmentBlob
+from assessments.normalize import normalize_blobs
+
+# Usage:
+#   python manage.py normalize_attachments
+#   python manage.py normalize_attachments --retry-failed
+#   python manage.py normalize_attachments --workers 4
+
+
+class Command(BaseCommand):
+    help = "Normalize attachment images still pending (orientation, metadata, size)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Normalize images that failed before again.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Normalizing threads (default: 1)",
+        )
+
+    def handle(self, *args, **options):
+        statuses = [AttachmentBlob.PENDING]
+        if options["retry_failed"]:
+            statuses.append(AttachmentBlob.FAILED)
+
+        counts = normalize_blobs(
+            AttachmentBlob.objects.filter(normalization__in=statuses).order_by("id"),
+            workers=options["workers"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Normalized={counts.get(AttachmentBlob.NORMALIZED, 0)}, "
+                f"Unchanged={counts.get(AttachmentBlob.UNCHANGED, 0)}, "
+                f"Failed={counts.get(AttachmentBlob.FAILED, 0)}"
+            )
+        )
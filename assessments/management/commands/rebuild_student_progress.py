@@ -0,0 +1,36 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from assessments.progress import rebuild_student_progress
+
+logger = logging.getLogger("assessments")
+
+# Usage:
+#   python manage.py rebuild_student_progress
+#   python manage.py rebuild_student_progress --batch-size 1000
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized student progress summary table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows inserted per query (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        total = rebuild_student_progress(batch_size=options["batch_size"])
+        elapsed = time.monotonic() - started
+
+        logger.info(
+            f"STUDENT PROGRESS REBUILT | rows={total}, seconds={elapsed:.2f}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt progress summary for {total} students in {elapsed:.2f}s"
+            )
+        )
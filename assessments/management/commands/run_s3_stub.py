@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from testing.s3_stub import S3StubServer
+
+
+# Serve an in-memory S3-compatible bucket locally, then start the app with
+# the printed environment to store media and take direct uploads in it
+# python manage.py run_s3_stub --bucket media --port 9000
+class Command(BaseCommand):
+    help = "Run a local stub of an S3-compatible object store until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bucket", default="media")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=9000)
+
+    def handle(self, *args, **options):
+        stub = S3StubServer(
+            bucket=options["bucket"], host=options["host"], port=options["port"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"S3 stub serving bucket {stub.bucket} at {stub.url} "
+                "(Ctrl+C to stop). Objects are lost when it stops."
+            )
+        )
+        self.stdout.write(
+            "\n".join(
+                [
+                    "MEDIA_STORAGE=s3",
+                    f"S3_ENDPOINT_URL={stub.url}",
+                    f"S3_BUCKET_NAME={stub.bucket}",
+                    "S3_REGION_NAME=us-east-1",
+                    "S3_ADDRESSING_STYLE=path",
+                    "S3_ACCESS_KEY_ID=stub",
+                    "S3_SECRET_ACCESS_KEY=stub",
+                ]
+            )
+        )
+        try:
+            stub.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stub.httpd.server_close()
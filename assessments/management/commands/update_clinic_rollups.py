@@ -0,0 +1,35 @@
+import logging
+import time
+from django.core.management.base import BaseCommand
+from assessments.reports import update_clinic_rollups
+
+logger = logging.getLogger("assessments")
+
+# Usage (e.g. from cron every few minutes):
+#   python manage.py update_clinic_rollups
+# Recompute every day from scratch (after backfills or queryset .update() calls):
+#   python manage.py update_clinic_rollups --full
+
+
+class Command(BaseCommand):
+    help = "Incrementally update the daily clinic throughput and sign-off latency rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Ignore the watermark and rebuild every day",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days = update_clinic_rollups(full=options["full"])
+        elapsed = time.monotonic() - started
+
+        logger.info(
+            f"CLINIC ROLLUPS UPDATED | full={options['full']}, "
+            f"days={days}, seconds={elapsed:.2f}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Recomputed {days} day(s) of rollups in {elapsed:.2f}s")
+        )
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_alter_profile_transcript_description"),
+        ("assessments", "0054_alter_assessmenttreatmentplanphase_options"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="assessments",
+            index=models.Index(
+                fields=["evaluator", "is_discharged"],
+                name="assessments_evaluat_2186ed_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientnewcomplaint",
+            index=models.Index(
+                fields=["evaluator", "is_new_complaint_signed"],
+                name="assessments_evaluat_81b53e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientreevaluation",
+            index=models.Index(
+                fields=["evaluator", "is_reevaluation_signed"],
+                name="assessments_evaluat_3e0de6_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="soaps",
+            index=models.Index(
+                fields=["evaluator", "is_soap_signed"],
+                name="assessments_evaluat_b465e5_idx",
+            ),
+        ),
+    ]
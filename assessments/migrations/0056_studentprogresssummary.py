@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_alter_profile_transcript_description"),
+        ("assessments", "0055_assessments_assessments_evaluat_2186ed_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StudentProgressSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "cohort_code",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+                ("assessments_total", models.PositiveIntegerField(default=0)),
+                ("assessments_signed", models.PositiveIntegerField(default=0)),
+                ("soaps_total", models.PositiveIntegerField(default=0)),
+                ("soaps_signed", models.PositiveIntegerField(default=0)),
+                ("reevaluations_total", models.PositiveIntegerField(default=0)),
+                ("reevaluations_signed", models.PositiveIntegerField(default=0)),
+                ("new_complaints_total", models.PositiveIntegerField(default=0)),
+                ("new_complaints_signed", models.PositiveIntegerField(default=0)),
+                ("sign_off_count", models.PositiveIntegerField(default=0)),
+                ("sign_off_seconds_total", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "student",
+                    models.OneToOneField(
+                        limit_choices_to={"role": "student"},
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress_summary",
+                        to="accounts.profile",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Student Progress Summary",
+                "verbose_name_plural": "Student Progress Summaries",
+                "ordering": ["cohort_code", "student__official_name"],
+                "indexes": [
+                    models.Index(
+                        fields=["cohort_code"], name="assessments_cohort__4db2db_idx"
+                    )
+                ],
+            },
+        ),
+    ]
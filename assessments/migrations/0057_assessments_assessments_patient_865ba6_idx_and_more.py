@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_alter_profile_transcript_description"),
+        ("assessments", "0056_studentprogresssummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="assessments",
+            index=models.Index(
+                fields=["patient_ic_passport_hash", "created_at"],
+                name="assessments_patient_865ba6_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientnewcomplaint",
+            index=models.Index(
+                fields=["assessment", "created_at"],
+                name="assessments_assessm_4be340_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientreevaluation",
+            index=models.Index(
+                fields=["assessment", "created_at"],
+                name="assessments_assessm_7b6a70_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="soaps",
+            index=models.Index(
+                fields=["assessment", "created_at"],
+                name="assessments_assessm_5da79e_idx",
+            ),
+        ),
+    ]
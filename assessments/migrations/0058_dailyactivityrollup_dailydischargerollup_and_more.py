@@ -0,0 +1,176 @@
+# Generated by Django 5.2.8 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0013_alter_profile_transcript_description"),
+        ("assessments", "0057_assessments_assessments_patient_865ba6_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyActivityRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("new_assessments", models.PositiveIntegerField(default=0)),
+                ("soap_visits", models.PositiveIntegerField(default=0)),
+                ("reevaluations", models.PositiveIntegerField(default=0)),
+                ("new_complaints", models.PositiveIntegerField(default=0)),
+                ("discharges", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Daily Activity Rollup",
+                "verbose_name_plural": "Daily Activity Rollups",
+                "ordering": ["day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyDischargeRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "reason_for_discharge",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("discharged_full_recovery", "Discharged - Full Recovery"),
+                            (
+                                "patient_discharged_against_advice",
+                                "Patient Discharged Against Advice",
+                            ),
+                            ("lost_to_follow_up", "Lost to Follow-up"),
+                            ("referred_to_physician", "Referred to Physician"),
+                            (
+                                "transferred_to_another_Intern",
+                                "Transferred to Another Intern",
+                            ),
+                            (
+                                "transferred_to_community_chiropractor",
+                                "Transferred to Community Chiropractor",
+                            ),
+                            ("moved_away", "Moved Away"),
+                            ("deceased", "Deceased"),
+                        ],
+                        default="",
+                        max_length=100,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Daily Discharge Rollup",
+                "verbose_name_plural": "Daily Discharge Rollups",
+                "ordering": ["day", "reason_for_discharge"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailySignOffLatencyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("sign_off", models.CharField(max_length=30)),
+                ("bucket", models.PositiveSmallIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("seconds_total", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Daily Sign-off Latency Rollup",
+                "verbose_name_plural": "Daily Sign-off Latency Rollups",
+                "ordering": ["day", "sign_off", "bucket"],
+            },
+        ),
+        migrations.CreateModel(
+            name="RollupWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                (
+                    "processed_until",
+                    models.DateTimeField(blank=True, default=None, null=True),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="assessments",
+            index=models.Index(
+                fields=["updated_at"], name="assessments_updated_eada70_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="assessments",
+            index=models.Index(
+                fields=["discharge_signed_at"], name="assessments_dischar_2da980_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientnewcomplaint",
+            index=models.Index(
+                fields=["updated_at"], name="assessments_updated_773588_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="patientreevaluation",
+            index=models.Index(
+                fields=["updated_at"], name="assessments_updated_964214_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="soaps",
+            index=models.Index(
+                fields=["updated_at"], name="assessments_updated_9f1c9b_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailydischargerollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "reason_for_discharge"),
+                name="unique_daily_discharge_reason",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailysignofflatencyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "sign_off", "bucket"),
+                name="unique_daily_sign_off_latency_bucket",
+            ),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:15
+
+import assessments.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0059_attachmentupload"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="assessmentattachment",
+            name="file",
+            field=assessments.models.ProtectedFileField(
+                upload_to=assessments.models.AssessmentUploadPath("attachments")
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assessments",
+            name="attending_consent_signature",
+            field=assessments.models.ProtectedImageField(
+                blank=True,
+                null=True,
+                upload_to=assessments.models.AssessmentUploadPath(
+                    "attending_signatures"
+                ),
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assessments",
+            name="initial_patient_consent_signature",
+            field=assessments.models.ProtectedImageField(
+                blank=True,
+                null=True,
+                upload_to=assessments.models.AssessmentUploadPath("patient_signatures"),
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assessments",
+            name="pdpa_consent_signature",
+            field=assessments.models.ProtectedImageField(
+                blank=True,
+                null=True,
+                upload_to=assessments.models.AssessmentUploadPath("pdpa_signatures"),
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assessments",
+            name="rom_drawing",
+            field=assessments.models.ProtectedImageField(
+                blank=True,
+                null=True,
+                upload_to=assessments.models.AssessmentUploadPath("rom_drawing"),
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assessments",
+            name="witness_consent_signature",
+            field=assessments.models.ProtectedImageField(
+                blank=True,
+                null=True,
+                upload_to=assessments.models.AssessmentUploadPath("witness_signatures"),
+            ),
+        ),
+    ]
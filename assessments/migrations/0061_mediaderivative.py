@@ -0,0 +1,88 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:18
+
+import assessments.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0060_protected_media_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaDerivative",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source_model", models.CharField(max_length=50)),
+                ("source_id", models.PositiveBigIntegerField()),
+                ("source_field", models.CharField(max_length=50)),
+                ("source_name", models.CharField(max_length=255)),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("thumbnail", "Thumbnail"), ("preview", "Preview")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("ready", "Ready"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "file",
+                    assessments.models.ProtectedImageField(
+                        blank=True, upload_to=assessments.models.derivative_upload_path
+                    ),
+                ),
+                ("width", models.PositiveIntegerField(blank=True, null=True)),
+                ("height", models.PositiveIntegerField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, default="")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="media_derivatives",
+                        to="assessments.assessments",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["source_model", "source_id"],
+                        name="assessments_source__5013a8_idx",
+                    ),
+                    models.Index(
+                        fields=["status", "updated_at"],
+                        name="assessments_status_a26975_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source_name", "kind"), name="unique_media_derivative"
+                    )
+                ],
+            },
+        ),
+    ]
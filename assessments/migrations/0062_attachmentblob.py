@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:20
+
+import assessments.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0061_mediaderivative"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AttachmentBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64, unique=True)),
+                (
+                    "file",
+                    models.FileField(
+                        max_length=255, upload_to=assessments.models.blob_upload_path
+                    ),
+                ),
+                ("size", models.PositiveBigIntegerField()),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveConstraint(
+            model_name="mediaderivative",
+            name="unique_media_derivative",
+        ),
+        migrations.RemoveIndex(
+            model_name="mediaderivative",
+            name="assessments_source__5013a8_idx",
+        ),
+        migrations.AddIndex(
+            model_name="mediaderivative",
+            index=models.Index(
+                fields=["source_name"], name="assessments_source__518524_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="mediaderivative",
+            constraint=models.UniqueConstraint(
+                fields=("source_model", "source_id", "source_field", "kind"),
+                name="unique_media_derivative",
+            ),
+        ),
+        migrations.AddField(
+            model_name="assessmentattachment",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="attachments",
+                to="assessments.attachmentblob",
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0062_attachmentblob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StrokeDrawing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "field",
+                    models.CharField(
+                        choices=[
+                            ("rom_drawing", "ROM drawing"),
+                            (
+                                "initial_patient_consent_signature",
+                                "Initial patient consent signature",
+                            ),
+                            (
+                                "attending_consent_signature",
+                                "Attending consent signature",
+                            ),
+                            ("witness_consent_signature", "Witness consent signature"),
+                            ("pdpa_consent_signature", "PDPA consent signature"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("data", models.BinaryField()),
+                ("digest", models.CharField(max_length=64)),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                ("stroke_count", models.PositiveIntegerField(default=0)),
+                ("point_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "assessment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stroke_drawings",
+                        to="assessments.assessments",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("assessment", "field"), name="unique_stroke_drawing"
+                    )
+                ],
+            },
+        ),
+    ]
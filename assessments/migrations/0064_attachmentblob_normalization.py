@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0063_strokedrawing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attachmentblob",
+            name="normalization",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("normalized", "Normalized"),
+                    ("unchanged", "Unchanged"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="attachmentblob",
+            name="original",
+            field=models.FileField(blank=True, max_length=255, upload_to=""),
+        ),
+    ]
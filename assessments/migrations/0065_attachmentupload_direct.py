@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0064_attachmentblob_normalization"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attachmentupload",
+            name="sha256",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="attachmentupload",
+            name="storage_name",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
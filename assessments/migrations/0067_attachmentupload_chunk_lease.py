@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("assessments", "0066_rollupdirtyday"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attachmentupload",
+            name="chunk_lease_until",
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
@@ -3,11 +3,15 @@ import os
 import uuid
 
 from django.db import models
+from django.db.models.fields.files import FieldFile, ImageFieldFile
+from django.urls import reverse
+from django.utils.functional import cached_property
 from django.utils.text import slugify
 from django.utils.deconstruct import deconstructible
 from encrypted_fields.fields import EncryptedCharField
 
 from . import choices
+from .constants import DRAWING_FIELDS
 from accounts.models import Profile
 
 
@@ -37,6 +41,58 @@ class AssessmentUploadPath:
         return f"assessments/" f"{assessment_id}/" f"{self.category}/" f"{unique_name}"
 
 
+def blob_name(sha256, filename):
+    # assessments/blobs/ab/<sha256>.pdf, keeping the file's extension
+    ext = os.path.splitext(filename)[1].lower()
+    return f"assessments/blobs/{sha256[:2]}/{sha256}{ext}"
+
+
+def blob_upload_path(instance, filename):
+    return blob_name(instance.sha256, filename)
+
+
+def derivative_upload_path(instance, filename):
+    # Next to the original: .../<category>/derivatives/<name>
+    return os.path.join(os.path.dirname(instance.source_name), "derivatives", filename)
+
+
+class ProtectedFieldFileMixin:
+    """
+    .url points at the permission-checked download view instead of
+    MEDIA_URL. The stored file name is part of the URL, so a replaced file
+    gets a new URL and an old one can be cached for good.
+    """
+
+    @property
+    def url(self):
+        self._require_file()
+        return reverse(
+            "assessment_file",
+            kwargs={
+                "model_name": self.instance._meta.model_name,
+                "pk": self.instance.pk,
+                "field_name": self.field.name,
+                "filename": os.path.basename(self.name),
+            },
+        )
+
+
+class ProtectedFieldFile(ProtectedFieldFileMixin, FieldFile):
+    pass
+
+
+class ProtectedImageFieldFile(ProtectedFieldFileMixin, ImageFieldFile):
+    pass
+
+
+class ProtectedFileField(models.FileField):
+    attr_class = ProtectedFieldFile
+
+
+class ProtectedImageField(models.ImageField):
+    attr_class = ProtectedImageFieldFile
+
+
 class Assessments(models.Model):
     # =====================
     # Assignment
@@ -153,7 +209,7 @@ class Assessments(models.Model):
     rom_active = models.TextField(blank=True, default="")
     rom_passive = models.TextField(blank=True, default="")
     rom_resisted = models.TextField(blank=True, default="")
-    rom_drawing = models.ImageField(
+    rom_drawing = ProtectedImageField(
         upload_to=AssessmentUploadPath("rom_drawing"), null=True, blank=True
     )
 
@@ -226,7 +282,7 @@ class Assessments(models.Model):
     initial_patient_consent_relationship = models.CharField(
         max_length=30, choices=choices.INITIAL_PATIENT_CONSENT_CHOICES, null=True, blank=True
     )
-    initial_patient_consent_signature = models.ImageField(
+    initial_patient_consent_signature = ProtectedImageField(
         upload_to=AssessmentUploadPath("patient_signatures"), null=True, blank=True
     )
     initial_patient_consent_signed_at = models.DateTimeField(
@@ -246,7 +302,7 @@ class Assessments(models.Model):
         limit_choices_to={"role__in": ["clinician", "student"]},
         default=None,
     )
-    attending_consent_signature = models.ImageField(
+    attending_consent_signature = ProtectedImageField(
         upload_to=AssessmentUploadPath("attending_signatures"), null=True, blank=True
     )
     attending_consent_signed_at = models.DateTimeField(
@@ -258,7 +314,7 @@ class Assessments(models.Model):
     # =====================
     is_witness_consent_signed = models.BooleanField(default=False)
     witness_consent_signed_by = models.CharField(max_length=150, null=True, blank=True)
-    witness_consent_signature = models.ImageField(
+    witness_consent_signature = ProtectedImageField(
         upload_to=AssessmentUploadPath("witness_signatures"), null=True, blank=True
     )
     witness_consent_signed_at = models.DateTimeField(
@@ -275,7 +331,7 @@ class Assessments(models.Model):
     pdpa_consent_signed_by = models.CharField(
         max_length=150, null=True, blank=True, default=""
     )
-    pdpa_consent_signature = models.ImageField(
+    pdpa_consent_signature = ProtectedImageField(
         upload_to=AssessmentUploadPath("pdpa_signatures"), null=True, blank=True
     )
     pdpa_consent_signed_at = models.DateTimeField(null=True, blank=True, default=None)
@@ -362,6 +418,26 @@ class Assessments(models.Model):
     def __str__(self):
         return f"[{self.mrn_number}] {self.patient_name} (ID: {self.id})"
 
+    @cached_property
+    def stroke_drawings_by_field(self):
+        return {drawing.field: drawing for drawing in self.stroke_drawings.all()}
+
+    @cached_property
+    def drawing_urls(self):
+        """
+        {field: url} of the signatures and ROM drawing that are set, whether
+        stored as an image or as strokes.
+        """
+        urls = {
+            field: drawing.url()
+            for field, drawing in self.stroke_drawings_by_field.items()
+        }
+        for field in DRAWING_FIELDS:
+            fieldfile = getattr(self, field)
+            if fieldfile and field not in urls:
+                urls[field] = fieldfile.url
+        return urls
+
     class Meta:
         ordering = ["-created_at"]
         verbose_name = "Assessment"
@@ -370,6 +446,10 @@ class Assessments(models.Model):
             models.Index(fields=["mrn_number"]),
             models.Index(fields=["patient_name"]),
             models.Index(fields=["created_at"]),
+            models.Index(fields=["evaluator", "is_discharged"]),
+            models.Index(fields=["patient_ic_passport_hash", "created_at"]),
+            models.Index(fields=["updated_at"]),
+            models.Index(fields=["discharge_signed_at"]),
         ]
 
 
@@ -414,12 +494,59 @@ class AssessmentTreatmentPlanPhase(models.Model):
         )
 
 
+class AttachmentBlob(models.Model):
+    """
+    One stored attachment file, named by the SHA-256 of its content and
+    shared by every attachment with the same bytes (see assessments.blobs).
+    Images are normalized after upload (see assessments.normalize).
+    """
+
+    PENDING = "pending"
+    NORMALIZED = "normalized"
+    UNCHANGED = "unchanged"
+    FAILED = "failed"
+    NORMALIZATION_CHOICES = (
+        (PENDING, "Pending"),
+        (NORMALIZED, "Normalized"),
+        (UNCHANGED, "Unchanged"),
+        (FAILED, "Failed"),
+    )
+
+    # Of the bytes as uploaded, so an identical upload finds the blob even
+    # after its image was normalized
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_upload_path, max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Attachments pointing at this blob; the file goes with the last one
+    ref_count = models.PositiveIntegerField(default=0)
+
+    normalization = models.CharField(
+        max_length=10, choices=NORMALIZATION_CHOICES, default=PENDING
+    )
+    # The image as uploaded, with ATTACHMENT_KEEP_ORIGINAL_IMAGES
+    original = models.FileField(max_length=255, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} ref)"
+
+
 class AssessmentAttachment(models.Model):
     assessment = models.ForeignKey(
         Assessments, on_delete=models.CASCADE, related_name="attachments"
     )
 
-    file = models.FileField(upload_to=AssessmentUploadPath("attachments"))
+    file = ProtectedFileField(upload_to=AssessmentUploadPath("attachments"))
+    # Null for files uploaded before content-addressed storage and not yet
+    # moved by dedupe_attachments
+    blob = models.ForeignKey(
+        AttachmentBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="attachments",
+    )
 
     uploaded_by = models.ForeignKey(
         Profile, on_delete=models.SET_NULL, null=True, blank=True
@@ -433,6 +560,164 @@ class AssessmentAttachment(models.Model):
         return f"{self.assessment.mrn_number} - {self.file.name}"
 
 
+class AttachmentUpload(models.Model):
+    """
+    An attachment being uploaded in chunks. The bytes received so far live
+    in a partial file until the upload is completed (see assessments.uploads).
+    With object storage the browser may instead send the whole file straight
+    to storage (see assessments.direct_uploads).
+    """
+
+    UPLOADING = "uploading"
+    COMPLETED = "completed"
+    STATUS_CHOICES = (
+        (UPLOADING, "Uploading"),
+        (COMPLETED, "Completed"),
+    )
+
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    assessment = models.ForeignKey(
+        Assessments, on_delete=models.CASCADE, related_name="attachment_uploads"
+    )
+    uploaded_by = models.ForeignKey(
+        Profile, on_delete=models.CASCADE, related_name="attachment_uploads"
+    )
+
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Bytes received so far; the next chunk must start here
+    offset = models.PositiveBigIntegerField(default=0)
+    # Set while a chunk is being written outside the row lock; another
+    # chunk may only start once it is cleared or has expired
+    chunk_lease_until = models.DateTimeField(null=True, blank=True, default=None)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=UPLOADING)
+
+    # Direct uploads only: where the browser puts the file, and the SHA-256
+    # storage checks it against
+    storage_name = models.CharField(max_length=255, blank=True, default="")
+    sha256 = models.CharField(max_length=64, blank=True, default="")
+
+    attachment = models.OneToOneField(
+        AssessmentAttachment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="upload",
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size}) - {self.status}"
+
+
+class MediaDerivative(models.Model):
+    """
+    A downscaled copy of an uploaded image (attachment, signature or ROM
+    drawing), generated in the background by assessments.derivatives.
+    """
+
+    THUMBNAIL = "thumbnail"
+    PREVIEW = "preview"
+    KIND_CHOICES = (
+        (THUMBNAIL, "Thumbnail"),
+        (PREVIEW, "Preview"),
+    )
+
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (READY, "Ready"),
+        (FAILED, "Failed"),
+    )
+
+    assessment = models.ForeignKey(
+        Assessments, on_delete=models.CASCADE, related_name="media_derivatives"
+    )
+
+    # Where the original lives: model name, primary key and file field
+    source_model = models.CharField(max_length=50)
+    source_id = models.PositiveBigIntegerField()
+    source_field = models.CharField(max_length=50)
+    # Storage name of the original the derivative was made from. Shared
+    # attachment blobs share their derivatives' files too.
+    source_name = models.CharField(max_length=255)
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = ProtectedImageField(upload_to=derivative_upload_path, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_model", "source_id", "source_field", "kind"],
+                name="unique_media_derivative",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["source_name"]),
+            models.Index(fields=["status", "updated_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of {self.source_name} - {self.status}"
+
+
+class StrokeDrawing(models.Model):
+    """
+    A signature or ROM drawing kept as the pen strokes drawn on the canvas
+    (packed by assessments.strokes) instead of as an image, and rendered to
+    SVG or PNG when requested.
+    """
+
+    assessment = models.ForeignKey(
+        Assessments, on_delete=models.CASCADE, related_name="stroke_drawings"
+    )
+    field = models.CharField(max_length=50, choices=list(DRAWING_FIELDS.items()))
+    data = models.BinaryField()
+    # SHA-256 of data: versions the URL and keys the render cache
+    digest = models.CharField(max_length=64)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    stroke_count = models.PositiveIntegerField(default=0)
+    point_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["assessment", "field"], name="unique_stroke_drawing"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_field_display()} of assessment {self.assessment_id}"
+
+    def url(self, fmt="svg"):
+        path = reverse(
+            "assessment_drawing",
+            kwargs={"pk": self.assessment_id, "field_name": self.field, "fmt": fmt},
+        )
+        return f"{path}?v={self.digest[:12]}"
+
+
 class Soaps(models.Model):
     assessment = models.ForeignKey(
         Assessments, on_delete=models.CASCADE, related_name="soaps"
@@ -534,6 +819,9 @@ class Soaps(models.Model):
             models.Index(fields=["assessment"]),
             models.Index(fields=["created_at"]),
             models.Index(fields=["next_appointment"]),
+            models.Index(fields=["evaluator", "is_soap_signed"]),
+            models.Index(fields=["assessment", "created_at"]),
+            models.Index(fields=["updated_at"]),
         ]
 
 
@@ -629,6 +917,9 @@ class PatientReevaluation(models.Model):
             models.Index(fields=["assessment"]),
             models.Index(fields=["created_at"]),
             models.Index(fields=["next_reevaluation"]),
+            models.Index(fields=["evaluator", "is_reevaluation_signed"]),
+            models.Index(fields=["assessment", "created_at"]),
+            models.Index(fields=["updated_at"]),
         ]
 
 
@@ -701,4 +992,157 @@ class PatientNewComplaint(models.Model):
             models.Index(fields=["assessment"]),
             models.Index(fields=["created_at"]),
             models.Index(fields=["next_reevaluation"]),
+            models.Index(fields=["evaluator", "is_new_complaint_signed"]),
+            models.Index(fields=["assessment", "created_at"]),
+            models.Index(fields=["updated_at"]),
+        ]
+
+
+class StudentProgressSummary(models.Model):
+    """
+    Per-student counters kept up to date by assessments.signals and rebuilt
+    with `python manage.py rebuild_student_progress`.
+    """
+
+    student = models.OneToOneField(
+        Profile,
+        on_delete=models.CASCADE,
+        related_name="progress_summary",
+        limit_choices_to={"role": "student"},
+    )
+    cohort_code = models.CharField(max_length=20, blank=True, default="")
+
+    assessments_total = models.PositiveIntegerField(default=0)
+    assessments_signed = models.PositiveIntegerField(default=0)
+    soaps_total = models.PositiveIntegerField(default=0)
+    soaps_signed = models.PositiveIntegerField(default=0)
+    reevaluations_total = models.PositiveIntegerField(default=0)
+    reevaluations_signed = models.PositiveIntegerField(default=0)
+    new_complaints_total = models.PositiveIntegerField(default=0)
+    new_complaints_signed = models.PositiveIntegerField(default=0)
+
+    # Time from record creation to each sign-off, kept as a sum and a count
+    # so the average can be derived without touching the clinical tables.
+    sign_off_count = models.PositiveIntegerField(default=0)
+    sign_off_seconds_total = models.PositiveBigIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average_sign_off_seconds(self):
+        if not self.sign_off_count:
+            return None
+        return round(self.sign_off_seconds_total / self.sign_off_count)
+
+    def __str__(self):
+        return f"Progress - {self.student}"
+
+    class Meta:
+        ordering = ["cohort_code", "student__official_name"]
+        verbose_name = "Student Progress Summary"
+        verbose_name_plural = "Student Progress Summaries"
+        indexes = [
+            models.Index(fields=["cohort_code"]),
+        ]
+
+
+# =====================
+# Reporting rollups
+# =====================
+class DailyActivityRollup(models.Model):
+    """
+    Clinic throughput for one local calendar day.
+    Filled by `python manage.py update_clinic_rollups`.
+    """
+
+    day = models.DateField(unique=True)
+    new_assessments = models.PositiveIntegerField(default=0)
+    soap_visits = models.PositiveIntegerField(default=0)
+    reevaluations = models.PositiveIntegerField(default=0)
+    new_complaints = models.PositiveIntegerField(default=0)
+    discharges = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Activity - {self.day}"
+
+    class Meta:
+        ordering = ["day"]
+        verbose_name = "Daily Activity Rollup"
+        verbose_name_plural = "Daily Activity Rollups"
+
+
+class DailyDischargeRollup(models.Model):
+    day = models.DateField()
+    reason_for_discharge = models.CharField(
+        max_length=100, choices=choices.DISCHARGE_CHOICES, blank=True, default=""
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Discharges - {self.day} - {self.reason_for_discharge}"
+
+    class Meta:
+        ordering = ["day", "reason_for_discharge"]
+        verbose_name = "Daily Discharge Rollup"
+        verbose_name_plural = "Daily Discharge Rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "reason_for_discharge"],
+                name="unique_daily_discharge_reason",
+            )
+        ]
+
+
+class DailySignOffLatencyRollup(models.Model):
+    """
+    Histogram of created_at -> signed_at latency for records created on
+    `day`, one row per sign-off and latency bucket.
+    """
+
+    day = models.DateField()
+    sign_off = models.CharField(max_length=30)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    seconds_total = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Sign-off latency - {self.day} - {self.sign_off} [{self.bucket}]"
+
+    class Meta:
+        ordering = ["day", "sign_off", "bucket"]
+        verbose_name = "Daily Sign-off Latency Rollup"
+        verbose_name_plural = "Daily Sign-off Latency Rollups"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "sign_off", "bucket"],
+                name="unique_daily_sign_off_latency_bucket",
+            )
         ]
+
+
+class RollupWatermark(models.Model):
+    """
+    Last source `updated_at` folded into the rollups, per rollup job.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(null=True, blank=True, default=None)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.processed_until}"
+
+
+class RollupDirtyDay(models.Model):
+    """
+    A local day whose rollups must be rebuilt for a change `updated_at`
+    cannot show: a deleted record, or a discharge sign-off moved off it.
+    Written by signals, consumed by `update_clinic_rollups`.
+    """
+
+    day = models.DateField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Dirty - {self.day}"
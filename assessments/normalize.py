@@ -0,0 +1,246 @@
+"""
+Normalizing attachment photos after upload.
+
+Phone photos arrive as 8-12 MP JPEGs, often turned by an EXIF orientation
+tag and carrying GPS coordinates. Once an image's AttachmentBlob is
+committed it is normalized on a small thread pool: the orientation is
+applied to the pixels, metadata other than the colour profile is dropped,
+the longest side is capped at ATTACHMENT_IMAGE_MAX_DIMENSION and the image
+is re-encoded in its own format. An image with none of that to fix is left
+as uploaded.
+
+The result is stored under its own hash and the blob and its attachments
+point at it; the blob keeps the hash of the upload, so uploading the same
+photo again still finds it. With ATTACHMENT_KEEP_ORIGINAL_IMAGES the upload
+stays as blob.original. Thumbnails and previews wait for normalization and
+are rendered from its result.
+
+`python manage.py normalize_attachments` handles whatever is still pending
+(a restart drops queued work), including images stored before this.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import ExifTags, Image, ImageOps, UnidentifiedImageError
+
+from .derivatives import is_image, queue_derivatives
+from .models import AssessmentAttachment, AttachmentBlob, blob_name
+
+logger = logging.getLogger("assessments")
+
+# Format to re-encode in, per format Pillow detects. Some phones save
+# multi-picture JPEGs, which Pillow reads as MPO.
+OUTPUT_FORMATS = {"JPEG": "JPEG", "MPO": "JPEG", "PNG": "PNG", "WEBP": "WEBP"}
+
+# Image.info keys that carry metadata worth dropping
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ATTACHMENT_IMAGE_WORKERS,
+                thread_name_prefix="attachment-images",
+            )
+    return _executor
+
+
+def initial_normalization(name):
+    return AttachmentBlob.PENDING if is_image(name) else AttachmentBlob.UNCHANGED
+
+
+def queue_normalization(blob_id):
+    """
+    Normalize a blob on the thread pool once the transaction commits.
+    """
+    if settings.ATTACHMENT_IMAGE_WORKERS > 0:
+        transaction.on_commit(
+            lambda: _get_executor().submit(_normalize_in_background, blob_id)
+        )
+
+
+# -----------------------------
+# Normalizing
+# -----------------------------
+def _encode(image, fmt, icc_profile):
+    options = {}
+    # Kept so wide-gamut photos keep their colours
+    if icc_profile:
+        options["icc_profile"] = icc_profile
+    if fmt == "JPEG":
+        if image.mode not in ("RGB", "L", "CMYK"):
+            image = image.convert("RGB")
+        options.update(
+            quality=settings.ATTACHMENT_IMAGE_QUALITY, optimize=True, progressive=True
+        )
+    elif fmt == "WEBP":
+        options.update(quality=settings.ATTACHMENT_IMAGE_QUALITY, method=4)
+    else:
+        options["optimize"] = True
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def normalized_image(f):
+    """
+    Bytes of the normalized image read from `f`, or None if it needs no
+    change.
+    """
+    max_dimension = settings.ATTACHMENT_IMAGE_MAX_DIMENSION
+
+    with Image.open(f) as image:
+        fmt = OUTPUT_FORMATS.get(image.format)
+        if fmt is None:
+            return None
+
+        exif = image.getexif()
+        turned = exif.get(ExifTags.Base.Orientation, 1) != 1
+        oversized = bool(max_dimension) and max(image.size) > max_dimension
+        has_metadata = (
+            bool(exif)
+            or any(key in image.info for key in METADATA_KEYS)
+            # PNG text chunks
+            or bool(getattr(image, "text", None))
+        )
+        if not (turned or oversized or has_metadata):
+            return None
+
+        icc_profile = image.info.get("icc_profile")
+        if oversized:
+            # JPEG only: decode straight at a reduced scale
+            scale = max_dimension / max(image.size)
+            image.draft(None, (round(image.width * scale), round(image.height * scale)))
+
+        image = ImageOps.exif_transpose(image)
+        if oversized:
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        return _encode(image, fmt, icc_profile)
+
+
+def _queue_attachment_derivatives(blob):
+    attachments = AssessmentAttachment.objects.filter(blob=blob).only(
+        "pk", "assessment", "file", "blob"
+    )
+    for attachment in attachments:
+        attachment.blob = blob
+        queue_derivatives(attachment, "file")
+
+
+def normalize_blob(blob):
+    """
+    Normalize one blob's image and point its attachments at the result.
+    Returns the blob's new normalization status.
+    """
+    storage = blob.file.storage
+    old_name = blob.file.name
+
+    try:
+        data = None
+        if is_image(old_name):
+            with storage.open(old_name, "rb") as f:
+                data = normalized_image(f)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning(
+            f"NORMALIZE FAILED | blob={blob.sha256[:12]}, file={old_name}, error={e}"
+        )
+        status = AttachmentBlob.FAILED
+        data = None
+    else:
+        status = AttachmentBlob.UNCHANGED
+
+    if data is None:
+        # Failed images still get thumbnails, rendered from the upload
+        if AttachmentBlob.objects.filter(pk=blob.pk, file=old_name).update(
+            normalization=status
+        ):
+            blob.normalization = status
+            _queue_attachment_derivatives(blob)
+        return status
+
+    digest = hashlib.sha256(data).hexdigest()
+    new_name = storage.save(blob_name(digest, old_name), ContentFile(data))
+    keep_original = settings.ATTACHMENT_KEEP_ORIGINAL_IMAGES
+
+    with transaction.atomic():
+        # Waits for an upload of the same bytes that is pointing a new
+        # attachment at the old file
+        locked = (
+            AttachmentBlob.objects.select_for_update()
+            .filter(pk=blob.pk, file=old_name)
+            .first()
+        )
+        if locked is None:
+            # Deleted, or normalized by someone else, meanwhile
+            transaction.on_commit(lambda: storage.delete(new_name))
+            return blob.normalization
+
+        locked.file = new_name
+        locked.size = len(data)
+        locked.normalization = AttachmentBlob.NORMALIZED
+        update_fields = ["file", "size", "normalization"]
+        if keep_original:
+            locked.original = old_name
+            update_fields.append("original")
+        locked.save(update_fields=update_fields)
+
+        AssessmentAttachment.objects.filter(blob=locked).update(file=new_name)
+        _queue_attachment_derivatives(locked)
+
+        if not keep_original:
+            transaction.on_commit(lambda: storage.delete(old_name))
+
+    logger.info(
+        f"NORMALIZE - Attachment image | blob={blob.sha256[:12]}, "
+        f"bytes={blob.size}->{len(data)}"
+    )
+    return AttachmentBlob.NORMALIZED
+
+
+def normalize_blobs(queryset, workers=1):
+    """
+    Normalize the given blobs. Returns {status: count}.
+    """
+    blobs = list(queryset)
+    if workers <= 1:
+        results = [normalize_blob(blob) for blob in blobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_normalize_in_thread, blobs))
+
+    counts = {}
+    for status in results:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def _normalize_in_thread(blob):
+    try:
+        return normalize_blob(blob)
+    finally:
+        connections.close_all()
+
+
+def _normalize_in_background(blob_id):
+    try:
+        blob = AttachmentBlob.objects.filter(
+            pk=blob_id, normalization=AttachmentBlob.PENDING
+        ).first()
+        if blob is not None:
+            normalize_blob(blob)
+    except Exception:
+        logger.exception(f"NORMALIZE FAILED | blob_id={blob_id}")
+    finally:
+        connections.close_all()
@@ -0,0 +1,172 @@
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+
+from accounts.models import Profile
+
+from .constants import ASSESSMENT_SIGN_OFFS
+from .models import (
+    Assessments,
+    PatientNewComplaint,
+    PatientReevaluation,
+    Soaps,
+    StudentProgressSummary,
+)
+
+# (summary field prefix, model, signed flag field, signed at field)
+RECORD_SIGN_OFFS = [
+    ("soaps", Soaps, "is_soap_signed", "soap_signed_at"),
+    (
+        "reevaluations",
+        PatientReevaluation,
+        "is_reevaluation_signed",
+        "reevaluation_signed_at",
+    ),
+    (
+        "new_complaints",
+        PatientNewComplaint,
+        "is_new_complaint_signed",
+        "new_complaint_signed_at",
+    ),
+]
+
+# Sections that must all be signed for an assessment to count as signed.
+# Discharge is an outcome rather than a sign-off, so it is left out.
+ASSESSMENT_SECTION_SIGN_OFFS = [
+    sign_off for sign_off in ASSESSMENT_SIGN_OFFS if sign_off[0] != "discharge"
+]
+
+SUMMARY_COUNTER_FIELDS = [
+    "assessments_total",
+    "assessments_signed",
+    "soaps_total",
+    "soaps_signed",
+    "reevaluations_total",
+    "reevaluations_signed",
+    "new_complaints_total",
+    "new_complaints_signed",
+    "sign_off_count",
+    "sign_off_seconds_total",
+]
+
+
+def _sign_off_aggregates(name, flag, signed_at):
+    signed = Q(**{flag: True, f"{signed_at}__isnull": False})
+    return {
+        f"{name}_count": Count("id", filter=signed),
+        f"{name}_duration": Sum(
+            ExpressionWrapper(
+                F(signed_at) - F("created_at"), output_field=DurationField()
+            ),
+            filter=signed,
+        ),
+    }
+
+
+def _add_sign_offs(counters, row, names):
+    for name in names:
+        duration = row[f"{name}_duration"]
+        counters["sign_off_count"] += row[f"{name}_count"]
+        if duration is not None:
+            counters["sign_off_seconds_total"] += max(
+                int(duration.total_seconds()), 0
+            )
+
+
+def collect_progress(student_ids=None):
+    """
+    Aggregate per-student counters with one grouped query per clinical table.
+    Returns {student_id: {summary field: value}}.
+    """
+    progress = {}
+
+    def counters_for(student_id):
+        return progress.setdefault(
+            student_id, dict.fromkeys(SUMMARY_COUNTER_FIELDS, 0)
+        )
+
+    def scoped(model):
+        queryset = model.objects.filter(student__isnull=False)
+        if student_ids is not None:
+            queryset = queryset.filter(student_id__in=student_ids)
+        return queryset.order_by().values("student_id")
+
+    # Assessments
+    all_sections_signed = Q()
+    aggregates = {}
+    for key, _, flag, signed_at in ASSESSMENT_SECTION_SIGN_OFFS:
+        all_sections_signed &= Q(**{flag: True})
+        aggregates.update(_sign_off_aggregates(key, flag, signed_at))
+
+    rows = scoped(Assessments).annotate(
+        total=Count("id"),
+        signed=Count("id", filter=all_sections_signed),
+        **aggregates,
+    )
+    for row in rows:
+        counters = counters_for(row["student_id"])
+        counters["assessments_total"] = row["total"]
+        counters["assessments_signed"] = row["signed"]
+        _add_sign_offs(
+            counters, row, [key for key, *_ in ASSESSMENT_SECTION_SIGN_OFFS]
+        )
+
+    # SOAPs, reevaluations and new complaints
+    for prefix, model, flag, signed_at in RECORD_SIGN_OFFS:
+        rows = scoped(model).annotate(
+            total=Count("id"),
+            **_sign_off_aggregates("record", flag, signed_at),
+        )
+        for row in rows:
+            counters = counters_for(row["student_id"])
+            counters[f"{prefix}_total"] = row["total"]
+            counters[f"{prefix}_signed"] = row["record_count"]
+            _add_sign_offs(counters, row, ["record"])
+
+    return progress
+
+
+def refresh_student_progress(*student_ids):
+    """
+    Recompute the summary rows of the given students only.
+    """
+    student_ids = {student_id for student_id in student_ids if student_id}
+    if not student_ids:
+        return
+
+    progress = collect_progress(student_ids)
+    students = Profile.objects.filter(id__in=student_ids, role="student").values(
+        "id", "cohort_code"
+    )
+
+    with transaction.atomic():
+        for student in students:
+            counters = progress.get(
+                student["id"], dict.fromkeys(SUMMARY_COUNTER_FIELDS, 0)
+            )
+            StudentProgressSummary.objects.update_or_create(
+                student_id=student["id"],
+                defaults={"cohort_code": student["cohort_code"] or "", **counters},
+            )
+
+
+def rebuild_student_progress(batch_size=500):
+    """
+    Rebuild the whole summary table. Returns the number of rows written.
+    """
+    progress = collect_progress()
+    summaries = [
+        StudentProgressSummary(
+            student_id=student["id"],
+            cohort_code=student["cohort_code"] or "",
+            **progress.get(student["id"], dict.fromkeys(SUMMARY_COUNTER_FIELDS, 0)),
+        )
+        for student in Profile.objects.filter(role="student").values(
+            "id", "cohort_code"
+        )
+    ]
+
+    with transaction.atomic():
+        StudentProgressSummary.objects.all().delete()
+        StudentProgressSummary.objects.bulk_create(summaries, batch_size=batch_size)
+
+    return len(summaries)
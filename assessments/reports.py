@@ -0,0 +1,390 @@
+import csv
+import math
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate
+
+from django.db import transaction
+from django.utils import timezone
+
+from .choices import DISCHARGE_CHOICES
+from .constants import ASSESSMENT_SIGN_OFFS
+from .models import (
+    Assessments,
+    DailyActivityRollup,
+    DailyDischargeRollup,
+    DailySignOffLatencyRollup,
+    PatientNewComplaint,
+    PatientReevaluation,
+    RollupDirtyDay,
+    RollupWatermark,
+    Soaps,
+)
+
+ROLLUP_WATERMARK_NAME = "clinic_daily_rollups"
+
+# Upper bounds (seconds) of the sign-off latency histogram buckets. Anything
+# slower than the last bound lands in one extra overflow bucket.
+LATENCY_BUCKETS = [
+    15 * 60,
+    30 * 60,
+    60 * 60,
+    2 * 3600,
+    4 * 3600,
+    8 * 3600,
+    12 * 3600,
+    24 * 3600,
+    2 * 86400,
+    3 * 86400,
+    5 * 86400,
+    7 * 86400,
+    14 * 86400,
+    30 * 86400,
+    60 * 86400,
+]
+
+REPORT_PERCENTILES = [50, 90, 95]
+
+# (activity rollup field, model, sign-offs as (key, signed flag, signed at))
+ROLLUP_SOURCES = [
+    (
+        "new_assessments",
+        Assessments,
+        [(key, flag, signed_at) for key, _, flag, signed_at in ASSESSMENT_SIGN_OFFS],
+    ),
+    ("soap_visits", Soaps, [("soap", "is_soap_signed", "soap_signed_at")]),
+    (
+        "reevaluations",
+        PatientReevaluation,
+        [("reevaluation", "is_reevaluation_signed", "reevaluation_signed_at")],
+    ),
+    (
+        "new_complaints",
+        PatientNewComplaint,
+        [("new_complaint", "is_new_complaint_signed", "new_complaint_signed_at")],
+    ),
+]
+
+SIGN_OFF_KEYS = [key for _, _, sign_offs in ROLLUP_SOURCES for key, _, _ in sign_offs]
+ACTIVITY_FIELDS = [field for field, _, _ in ROLLUP_SOURCES] + ["discharges"]
+
+
+def latency_bucket(seconds):
+    return bisect_left(LATENCY_BUCKETS, seconds)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _contiguous_runs(days):
+    """
+    Group dates into (first, last) runs of consecutive days.
+    """
+    runs = []
+    for day in sorted(days):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+# =========================
+# Rollup maintenance
+# =========================
+def mark_days_dirty(*moments):
+    """
+    Queue the local days of `moments` (None is ignored) for the next
+    incremental update, for changes that leave no updated_at behind.
+    """
+    _queue_days({timezone.localdate(moment) for moment in moments if moment})
+
+
+def _queue_days(days):
+    RollupDirtyDay.objects.bulk_create(
+        [RollupDirtyDay(day=day) for day in days], ignore_conflicts=True
+    )
+
+
+def _dirty_days(since):
+    """
+    Local days whose rollups are affected by rows changed after `since`.
+    Activity and latency are keyed by the record's creation day, discharges
+    by the discharge sign-off day.
+    """
+    days = set()
+
+    for _, model, _ in ROLLUP_SOURCES:
+        changed = model.objects.filter(updated_at__gt=since).order_by()
+        for created_at in changed.values_list("created_at", flat=True).iterator():
+            days.add(timezone.localdate(created_at))
+
+    discharged = Assessments.objects.filter(
+        updated_at__gt=since, discharge_signed_at__isnull=False
+    ).order_by()
+    for signed_at in discharged.values_list("discharge_signed_at", flat=True):
+        days.add(timezone.localdate(signed_at))
+
+    return days
+
+
+def _collect_run(first, last):
+    start, end = _day_start(first), _day_start(last + timedelta(days=1))
+    activity = {}
+    discharges = {}
+    latency = {}
+
+    def activity_for(day):
+        return activity.setdefault(day, dict.fromkeys(ACTIVITY_FIELDS, 0))
+
+    for field, model, sign_offs in ROLLUP_SOURCES:
+        signed_fields = [f for _, flag, signed_at in sign_offs for f in (flag, signed_at)]
+        rows = (
+            model.objects.filter(created_at__gte=start, created_at__lt=end)
+            .order_by()
+            .values_list("created_at", *signed_fields)
+            .iterator(chunk_size=2000)
+        )
+
+        for created_at, *signed_values in rows:
+            day = timezone.localdate(created_at)
+            activity_for(day)[field] += 1
+
+            for index, (key, _, _) in enumerate(sign_offs):
+                is_signed, signed_at = signed_values[2 * index : 2 * index + 2]
+                if not is_signed or signed_at is None:
+                    continue
+
+                seconds = max(int((signed_at - created_at).total_seconds()), 0)
+                bucket = latency.setdefault(
+                    (day, key, latency_bucket(seconds)), [0, 0]
+                )
+                bucket[0] += 1
+                bucket[1] += seconds
+
+    rows = (
+        Assessments.objects.filter(
+            is_discharged=True,
+            discharge_signed_at__gte=start,
+            discharge_signed_at__lt=end,
+        )
+        .order_by()
+        .values_list("discharge_signed_at", "reason_for_discharge")
+    )
+    for signed_at, reason in rows:
+        day = timezone.localdate(signed_at)
+        activity_for(day)["discharges"] += 1
+        discharges[(day, reason)] = discharges.get((day, reason), 0) + 1
+
+    return activity, discharges, latency
+
+
+def _rebuild_run(first, last):
+    activity, discharges, latency = _collect_run(first, last)
+
+    with transaction.atomic():
+        for model in (
+            DailyActivityRollup,
+            DailyDischargeRollup,
+            DailySignOffLatencyRollup,
+        ):
+            model.objects.filter(day__gte=first, day__lte=last).delete()
+
+        DailyActivityRollup.objects.bulk_create(
+            DailyActivityRollup(day=day, **counts) for day, counts in activity.items()
+        )
+        DailyDischargeRollup.objects.bulk_create(
+            DailyDischargeRollup(day=day, reason_for_discharge=reason, count=count)
+            for (day, reason), count in discharges.items()
+        )
+        DailySignOffLatencyRollup.objects.bulk_create(
+            (
+                DailySignOffLatencyRollup(
+                    day=day,
+                    sign_off=key,
+                    bucket=bucket,
+                    count=count,
+                    seconds_total=seconds_total,
+                )
+                for (day, key, bucket), (count, seconds_total) in latency.items()
+            ),
+            batch_size=1000,
+        )
+
+
+def update_clinic_rollups(full=False, run_days=31):
+    """
+    Bring the daily rollups up to date and return the number of days
+    recomputed. Only days touched since the stored watermark, or marked
+    dirty by a delete, are rebuilt unless `full` is set (or no watermark
+    exists yet).
+    """
+    # Taken before reading so rows changed while we run are seen next time
+    started_at = timezone.now()
+    watermark, _ = RollupWatermark.objects.get_or_create(name=ROLLUP_WATERMARK_NAME)
+    # Claimed up front: a day marked again while we run gets a new row
+    # and is rebuilt next time
+    with transaction.atomic():
+        marked = dict(RollupDirtyDay.objects.values_list("id", "day"))
+        RollupDirtyDay.objects.filter(id__in=marked).delete()
+
+    if full or watermark.processed_until is None:
+        first_created = (
+            Assessments.objects.order_by("created_at")
+            .values_list("created_at", flat=True)
+            .first()
+        )
+        if first_created is None:
+            days = set()
+        else:
+            first = timezone.localdate(first_created)
+            days = {
+                first + timedelta(days=offset)
+                for offset in range((timezone.localdate(started_at) - first).days + 1)
+            }
+    else:
+        days = _dirty_days(watermark.processed_until) | set(marked.values())
+
+    try:
+        for first, last in _contiguous_runs(days):
+            # Long runs are split so a full rebuild never holds years of rows
+            while first <= last:
+                chunk_last = min(first + timedelta(days=run_days - 1), last)
+                _rebuild_run(first, chunk_last)
+                first = chunk_last + timedelta(days=1)
+    except BaseException:
+        _queue_days(set(marked.values()))
+        raise
+
+    watermark.processed_until = started_at
+    watermark.save(update_fields=["processed_until", "updated_at"])
+
+    return len(days)
+
+
+# =========================
+# Monthly report
+# =========================
+def _percentiles(histogram, seconds_totals):
+    """
+    Percentiles from a latency histogram in one pass over its cumulative
+    counts, interpolating linearly inside the matching bucket.
+    """
+    cumulative = list(accumulate(histogram))
+    total = cumulative[-1] if cumulative else 0
+    if not total:
+        return {f"p{p}_seconds": None for p in REPORT_PERCENTILES}
+
+    lower_bounds = [0] + LATENCY_BUCKETS
+    results = {}
+    for p in REPORT_PERCENTILES:
+        rank = max(math.ceil(total * p / 100), 1)
+        index = bisect_left(cumulative, rank)
+        count = histogram[index]
+
+        if index == len(LATENCY_BUCKETS):
+            # Unbounded overflow bucket: fall back to its mean
+            value = seconds_totals[index] / count
+        else:
+            before = cumulative[index] - count
+            lower, upper = lower_bounds[index], LATENCY_BUCKETS[index]
+            value = lower + (upper - lower) * (rank - before - 0.5) / count
+
+        results[f"p{p}_seconds"] = round(value)
+    return results
+
+
+def _month_key(day):
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def monthly_report(first_month, last_month):
+    """
+    Monthly throughput and sign-off latency between two months (inclusive,
+    given as the first day of each month), read from the rollups only.
+    """
+    next_month = date(
+        last_month.year + last_month.month // 12, last_month.month % 12 + 1, 1
+    )
+    in_range = {"day__gte": first_month, "day__lt": next_month}
+
+    months = {}
+    month = first_month
+    while month < next_month:
+        months[_month_key(month)] = {
+            "month": _month_key(month),
+            **dict.fromkeys(ACTIVITY_FIELDS, 0),
+            "discharges_by_reason": {},
+            "sign_off_latency": {},
+        }
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+    for rollup in DailyActivityRollup.objects.filter(**in_range).values():
+        row = months[_month_key(rollup["day"])]
+        for field in ACTIVITY_FIELDS:
+            row[field] += rollup[field]
+
+    for rollup in DailyDischargeRollup.objects.filter(**in_range).values(
+        "day", "reason_for_discharge", "count"
+    ):
+        by_reason = months[_month_key(rollup["day"])]["discharges_by_reason"]
+        reason = rollup["reason_for_discharge"]
+        by_reason[reason] = by_reason.get(reason, 0) + rollup["count"]
+
+    bucket_count = len(LATENCY_BUCKETS) + 1
+    histograms = {}
+    for rollup in DailySignOffLatencyRollup.objects.filter(**in_range).values(
+        "day", "sign_off", "bucket", "count", "seconds_total"
+    ):
+        counts, seconds = histograms.setdefault(
+            (_month_key(rollup["day"]), rollup["sign_off"]),
+            ([0] * bucket_count, [0] * bucket_count),
+        )
+        counts[rollup["bucket"]] += rollup["count"]
+        seconds[rollup["bucket"]] += rollup["seconds_total"]
+
+    for (month_key, sign_off), (counts, seconds) in histograms.items():
+        total = sum(counts)
+        months[month_key]["sign_off_latency"][sign_off] = {
+            "count": total,
+            "mean_seconds": round(sum(seconds) / total) if total else None,
+            **_percentiles(counts, seconds),
+        }
+
+    return list(months.values())
+
+
+def write_report_csv(report, output):
+    """
+    Flatten the monthly report into one CSV row per month.
+    """
+    reasons = [value for value, _ in DISCHARGE_CHOICES]
+    latency_columns = ["count", "mean_seconds"] + [
+        f"p{p}_seconds" for p in REPORT_PERCENTILES
+    ]
+
+    writer = csv.writer(output)
+    writer.writerow(
+        ["month"]
+        + ACTIVITY_FIELDS
+        + [f"discharges_{reason}" for reason in reasons]
+        + [
+            f"{sign_off}_{column}"
+            for sign_off in SIGN_OFF_KEYS
+            for column in latency_columns
+        ]
+    )
+
+    for row in report:
+        latency = row["sign_off_latency"]
+        writer.writerow(
+            [row["month"]]
+            + [row[field] for field in ACTIVITY_FIELDS]
+            + [row["discharges_by_reason"].get(reason, 0) for reason in reasons]
+            + [
+                latency.get(sign_off, {}).get(column, "")
+                for sign_off in SIGN_OFF_KEYS
+                for column in latency_columns
+            ]
+        )
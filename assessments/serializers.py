@@ -1,18 +1,22 @@
-import base64
-import uuid
 from rest_framework import serializers
-from django.core.files.base import ContentFile
+from django.conf import settings
 from django.utils import timezone
 from accounts.models import Profile
 from .models import (
     Assessments,
     AssessmentAttachment,
     AssessmentTreatmentPlanPhase,
+    AttachmentUpload,
+    MediaDerivative,
     PatientNewComplaint,
     SoapModality,
     Soaps,
     PatientReevaluation,
+    StudentProgressSummary,
 )
+from .derivatives import DERIVATIVE_FIELDS, derivative_urls
+from .drawings import ROM_DRAWING, SIGNATURE, DrawingRejected
+from .strokes import read_drawing, store_drawing
 from .utils import is_section_complete
 from .constants import (
     SECTION_1_FIELDS,
@@ -25,6 +29,41 @@ from .constants import (
 )
 
 
+class DrawingField(serializers.Field):
+    """
+    A canvas drawing sent as stroke data (assessments.strokes), or as an
+    image in a multipart file part or a base64 data URL, which is validated
+    to an optimized PNG (assessments.drawings).
+    """
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        # Empty hidden inputs of pads nobody signed
+        if data in ("", "null", "undefined"):
+            return None
+        try:
+            return read_drawing(data, self.kind)
+        except DrawingRejected as e:
+            raise serializers.ValidationError(str(e))
+
+
+class DrawingURLMixin:
+    """
+    Drawings kept as strokes have no image file; show the URL of their
+    rendering instead.
+    """
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field, url in instance.drawing_urls.items():
+            if field in data and not data[field]:
+                data[field] = url
+        return data
+
+
 class AssessmentsListSerializer(serializers.ModelSerializer):
     student = serializers.StringRelatedField()
     clinician = serializers.CharField(source="evaluator", read_only=True)
@@ -340,7 +379,7 @@ class AssessmentSection1And2Serializer(serializers.ModelSerializer):
     #         # -----------------------------
 
     #         # if field_prefix == "pdpa_consent":
-    #         #     instance.pdpa_consent_signature = file
+    #         #     store_drawing(instance, "pdpa_consent_signature", drawing)
     #         #     instance.is_pdpa_consent_signed = True
     #         #     instance.pdpa_consent_signed_at = timezone.now()
 
@@ -357,7 +396,7 @@ class AssessmentSection1And2Serializer(serializers.ModelSerializer):
     #         )
 
 
-class AssessmentSection3Serializer(serializers.ModelSerializer):
+class AssessmentSection3Serializer(DrawingURLMixin, serializers.ModelSerializer):
     # rom_drawing_data = serializers.CharField(
     #     write_only=True,
     #     required=False,
@@ -421,26 +460,17 @@ class AssessmentSection3Serializer(serializers.ModelSerializer):
 
     def _save_rom_drawing(self, instance, rom_drawing_data):
         try:
-            format, imgstr = rom_drawing_data.split(";base64,")
-            ext = format.split("/")[-1]
+            drawing = read_drawing(rom_drawing_data, ROM_DRAWING)
+        except DrawingRejected as e:
+            raise serializers.ValidationError({"rom_drawing_data": str(e)})
 
-            # delete previous file
-            if instance.rom_drawing:
-                instance.rom_drawing.delete(save=False)
+        # delete previous file
+        if instance.rom_drawing:
+            instance.rom_drawing.delete(save=False)
 
-            file = ContentFile(
-                base64.b64decode(imgstr),
-                name=f"{uuid.uuid4()}.{ext}",
-            )
-
-            instance.rom_drawing = file
-
-            instance.save(update_fields=["rom_drawing"])
+        store_drawing(instance, "rom_drawing", drawing)
 
-        except Exception as e:
-            raise serializers.ValidationError(
-                {"rom_drawing_data": f"Invalid image data: {str(e)}"}
-            )
+        instance.save(update_fields=["rom_drawing"])
 
 
 class AssessmentSection4Serializer(serializers.ModelSerializer):
@@ -473,7 +503,7 @@ class AssessmentSection4Serializer(serializers.ModelSerializer):
         ]
 
 
-class AssessmentConsentSerializer(serializers.ModelSerializer):
+class AssessmentConsentSerializer(DrawingURLMixin, serializers.ModelSerializer):
     """
     Consent-only serializer:
     - Patient consent
@@ -485,10 +515,10 @@ class AssessmentConsentSerializer(serializers.ModelSerializer):
     # =========================================================
     # WRITE-ONLY SIGNATURE INPUTS
     # =========================================================
-    signature_data = serializers.CharField(write_only=True, required=False)
-    attending_signature_data = serializers.CharField(write_only=True, required=False)
-    witness_signature_data = serializers.CharField(write_only=True, required=False)
-    # pdpa_signature_data = serializers.CharField(write_only=True, required=False)
+    signature_data = DrawingField(SIGNATURE, write_only=True, required=False)
+    attending_signature_data = DrawingField(SIGNATURE, write_only=True, required=False)
+    witness_signature_data = DrawingField(SIGNATURE, write_only=True, required=False)
+    # pdpa_signature_data = DrawingField(SIGNATURE, write_only=True, required=False)
 
     # =========================================================
     # DISPLAY FIELDS
@@ -663,83 +693,74 @@ class AssessmentConsentSerializer(serializers.ModelSerializer):
     # =========================================================
     # SIGNATURE HANDLER
     # =========================================================
-    def _save_signature(self, instance, signature_data, field_prefix, extra_data=None):
-        if not signature_data:
+    def _save_signature(self, instance, drawing, field_prefix, extra_data=None):
+        """
+        `drawing` is DrawingField's value: strokes or an optimized PNG.
+        """
+        if not drawing:
             return
 
-        try:
-            format, imgstr = signature_data.split(";base64,")
-            ext = format.split("/")[-1]
+        # =========================
+        # INITIAL PATIENT
+        # =========================
+        if field_prefix == "initial_patient_consent":
+            store_drawing(instance, "initial_patient_consent_signature", drawing)
+            instance.is_initial_patient_consent_signed = True
+            instance.initial_patient_consent_signed_at = timezone.now()
+
+            if extra_data:
+                name = extra_data.get("initial_patient_consent_signed_by")
+                if name:
+                    instance.initial_patient_consent_signed_by = name
+
+        # =========================
+        # ATTENDING
+        # =========================
+        elif field_prefix == "attending_consent":
+            store_drawing(instance, "attending_consent_signature", drawing)
+            instance.is_attending_consent_signed = True
+            instance.attending_consent_signed_at = timezone.now()
+
+            if extra_data:
+                instance.attending_consent_signed_by = extra_data.get(
+                    "attending_consent_signed_by"
+                )
 
-            file = ContentFile(
-                base64.b64decode(imgstr),
-                name=f"{uuid.uuid4()}.{ext}",
-            )
+        # =========================
+        # WITNESS
+        # =========================
+        elif field_prefix == "witness_consent":
+            store_drawing(instance, "witness_consent_signature", drawing)
+            instance.is_witness_consent_signed = True
+            instance.witness_consent_signed_at = timezone.now()
 
-            # =========================
-            # INITIAL PATIENT
-            # =========================
-            if field_prefix == "initial_patient_consent":
-                instance.initial_patient_consent_signature = file
-                instance.is_initial_patient_consent_signed = True
-                instance.initial_patient_consent_signed_at = timezone.now()
-
-                if extra_data:
-                    name = extra_data.get("initial_patient_consent_signed_by")
-                    if name:
-                        instance.initial_patient_consent_signed_by = name
-
-            # =========================
-            # ATTENDING
-            # =========================
-            elif field_prefix == "attending_consent":
-                instance.attending_consent_signature = file
-                instance.is_attending_consent_signed = True
-                instance.attending_consent_signed_at = timezone.now()
-
-                if extra_data:
-                    instance.attending_consent_signed_by = extra_data.get(
-                        "attending_consent_signed_by"
-                    )
+            if extra_data:
+                name = extra_data.get("witness_consent_signed_by")
+                if name:
+                    instance.witness_consent_signed_by = name
 
-            # =========================
-            # WITNESS
-            # =========================
-            elif field_prefix == "witness_consent":
-                instance.witness_consent_signature = file
-                instance.is_witness_consent_signed = True
-                instance.witness_consent_signed_at = timezone.now()
-
-                if extra_data:
-                    name = extra_data.get("witness_consent_signed_by")
-                    if name:
-                        instance.witness_consent_signed_by = name
-
-            # =========================
-            # PDPA (FUTURE USE)
-            # =========================
-            # elif field_prefix == "pdpa_consent":
-            #     instance.pdpa_consent_signature = file
-            #     instance.is_pdpa_consent_signed = True
-            #     instance.pdpa_consent_signed_at = timezone.now()
-            #
-            #     if extra_data:
-            #         name = extra_data.get("pdpa_consent_signed_by")
-            #         if name:
-            #             instance.pdpa_consent_signed_by = name
-
-            instance.save()
-
-        except Exception as e:
-            raise serializers.ValidationError(
-                {"signature_data": f"Invalid image data: {str(e)}"}
-            )
+        # =========================
+        # PDPA (FUTURE USE)
+        # =========================
+        # elif field_prefix == "pdpa_consent":
+        #     store_drawing(instance, "pdpa_consent_signature", drawing)
+        #     instance.is_pdpa_consent_signed = True
+        #     instance.pdpa_consent_signed_at = timezone.now()
+        #
+        #     if extra_data:
+        #         name = extra_data.get("pdpa_consent_signed_by")
+        #         if name:
+        #             instance.pdpa_consent_signed_by = name
+
+        instance.save()
 
 
 class AssessmentAttachmentSerializer(serializers.ModelSerializer):
     uploaded_by_name = serializers.CharField(
         source="uploaded_by.official_name", read_only=True
     )
+    thumbnail = serializers.SerializerMethodField()
+    preview = serializers.SerializerMethodField()
 
     class Meta:
         model = AssessmentAttachment
@@ -749,8 +770,45 @@ class AssessmentAttachmentSerializer(serializers.ModelSerializer):
             "label",
             "uploaded_by_name",
             "uploaded_at",
+            "thumbnail",
+            "preview",
+        ]
+
+    def _derivatives(self, obj):
+        # One query per assessment, shared by every attachment in a list
+        if not hasattr(self, "_derivative_urls"):
+            self._derivative_urls = {}
+        if obj.assessment_id not in self._derivative_urls:
+            self._derivative_urls[obj.assessment_id] = derivative_urls(
+                obj.assessment_id
+            )
+        return self._derivative_urls[obj.assessment_id].get(obj.file.name, {})
+
+    def get_thumbnail(self, obj):
+        return self._derivatives(obj).get(MediaDerivative.THUMBNAIL)
+
+    def get_preview(self, obj):
+        return self._derivatives(obj).get(MediaDerivative.PREVIEW)
+
+
+class AttachmentUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AttachmentUpload
+        fields = [
+            "upload_id",
+            "filename",
+            "size",
+            "offset",
+            "chunk_size",
+            "status",
+            "attachment",
         ]
 
+    def get_chunk_size(self, obj):
+        return settings.ATTACHMENT_UPLOAD_CHUNK_SIZE
+
 
 class AssessmentTreatmentPlanPhaseSerializer(serializers.ModelSerializer):
     updated_by = serializers.CharField(
@@ -1150,11 +1208,13 @@ class AssessmentNotesSerializer(serializers.ModelSerializer):
     soaps = SoapSerializer(many=True, read_only=True)
     reevaluations = serializers.SerializerMethodField()
     new_complaints = serializers.SerializerMethodField()
+    derivatives = serializers.SerializerMethodField()
 
     class Meta:
         model = Assessments
         fields = [
             "id",
+            "derivatives",
             "section_1_2",
             "section_3",
             "section_4",
@@ -1191,4 +1251,42 @@ class AssessmentNotesSerializer(serializers.ModelSerializer):
 
     def get_new_complaints(self, obj):
         qs = PatientNewComplaint.objects.filter(assessment=obj)
-        return PatientNewComplaintSerializer(qs, many=True).data
\ No newline at end of file
+        return PatientNewComplaintSerializer(qs, many=True).data
+
+    def get_derivatives(self, obj):
+        # Thumbnails and previews of the signatures and ROM drawing, by field
+        urls = derivative_urls(obj.id)
+        return {
+            field: urls[getattr(obj, field).name]
+            for field in DERIVATIVE_FIELDS[Assessments]
+            if getattr(obj, field) and getattr(obj, field).name in urls
+        }
+
+
+class StudentProgressSummarySerializer(serializers.ModelSerializer):
+    student_id = serializers.IntegerField(read_only=True)
+    student_name = serializers.CharField(
+        source="student.official_name", read_only=True
+    )
+    member_id = serializers.CharField(source="student.member_id", read_only=True)
+    average_sign_off_seconds = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = StudentProgressSummary
+        fields = [
+            "student_id",
+            "student_name",
+            "member_id",
+            "cohort_code",
+            "assessments_total",
+            "assessments_signed",
+            "soaps_total",
+            "soaps_signed",
+            "reevaluations_total",
+            "reevaluations_signed",
+            "new_complaints_total",
+            "new_complaints_signed",
+            "sign_off_count",
+            "average_sign_off_seconds",
+            "updated_at",
+        ]
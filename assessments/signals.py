@@ -0,0 +1,215 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+
+from accounts.models import Profile
+from accounts.signals import profiles_bulk_synced
+
+from .blobs import release_blob
+from .derivatives import DERIVATIVE_FIELDS, queue_derivatives
+from .models import (
+    AssessmentAttachment,
+    Assessments,
+    AttachmentBlob,
+    MediaDerivative,
+    PatientNewComplaint,
+    PatientReevaluation,
+    Soaps,
+    StudentProgressSummary,
+)
+from .normalize import queue_normalization
+from .progress import refresh_student_progress
+from .reports import mark_days_dirty
+from .worklist import invalidate_worklist, record_evaluator_ids
+
+SIGN_OFF_MODELS = (
+    Assessments,
+    Soaps,
+    PatientReevaluation,
+    PatientNewComplaint,
+)
+
+# Assessment fields copied into (or filtering) its records' worklist items
+RECORD_WORKLIST_FIELDS = ("is_discharged", "patient_name", "mrn_number")
+
+
+def _remember_owners(sender, instance, **kwargs):
+    # Read from __dict__ so deferred fields never trigger a query
+    instance._original_evaluator_id = instance.__dict__.get("evaluator_id")
+    instance._original_student_id = instance.__dict__.get("student_id")
+
+
+def _refresh_derived_data(sender, instance, **kwargs):
+    evaluator_ids = (
+        instance.__dict__.get("evaluator_id"),
+        getattr(instance, "_original_evaluator_id", None),
+    )
+    student_ids = (
+        instance.__dict__.get("student_id"),
+        getattr(instance, "_original_student_id", None),
+    )
+    transaction.on_commit(lambda: invalidate_worklist(*evaluator_ids))
+    transaction.on_commit(lambda: refresh_student_progress(*student_ids))
+    _remember_owners(sender, instance)
+
+
+def _remember_record_worklist_fields(sender, instance, **kwargs):
+    instance._original_record_worklist_fields = tuple(
+        instance.__dict__.get(field) for field in RECORD_WORKLIST_FIELDS
+    )
+
+
+def _refresh_record_worklists(sender, instance, created=False, **kwargs):
+    original = getattr(instance, "_original_record_worklist_fields", None)
+    _remember_record_worklist_fields(sender, instance)
+    if created or original == instance._original_record_worklist_fields:
+        return
+
+    assessment_id = instance.pk
+    transaction.on_commit(
+        lambda: invalidate_worklist(*record_evaluator_ids(assessment_id))
+    )
+
+
+def _refresh_deleted_record_worklists(sender, instance, **kwargs):
+    # Read before the cascade removes the records
+    evaluator_ids = record_evaluator_ids(instance.pk)
+    transaction.on_commit(lambda: invalidate_worklist(*evaluator_ids))
+
+
+def _remember_discharge(sender, instance, **kwargs):
+    instance._original_discharge_signed_at = instance.__dict__.get(
+        "discharge_signed_at"
+    )
+
+
+def _mark_moved_discharge_dirty(sender, instance, **kwargs):
+    # The day a discharge sign-off moved off (or was cleared from) is not
+    # found through updated_at by the next rollup update
+    original = getattr(instance, "_original_discharge_signed_at", None)
+    if original is not None and original != instance.__dict__.get(
+        "discharge_signed_at"
+    ):
+        mark_days_dirty(original)
+    _remember_discharge(sender, instance)
+
+
+def _mark_deleted_record_dirty(sender, instance, **kwargs):
+    mark_days_dirty(
+        instance.__dict__.get("created_at"),
+        instance.__dict__.get("discharge_signed_at"),
+        getattr(instance, "_original_discharge_signed_at", None),
+    )
+
+
+def _remember_progress_fields(sender, instance, **kwargs):
+    instance._original_progress_fields = (
+        instance.__dict__.get("role"),
+        instance.__dict__.get("cohort_code"),
+    )
+
+
+def _sync_progress_summary(sender, instance, created=False, **kwargs):
+    # Profiles are saved on every login; only a new profile or a changed
+    # role or cohort touches the summary
+    original = getattr(instance, "_original_progress_fields", None)
+    _remember_progress_fields(sender, instance)
+    role, cohort_code = instance._original_progress_fields
+    if not created and original == (role, cohort_code):
+        return
+
+    student_id = instance.pk
+    summaries = StudentProgressSummary.objects.filter(student_id=student_id)
+    if role != "student":
+        if not created:
+            summaries.delete()
+    elif created or (original and original[0] != "student"):
+        # New students are listed with their (usually zero) counts right away
+        transaction.on_commit(lambda: refresh_student_progress(student_id))
+    else:
+        summaries.exclude(cohort_code=cohort_code or "").update(
+            cohort_code=cohort_code or ""
+        )
+
+
+def _sync_bulk_progress_summaries(sender, member_ids, **kwargs):
+    profiles = Profile.objects.filter(member_id__in=member_ids, role="student")
+    cohorts = {}
+    for student_id, cohort_code in profiles.values_list("id", "cohort_code"):
+        cohorts.setdefault(cohort_code or "", []).append(student_id)
+
+    # One update per cohort instead of one per student
+    for cohort_code, student_ids in cohorts.items():
+        StudentProgressSummary.objects.filter(student_id__in=student_ids).exclude(
+            cohort_code=cohort_code
+        ).update(cohort_code=cohort_code)
+
+    # New students get their rows now rather than at the next rebuild
+    student_ids = {student_id for ids in cohorts.values() for student_id in ids}
+    listed = StudentProgressSummary.objects.filter(
+        student_id__in=student_ids
+    ).values_list("student_id", flat=True)
+    refresh_student_progress(*student_ids.difference(listed))
+
+
+def _remember_files(sender, instance, **kwargs):
+    # Before first access the descriptor leaves the stored name in __dict__
+    instance._original_files = {
+        field: str(instance.__dict__.get(field) or "")
+        for field in DERIVATIVE_FIELDS[sender]
+    }
+
+
+def _queue_changed_derivatives(sender, instance, update_fields=None, **kwargs):
+    original = getattr(instance, "_original_files", {})
+    for field in DERIVATIVE_FIELDS[sender]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        name = getattr(instance, field).name or ""
+        if name != original.get(field, ""):
+            queue_derivatives(instance, field)
+    _remember_files(sender, instance)
+
+
+def _delete_attachment_files(sender, instance, **kwargs):
+    MediaDerivative.objects.filter(
+        source_model=sender._meta.model_name, source_id=instance.pk
+    ).delete()
+    if instance.blob_id is not None:
+        release_blob(instance.blob_id)
+
+
+def _queue_blob_normalization(sender, instance, created=False, **kwargs):
+    if created and instance.normalization == AttachmentBlob.PENDING:
+        queue_normalization(instance.pk)
+
+
+def _delete_derivative_file(sender, instance, **kwargs):
+    # Also reached by the cascade from a deleted assessment. Derivatives of
+    # a shared attachment blob share files, so keep one still referenced.
+    name = instance.file.name
+    if name and not MediaDerivative.objects.filter(file=name).exists():
+        instance.file.delete(save=False)
+
+
+for model in SIGN_OFF_MODELS:
+    post_init.connect(_remember_owners, sender=model)
+    post_save.connect(_refresh_derived_data, sender=model)
+    post_delete.connect(_refresh_derived_data, sender=model)
+    post_delete.connect(_mark_deleted_record_dirty, sender=model)
+
+post_init.connect(_remember_record_worklist_fields, sender=Assessments)
+post_save.connect(_refresh_record_worklists, sender=Assessments)
+pre_delete.connect(_refresh_deleted_record_worklists, sender=Assessments)
+post_init.connect(_remember_discharge, sender=Assessments)
+post_save.connect(_mark_moved_discharge_dirty, sender=Assessments)
+
+post_init.connect(_remember_progress_fields, sender=Profile)
+post_save.connect(_sync_progress_summary, sender=Profile)
+profiles_bulk_synced.connect(_sync_bulk_progress_summaries)
+
+for model in DERIVATIVE_FIELDS:
+    post_init.connect(_remember_files, sender=model)
+    post_save.connect(_queue_changed_derivatives, sender=model)
+post_save.connect(_queue_blob_normalization, sender=AttachmentBlob)
+post_delete.connect(_delete_attachment_files, sender=AssessmentAttachment)
+post_delete.connect(_delete_derivative_file, sender=MediaDerivative)
@@ -0,0 +1,397 @@
+"""
+Signatures and ROM drawings kept as pen strokes.
+
+The canvas widgets send what was drawn rather than a picture of it:
+
+    {"width": 600, "height": 200, "line_width": 2, "guides": false,
+     "strokes": [[x0, y0, dx1, dy1, dx2, dy2, ...], ...]}
+
+Points are whole canvas pixels; after the first, each is the step from the
+one before, which keeps the numbers (and the JSON) small. A StrokeDrawing
+stores them packed (zigzag varints, zlib compressed), a few hundred bytes
+for a signature, and they are rendered as SVG or as PNG at one of a few
+widths on request. Renders are cached under the digest of the packed strokes, so a
+changed drawing never hits a stale entry.
+
+A ROM drawing redrawn over an older PNG is still sent as a PNG; see
+assessments.drawings.
+"""
+import hashlib
+import io
+import json
+import struct
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image, ImageDraw, ImageFont
+
+from .drawings import DrawingRejected, optimize_drawing
+from .models import StrokeDrawing
+
+FORMAT_VERSION = 1
+# Version, canvas width and height, line width in quarter pixels, flags
+HEADER = struct.Struct(">BHHBB")
+GUIDES = 0x01
+
+MAX_STROKES = 2000
+MAX_POINTS = 100_000
+
+# Real canvases are at least this big and at most this elongated (a
+# full-width signature pad is about 10:1); anything else is crafted
+MIN_CANVAS_DIMENSION = 32
+MAX_ASPECT_RATIO = 16
+
+# PNG widths served, so each drawing has only a few cached renders
+PNG_WIDTHS = (200, 400, 800, 1600)
+
+INK = "#000000"
+# The ROM canvas's column guides (section3_form.html)
+GUIDE_COLOR = "#e0e0e0"
+GUIDE_LABEL_COLOR = "#999999"
+GUIDE_LABELS = ("ROM ACTIVE", "ROM PASSIVE", "ROM RESISTED")
+GUIDE_FONT_SIZE = 14
+
+# Drawn at this multiple and scaled down, for smooth edges
+SUPERSAMPLE = 2
+
+RENDER_CACHE_KEY = "assessments:drawing:{digest}:{fmt}:{width}"
+
+
+class Strokes:
+    def __init__(self, width, height, strokes, line_width=2, guides=False):
+        self.width = width
+        self.height = height
+        # Delta encoded, as sent by the canvas
+        self.strokes = strokes
+        self.line_width = line_width
+        self.guides = guides
+
+    @property
+    def point_count(self):
+        return sum(len(stroke) // 2 for stroke in self.strokes)
+
+    def points(self):
+        """
+        Absolute (x, y) points of each stroke.
+        """
+        for stroke in self.strokes:
+            x, y = stroke[0], stroke[1]
+            points = [(x, y)]
+            for i in range(2, len(stroke), 2):
+                x += stroke[i]
+                y += stroke[i + 1]
+                points.append((x, y))
+            yield points
+
+    def to_payload(self):
+        return {
+            "width": self.width,
+            "height": self.height,
+            "line_width": self.line_width,
+            "guides": self.guides,
+            "strokes": self.strokes,
+        }
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def is_stroke_payload(value):
+    return isinstance(value, dict) or (
+        isinstance(value, str) and value.lstrip().startswith("{")
+    )
+
+
+def _whole(value, what):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise DrawingRejected(f"{what} must be a number")
+    return int(round(value))
+
+
+def parse_strokes(value):
+    """
+    Validate a stroke payload (a dict, or its JSON) into Strokes.
+    """
+    if isinstance(value, str):
+        if len(value) > settings.DRAWING_MAX_UPLOAD_SIZE:
+            raise DrawingRejected("Stroke data is too large")
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise DrawingRejected("Invalid stroke data")
+    if not isinstance(value, dict):
+        raise DrawingRejected("Invalid stroke data")
+
+    width = _whole(value.get("width"), "Width")
+    height = _whole(value.get("height"), "Height")
+    max_dimension = settings.DRAWING_MAX_DIMENSION
+    if not (
+        MIN_CANVAS_DIMENSION <= width <= max_dimension
+        and MIN_CANVAS_DIMENSION <= height <= max_dimension
+    ):
+        raise DrawingRejected("Canvas dimensions are out of range")
+    if max(width, height) > min(width, height) * MAX_ASPECT_RATIO:
+        raise DrawingRejected("Canvas is too narrow")
+
+    line_width = value.get("line_width", 2)
+    if isinstance(line_width, bool) or not isinstance(line_width, (int, float)):
+        raise DrawingRejected("Line width must be a number")
+    if not 0.25 <= line_width <= 32:
+        raise DrawingRejected("Line width is out of range")
+
+    raw_strokes = value.get("strokes")
+    # Empty for a cleared ROM drawing, which keeps its guides
+    if not isinstance(raw_strokes, list):
+        raise DrawingRejected("Strokes must be a list")
+    if len(raw_strokes) > MAX_STROKES:
+        raise DrawingRejected(f"More than {MAX_STROKES} strokes")
+
+    strokes = []
+    points = 0
+    for raw in raw_strokes:
+        if not isinstance(raw, list) or len(raw) < 2 or len(raw) % 2:
+            raise DrawingRejected("Each stroke is a list of x, y pairs")
+        points += len(raw) // 2
+        if points > MAX_POINTS:
+            raise DrawingRejected(f"More than {MAX_POINTS} points")
+
+        stroke = [_whole(n, "Coordinates") for n in raw]
+        # A stray point far off the canvas would blow up the bounding box
+        x, y = stroke[0], stroke[1]
+        for i in range(0, len(stroke), 2):
+            if i:
+                x += stroke[i]
+                y += stroke[i + 1]
+            if not (-width <= x <= 2 * width and -height <= y <= 2 * height):
+                raise DrawingRejected("A stroke goes far outside the canvas")
+        strokes.append(stroke)
+
+    return Strokes(
+        width,
+        height,
+        strokes,
+        line_width=line_width,
+        guides=bool(value.get("guides", False)),
+    )
+
+
+def read_drawing(value, kind):
+    """
+    A canvas drawing from a request: Strokes for stroke data, otherwise an
+    optimized PNG (assessments.drawings). Raises DrawingRejected.
+    """
+    if is_stroke_payload(value):
+        return parse_strokes(value)
+    return optimize_drawing(value, kind)
+
+
+# -----------------------------
+# Packing
+# -----------------------------
+def _write_varint(out, n):
+    # Zigzag first so small negative steps stay one byte
+    n = n * 2 if n >= 0 else -n * 2 - 1
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+
+
+def pack_strokes(strokes):
+    out = bytearray(
+        HEADER.pack(
+            FORMAT_VERSION,
+            strokes.width,
+            strokes.height,
+            round(strokes.line_width * 4),
+            GUIDES if strokes.guides else 0,
+        )
+    )
+    _write_varint(out, len(strokes.strokes))
+    for stroke in strokes.strokes:
+        _write_varint(out, len(stroke) // 2)
+        for n in stroke:
+            _write_varint(out, n)
+    return zlib.compress(bytes(out), 9)
+
+
+def unpack_strokes(data):
+    data = zlib.decompress(bytes(data))
+    version, width, height, line_width, flags = HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown stroke format {version}")
+
+    pos = HEADER.size
+    count, pos = _read_varint(data, pos)
+    strokes = []
+    for _ in range(count):
+        length, pos = _read_varint(data, pos)
+        stroke = []
+        for _ in range(length * 2):
+            n, pos = _read_varint(data, pos)
+            stroke.append(n)
+        strokes.append(stroke)
+
+    return Strokes(
+        width, height, strokes, line_width=line_width / 4, guides=bool(flags & GUIDES)
+    )
+
+
+# -----------------------------
+# Storing
+# -----------------------------
+def store_drawing(assessment, field, drawing):
+    """
+    Set a signature or ROM drawing from read_drawing(): strokes go to a
+    StrokeDrawing and clear the image field, an image replaces any strokes.
+    The caller saves the assessment.
+    """
+    if isinstance(drawing, Strokes):
+        data = pack_strokes(drawing)
+        StrokeDrawing.objects.update_or_create(
+            assessment=assessment,
+            field=field,
+            defaults={
+                "data": data,
+                "digest": hashlib.sha256(data).hexdigest(),
+                "width": drawing.width,
+                "height": drawing.height,
+                "stroke_count": len(drawing.strokes),
+                "point_count": drawing.point_count,
+            },
+        )
+        setattr(assessment, field, None)
+    else:
+        StrokeDrawing.objects.filter(assessment=assessment, field=field).delete()
+        setattr(assessment, field, drawing)
+
+    for cached in ("stroke_drawings_by_field", "drawing_urls"):
+        assessment.__dict__.pop(cached, None)
+
+
+# -----------------------------
+# Rendering
+# -----------------------------
+def _guide_lines(strokes):
+    third = strokes.width / 3
+    return [third, third * 2], [third / 2, third * 1.5, third * 2.5]
+
+
+def render_svg(strokes):
+    w, h = strokes.width, strokes.height
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" '
+        f'viewBox="0 0 {w} {h}">'
+    ]
+    if strokes.guides:
+        lines, centres = _guide_lines(strokes)
+        for x in lines:
+            parts.append(
+                f'<line x1="{x:g}" y1="0" x2="{x:g}" y2="{h}" '
+                f'stroke="{GUIDE_COLOR}" stroke-width="1"/>'
+            )
+        for x, label in zip(centres, GUIDE_LABELS):
+            parts.append(
+                f'<text x="{x:g}" y="20" fill="{GUIDE_LABEL_COLOR}" '
+                f'font-family="Arial, sans-serif" font-size="{GUIDE_FONT_SIZE}" '
+                f'text-anchor="middle">{label}</text>'
+            )
+
+    # The deltas are exactly SVG's relative lineto arguments
+    path = " ".join(
+        f"M{s[0]} {s[1]}l" + (" ".join(map(str, s[2:])) if len(s) > 2 else "0 0")
+        for s in strokes.strokes
+    )
+    parts.append(
+        f'<path d="{path}" fill="none" stroke="{INK}" '
+        f'stroke-width="{strokes.line_width:g}" stroke-linecap="round" '
+        f'stroke-linejoin="round"/>'
+    )
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def png_width(requested):
+    """
+    The PNG width served for a requested one: the next of PNG_WIDTHS.
+    """
+    for width in PNG_WIDTHS:
+        if requested <= width:
+            return width
+    return PNG_WIDTHS[-1]
+
+
+def render_png(strokes, width=None):
+    width = width or strokes.width
+    # Neither side of the output goes past DRAWING_MAX_DIMENSION, whatever
+    # the canvas's proportions (stored drawings predate the aspect check)
+    max_dimension = settings.DRAWING_MAX_DIMENSION
+    scale = min(
+        width / strokes.width, max_dimension / max(strokes.width, strokes.height)
+    )
+    size = (max(1, round(strokes.width * scale)), max(1, round(strokes.height * scale)))
+    # Large renders are smooth enough without supersampling, and this keeps
+    # the buffer to DRAWING_MAX_DIMENSION squared
+    supersample = SUPERSAMPLE if max(size) * SUPERSAMPLE <= max_dimension else 1
+    k = scale * supersample
+
+    image = Image.new("RGBA", (size[0] * supersample, size[1] * supersample), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    if strokes.guides:
+        lines, centres = _guide_lines(strokes)
+        for x in lines:
+            draw.line(
+                [(x * k, 0), (x * k, image.height)],
+                fill=GUIDE_COLOR,
+                width=max(1, round(k)),
+            )
+        font = ImageFont.load_default(size=GUIDE_FONT_SIZE * k)
+        for x, label in zip(centres, GUIDE_LABELS):
+            draw.text((x * k, 20 * k), label, fill=GUIDE_LABEL_COLOR, font=font, anchor="ms")
+
+    line_width = max(1, round(strokes.line_width * k))
+    radius = line_width / 2
+    for points in strokes.points():
+        xy = [(x * k, y * k) for x, y in points]
+        if len(xy) > 1:
+            draw.line(xy, fill=INK, width=line_width, joint="curve")
+        # Round caps
+        for x, y in {xy[0], xy[-1]}:
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=INK)
+
+    if supersample > 1:
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_drawing(drawing, fmt, width=None):
+    """
+    A StrokeDrawing as SVG text or PNG bytes, from the render cache when
+    possible.
+    """
+    key = RENDER_CACHE_KEY.format(digest=drawing.digest, fmt=fmt, width=width or "")
+    rendered = cache.get(key)
+    if rendered is None:
+        strokes = unpack_strokes(drawing.data)
+        if fmt == "svg":
+            rendered = render_svg(strokes)
+        else:
+            rendered = render_png(strokes, width)
+        cache.set(key, rendered, settings.DRAWING_RENDER_CACHE_TIMEOUT)
+    return rendered
@@ -1,3 +1,600 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import ExifTags, Image
+
+from accounts.bulk import bulk_create_accounts, validate_accounts
+from accounts.models import Profile
+from testing.s3_stub import S3StubServer
+
+from .blobs import create_attachment, recount_blobs
+from .choices import DISCHARGE_CHOICES
+from .direct_uploads import (
+    complete_direct_upload,
+    signed_upload,
+    start_direct_upload,
+)
+from .drawings import DrawingRejected
+from .models import (
+    AttachmentBlob,
+    AttachmentUpload,
+    Assessments,
+    DailyActivityRollup,
+    DailyDischargeRollup,
+    RollupDirtyDay,
+    Soaps,
+)
+from .normalize import normalize_blob
+from .reports import update_clinic_rollups
+from .strokes import PNG_WIDTHS, Strokes, parse_strokes, png_width, render_png
+from .uploads import (
+    ChunkInProgress,
+    UploadRejected,
+    abort_upload,
+    append_chunk,
+    complete_upload,
+    start_upload,
+)
+from .worklist import get_pending_sign_offs
+
+
+def make_user(username, role):
+    user = User.objects.create_user(username=username, password="Passw0rd!x")
+    profile = user.profile
+    profile.role = role
+    profile.member_id = username
+    profile.official_name = username.title()
+    profile.save()
+    return user
+
+
+def make_assessment(student, evaluator):
+    return Assessments.objects.create(
+        student=student.profile,
+        evaluator=evaluator.profile,
+        patient_name="Patient",
+        patient_ic_passport_number="900101",
+        mrn_number="M1",
+        gender="male",
+        date_of_birth=date(1990, 1, 1),
+        pulse=70,
+        respiratory=16,
+        systolic_bp=120,
+        diastolic_bp=80,
+    )
+
+
+def stroke_payload(width, height, **extra):
+    return {"width": width, "height": height, "strokes": [[1, 1, 5, 5]], **extra}
+
+
+class StrokeLimitTests(SimpleTestCase):
+    def test_rejects_crafted_canvas_sizes(self):
+        for width, height in [(1, 2000), (2000, 1), (10, 10), (2000, 100)]:
+            with self.subTest(width=width, height=height):
+                with self.assertRaises(DrawingRejected):
+                    parse_strokes(stroke_payload(width, height))
+
+    def test_accepts_real_canvases(self):
+        for width, height in [(1900, 200), (320, 200), (360, 600)]:
+            with self.subTest(width=width, height=height):
+                parse_strokes(stroke_payload(width, height))
+
+    def test_png_widths_are_snapped(self):
+        self.assertEqual(png_width(16), PNG_WIDTHS[0])
+        self.assertEqual(png_width(PNG_WIDTHS[1] + 1), PNG_WIDTHS[2])
+        self.assertEqual(png_width(10**6), PNG_WIDTHS[-1])
+
+    def test_render_stays_within_max_dimension(self):
+        # Stored before the aspect check, so not parsed again
+        strokes = Strokes(1, 2000, [[0, 0, 0, 100]])
+        image = Image.open(io.BytesIO(render_png(strokes, width=PNG_WIDTHS[-1])))
+        self.assertLessEqual(max(image.size), settings.DRAWING_MAX_DIMENSION)
+
+
+class WorklistTests(TestCase):
+    def setUp(self):
+        self.student = make_user("student1", "student")
+        self.clinician = make_user("clinician1", "clinician")
+        self.other = make_user("clinician2", "clinician")
+        self.assessment = make_assessment(self.student, self.clinician)
+        Soaps.objects.create(
+            assessment=self.assessment,
+            student=self.student.profile,
+            evaluator=self.other.profile,
+            soap_pulse=70,
+            soap_respiratory=16,
+            soap_systolic_bp=120,
+            soap_diastolic_bp=80,
+        )
+        self.addCleanup(cache.clear)
+
+    def soap_items(self):
+        worklist = get_pending_sign_offs(self.other.profile.id)
+        return [item for item in worklist["items"] if item["type"] == "soap"]
+
+    def test_record_evaluators_see_assessment_changes(self):
+        self.assertEqual(self.soap_items()[0]["patient_name"], "Patient")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assessment.patient_name = "Renamed"
+            self.assessment.save()
+        self.assertEqual(self.soap_items()[0]["patient_name"], "Renamed")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assessment.is_discharged = True
+            self.assessment.save()
+        self.assertEqual(self.soap_items(), [])
+
+
+class LocalStorageTestCase(TestCase):
+    """
+    Media and partial uploads in a temporary directory for each test.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            ATTACHMENT_UPLOAD_TEMP_DIR=os.path.join(media_root, "parts"),
+            # Background work is left to the tests that call it
+            ATTACHMENT_IMAGE_WORKERS=0,
+            MEDIA_DERIVATIVE_WORKERS=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ChunkedUploadTests(LocalStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        student = make_user("student1", "student")
+        assessment = make_assessment(student, make_user("clinician1", "clinician"))
+        self.upload = start_upload(assessment, student.profile, "scan.pdf", 8)
+
+    def test_chunks_are_appended_and_completed(self):
+        append_chunk(self.upload, 0, io.BytesIO(b"%PDF"), 4)
+        upload = append_chunk(self.upload, 4, io.BytesIO(b"-1.4"), 4)
+        self.assertEqual(upload.offset, 8)
+        self.assertIsNone(upload.chunk_lease_until)
+
+        attachment = complete_upload(upload)
+
+        with attachment.file.open("rb") as f:
+            self.assertEqual(f.read(), b"%PDF-1.4")
+
+    def test_lease_keeps_other_chunks_off_the_file(self):
+        upload = self.upload
+
+        class Stream(io.BytesIO):
+            def read(stream, size=-1):
+                with self.assertRaises(ChunkInProgress):
+                    append_chunk(upload, 0, io.BytesIO(b"%PDF"), 4)
+                return super().read(size)
+
+        self.assertEqual(append_chunk(upload, 0, Stream(b"%PDF"), 4).offset, 4)
+
+    def test_dropped_chunk_releases_the_lease(self):
+        with self.assertRaisesMessage(UploadRejected, "after 2 of 4 bytes"):
+            append_chunk(self.upload, 0, io.BytesIO(b"%P"), 4)
+
+        upload = append_chunk(self.upload, 0, io.BytesIO(b"%PDF"), 4)
+        self.assertEqual(upload.offset, 4)
+
+    def test_aborted_upload_is_not_moved(self):
+        upload = self.upload
+
+        class Stream(io.BytesIO):
+            def read(stream, size=-1):
+                AttachmentUpload.objects.filter(pk=upload.pk).delete()
+                return super().read(size)
+
+        with self.assertRaisesMessage(UploadRejected, "aborted"):
+            append_chunk(upload, 0, Stream(b"%PDF"), 4)
+
+
+class AttachmentTestCase(LocalStorageTestCase):
+    def setUp(self):
+        super().setUp()
+        self.student = make_user("student1", "student")
+        self.assessment = make_assessment(
+            self.student, make_user("clinician1", "clinician")
+        )
+
+    def attach(self, data, name="scan.pdf"):
+        return create_attachment(
+            self.assessment, self.student.profile, SimpleUploadedFile(name, data), name
+        )
+
+
+class BlobReferenceTests(AttachmentTestCase):
+    def test_identical_files_share_one_blob_until_the_last_is_deleted(self):
+        first = self.attach(b"%PDF-1.4 same")
+        second = self.attach(b"%PDF-1.4 same", name="copy.pdf")
+        other = self.attach(b"%PDF-1.4 other")
+
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertNotEqual(first.blob_id, other.blob_id)
+        blob = AttachmentBlob.objects.get(pk=first.blob_id)
+        self.assertEqual(blob.ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(AttachmentBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(default_storage.exists(blob.file.name))
+
+    def test_concurrent_upload_of_the_same_new_file(self):
+        first = self.attach(b"%PDF-1.4 race")
+        folder = os.path.dirname(first.file.name)
+        stored = default_storage.listdir(folder)
+
+        # As if the other upload's blob was inserted after the check
+        with mock.patch("assessments.blobs._existing_blob", return_value=None):
+            second = self.attach(b"%PDF-1.4 race", name="copy.pdf")
+
+        self.assertEqual(second.blob_id, first.blob_id)
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 2)
+        # The second copy was removed again
+        self.assertEqual(default_storage.listdir(folder), stored)
+
+    def test_recount_fixes_drifted_counts(self):
+        attachment = self.attach(b"%PDF-1.4 counted")
+        AttachmentBlob.objects.filter(pk=attachment.blob_id).update(ref_count=5)
+        orphan = AttachmentBlob.objects.create(
+            sha256="0" * 64, size=1, ref_count=1, file="assessments/orphan.pdf"
+        )
+
+        self.assertEqual(recount_blobs(), (1, 1))
+
+        self.assertEqual(AttachmentBlob.objects.get(pk=attachment.blob_id).ref_count, 1)
+        self.assertFalse(AttachmentBlob.objects.filter(pk=orphan.pk).exists())
+
+
+def image_bytes(size, fmt="JPEG", orientation=None):
+    image = Image.new("RGB", size, "red")
+    # A marker in the top-left corner to follow the rotation by
+    image.paste("blue", (0, 0, 8, 8))
+    buffer = io.BytesIO()
+    if orientation is None:
+        image.save(buffer, fmt)
+    else:
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = orientation
+        exif[ExifTags.Base.Make] = "Phone"
+        image.save(buffer, fmt, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+class NormalizeBlobTests(AttachmentTestCase):
+    def normalize(self, attachment):
+        blob = AttachmentBlob.objects.get(pk=attachment.blob_id)
+        self.assertEqual(blob.normalization, AttachmentBlob.PENDING)
+        with self.captureOnCommitCallbacks(execute=True):
+            status = normalize_blob(blob)
+        blob.refresh_from_db()
+        attachment.refresh_from_db()
+        return status, blob
+
+    def test_turned_photo_is_rotated_and_stripped(self):
+        data = image_bytes((60, 40), orientation=6)
+        attachment = self.attach(data, name="photo.jpg")
+        uploaded_name = attachment.file.name
+
+        status, blob = self.normalize(attachment)
+
+        self.assertEqual(status, AttachmentBlob.NORMALIZED)
+        self.assertEqual(attachment.file.name, blob.file.name)
+        self.assertNotEqual(blob.file.name, uploaded_name)
+        self.assertFalse(default_storage.exists(uploaded_name))
+        # Still found by the hash of the upload
+        self.assertEqual(blob.sha256, hashlib.sha256(data).hexdigest())
+
+        with Image.open(default_storage.open(blob.file.name)) as image:
+            self.assertEqual(image.size, (40, 60))
+            self.assertFalse(image.getexif())
+            # Orientation 6 turns the top-left corner to the top-right
+            self.assertGreater(image.getpixel((36, 2))[2], 200)
+
+    @override_settings(ATTACHMENT_IMAGE_MAX_DIMENSION=32)
+    def test_oversized_image_is_downscaled(self):
+        attachment = self.attach(image_bytes((64, 48), fmt="PNG"), name="scan.png")
+
+        status, blob = self.normalize(attachment)
+
+        self.assertEqual(status, AttachmentBlob.NORMALIZED)
+        with Image.open(default_storage.open(blob.file.name)) as image:
+            self.assertEqual(image.size, (32, 24))
+
+    def test_clean_image_is_left_as_uploaded(self):
+        attachment = self.attach(image_bytes((20, 10), fmt="PNG"), name="scan.png")
+        uploaded_name = attachment.file.name
+
+        status, blob = self.normalize(attachment)
+
+        self.assertEqual(status, AttachmentBlob.UNCHANGED)
+        self.assertEqual(blob.file.name, uploaded_name)
+        self.assertTrue(default_storage.exists(uploaded_name))
+
+
+class S3StorageTestCase(TestCase):
+    """
+    Media stored in an in-process S3 stand-in for the whole class.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stub = S3StubServer().start()
+        cls.settings_override = override_settings(
+            MEDIA_STORAGE="s3",
+            MEDIA_SERVE_MODE="redirect",
+            STORAGES={**settings.STORAGES, "default": cls.stub.storage_settings()},
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        cls.stub.stop()
+
+
+class DirectUploadTests(S3StorageTestCase):
+    def setUp(self):
+        self.student = make_user("student1", "student")
+        self.clinician = make_user("clinician1", "clinician")
+        self.assessment = make_assessment(self.student, self.clinician)
+
+    def start(self, data, filename="scan.pdf", sha256=None):
+        return start_direct_upload(
+            self.assessment,
+            self.student.profile,
+            filename,
+            len(data),
+            sha256 or hashlib.sha256(data).hexdigest(),
+        )
+
+    def put(self, upload, data, signed_headers=True):
+        signed = signed_upload(upload)
+        headers = signed["headers"] if signed_headers else {}
+        return requests.put(signed["url"], data=data, headers=headers, timeout=5)
+
+    def complete(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return complete_direct_upload(upload)
+
+    def test_new_blob(self):
+        data = b"%PDF-1.4 new"
+        upload = self.start(data)
+        self.assertEqual(self.put(upload, data).status_code, 200)
+
+        attachment = self.complete(upload)
+
+        self.assertEqual(attachment.file.name, upload.storage_name)
+        self.assertEqual(attachment.blob.sha256, upload.sha256)
+        self.assertEqual(attachment.blob.ref_count, 1)
+        self.assertEqual(self.stub.objects[upload.storage_name], data)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, AttachmentUpload.COMPLETED)
+
+    def test_duplicate_blob(self):
+        data = b"%PDF-1.4 twice"
+        first = self.start(data)
+        self.put(first, data)
+        first_attachment = self.complete(first)
+
+        second = self.start(data, filename="copy.pdf")
+        self.put(second, data)
+        second_attachment = self.complete(second)
+
+        self.assertEqual(second_attachment.blob_id, first_attachment.blob_id)
+        self.assertEqual(second_attachment.file.name, first.storage_name)
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 2)
+        # The second copy is dropped from the bucket
+        self.assertNotIn(second.storage_name, self.stub.objects)
+
+    def test_bucket_refuses_a_body_not_matching_the_signed_checksum(self):
+        upload = self.start(b"%PDF-1.4 declared")
+        response = self.put(upload, b"%PDF-1.4 tampered")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"BadDigest", response.content)
+        self.assertNotIn(upload.storage_name, self.stub.objects)
+
+    def test_size_mismatch_is_rejected(self):
+        upload = self.start(b"%PDF-1.4 declared")
+        self.put(upload, b"%PDF-1.4 longer body", signed_headers=False)
+
+        with self.assertRaisesMessage(UploadRejected, "expected"):
+            self.complete(upload)
+        self.assertNotIn(upload.storage_name, self.stub.objects)
+        self.assertFalse(AttachmentBlob.objects.exists())
+
+    def test_sha256_mismatch_is_rejected(self):
+        upload = self.start(b"%PDF-1.4 declared")
+        self.put(upload, b"%PDF-1.4 replaced", signed_headers=False)
+
+        with self.assertRaisesMessage(UploadRejected, "SHA-256"):
+            self.complete(upload)
+        self.assertNotIn(upload.storage_name, self.stub.objects)
+
+    def test_not_uploaded_yet(self):
+        upload = self.start(b"%PDF-1.4 later")
+
+        with self.assertRaises(UploadRejected):
+            self.complete(upload)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, AttachmentUpload.UPLOADING)
+
+    def test_abort_deletes_the_object(self):
+        data = b"%PDF-1.4 abort"
+        upload = self.start(data)
+        self.put(upload, data)
+
+        abort_upload(upload)
+
+        self.assertNotIn(upload.storage_name, self.stub.objects)
+        self.assertFalse(AttachmentUpload.objects.exists())
+
+    def test_download_redirects_to_a_signed_url(self):
+        data = b"%PDF-1.4 download"
+        upload = self.start(data)
+        self.put(upload, data)
+        attachment = self.complete(upload)
+
+        self.client.force_login(self.clinician)
+        response = self.client.get(attachment.file.url, {"download": "1"})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertTrue(response["Location"].startswith(self.stub.url))
+        signed = requests.get(response["Location"], timeout=5)
+        self.assertEqual(signed.content, data)
+        self.assertEqual(
+            signed.headers["Content-Disposition"], 'attachment; filename="scan.pdf"'
+        )
+
+
+class OrphanedMediaTests(S3StorageTestCase):
+    def test_bucket_is_listed_page_by_page(self):
+        student = make_user("student1", "student")
+        assessment = make_assessment(student, make_user("clinician1", "clinician"))
+        attachment = create_attachment(
+            assessment,
+            student.profile,
+            SimpleUploadedFile("kept.pdf", b"%PDF kept"),
+            "kept.pdf",
+        )
+        orphans = [
+            default_storage.save(f"assessments/temp/orphan{i}.pdf", ContentFile(b"x"))
+            for i in range(3)
+        ]
+        public = default_storage.save("base/logo.png", ContentFile(b"logo"))
+
+        out = io.StringIO()
+        # Several listing pages for a handful of objects
+        with mock.patch("testing.s3_stub.LIST_MAX_KEYS", 2):
+            call_command("clean_orphaned_media", "--delete", "--hours", "0", stdout=out)
+
+        self.assertIn("Deleted 3 orphaned file(s)", out.getvalue())
+        for name in orphans:
+            self.assertNotIn(name, self.stub.objects)
+        self.assertIn(attachment.file.name, self.stub.objects)
+        self.assertIn(public, self.stub.objects)
+
+
+class ClinicRollupTests(TestCase):
+    def setUp(self):
+        self.student = make_user("student1", "student")
+        self.clinician = make_user("clinician1", "clinician")
+        self.assessment = make_assessment(self.student, self.clinician)
+        self.today = timezone.localdate(self.assessment.created_at)
+
+    def discharge(self, signed_at):
+        self.assessment.is_discharged = signed_at is not None
+        self.assessment.discharge_signed_at = signed_at
+        self.assessment.reason_for_discharge = DISCHARGE_CHOICES[0][0]
+        self.assessment.save()
+
+    def test_delete_rebuilds_the_creation_day(self):
+        update_clinic_rollups()
+        self.assertEqual(DailyActivityRollup.objects.get(day=self.today).new_assessments, 1)
+
+        self.assessment.delete()
+        update_clinic_rollups()
+
+        self.assertFalse(DailyActivityRollup.objects.filter(day=self.today).exists())
+        self.assertFalse(RollupDirtyDay.objects.exists())
+
+    def test_moved_discharge_rebuilds_the_old_day(self):
+        Assessments.objects.filter(pk=self.assessment.pk).update(
+            created_at=timezone.now() - timedelta(days=5)
+        )
+        self.assessment.refresh_from_db()
+        earlier = timezone.now() - timedelta(days=3)
+        self.discharge(earlier)
+        update_clinic_rollups()
+        self.assertTrue(
+            DailyDischargeRollup.objects.filter(day=timezone.localdate(earlier)).exists()
+        )
+
+        self.discharge(None)
+        update_clinic_rollups()
+
+        self.assertFalse(DailyDischargeRollup.objects.exists())
+
+
+class StudentProgressTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user("clinician1", "clinician"))
+
+    def listed(self):
+        response = self.client.get(reverse("assessment_student_progress_api"))
+        return {row["member_id"]: row for row in response.json()}
+
+    def test_new_student_is_listed_before_any_record(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = make_user("student1", "student")
+
+        row = self.listed()["student1"]
+        self.assertEqual(row["assessments_total"], 0)
+
+        student.profile.cohort_code = "C2"
+        student.profile.save()
+        self.assertEqual(self.listed()["student1"]["cohort_code"], "C2")
+
+        student.profile.role = "clinician"
+        student.profile.save()
+        self.assertNotIn("student1", self.listed())
+
+    def test_unchanged_profile_save_leaves_the_summary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = make_user("student1", "student").profile
+
+        profile = Profile.objects.get(pk=profile.pk)
+        profile.phone = "0123"
+        # The profile update only
+        with self.assertNumQueries(1):
+            profile.save()
+
+    def test_bulk_created_students_are_listed(self):
+        valid, _, _ = validate_accounts(
+            [
+                {
+                    "username": f"bulk{i}",
+                    "email": f"bulk{i}@example.com",
+                    "official_name": f"Bulk {i}",
+                    "cohort_code": "C1",
+                }
+                for i in range(2)
+            ]
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_create_accounts(valid, workers=1)
+
+        listed = self.listed()
+        self.assertEqual(listed["bulk1"]["cohort_code"], "C1")
+        self.assertEqual(listed["bulk0"]["soaps_total"], 0)
@@ -0,0 +1,162 @@
+import base64
+import heapq
+import json
+from datetime import datetime
+
+from .constants import ASSESSMENT_SIGN_OFFS
+from .models import (
+    Assessments,
+    PatientNewComplaint,
+    PatientReevaluation,
+    Soaps,
+)
+
+TIMELINE_PAGE_SIZE = 50
+TIMELINE_MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# (event kind, label, model, timestamp field, actor field)
+# Every stream is read in (timestamp, id) order from its own table, so each
+# query only touches the rows of one page.
+def _timeline_streams():
+    streams = [
+        (
+            "assessment_created",
+            "Assessment created",
+            Assessments,
+            "created_at",
+            "student__official_name",
+        )
+    ]
+
+    for key, label, _, signed_at in ASSESSMENT_SIGN_OFFS:
+        streams.append(
+            (
+                f"assessment_{key}_signed",
+                f"{label} signed",
+                Assessments,
+                signed_at,
+                f"{signed_at[: -len('_at')]}_by__official_name",
+            )
+        )
+
+    for record_type, label, model, signed_prefix in [
+        ("soap", "S.O.A.P.", Soaps, "soap"),
+        ("reevaluation", "Patient Reevaluation", PatientReevaluation, "reevaluation"),
+        ("new_complaint", "Patient New Complaint", PatientNewComplaint, "new_complaint"),
+    ]:
+        streams.append(
+            (
+                f"{record_type}_created",
+                f"{label} created",
+                model,
+                "created_at",
+                "student__official_name",
+            )
+        )
+        streams.append(
+            (
+                f"{record_type}_signed",
+                f"{label} signed",
+                model,
+                f"{signed_prefix}_signed_at",
+                f"{signed_prefix}_signed_by__official_name",
+            )
+        )
+
+    return streams
+
+
+TIMELINE_STREAMS = _timeline_streams()
+
+
+def encode_cursor(event):
+    payload = json.dumps(
+        [event["occurred_at"].isoformat(), event["kind"], event["record_id"]]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        occurred_at, kind, record_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return datetime.fromisoformat(occurred_at), str(kind), int(record_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def _stream(kind, label, model, ts_field, actor_field, assessment_ids, after, limit):
+    """
+    Yield up to `limit` events of one kind, strictly after the cursor
+    position in (occurred_at, kind, record_id) order.
+    """
+    id_field = "id" if model is Assessments else "assessment_id"
+    queryset = model.objects.filter(
+        **{f"{id_field}__in": assessment_ids, f"{ts_field}__isnull": False}
+    )
+
+    if after is not None:
+        after_ts, after_kind, after_id = after
+        if kind > after_kind:
+            queryset = queryset.filter(**{f"{ts_field}__gte": after_ts})
+        elif kind < after_kind:
+            queryset = queryset.filter(**{f"{ts_field}__gt": after_ts})
+        else:
+            queryset = queryset.filter(
+                **{f"{ts_field}__gt": after_ts}
+            ) | queryset.filter(**{ts_field: after_ts, "id__gt": after_id})
+
+    rows = queryset.order_by(ts_field, "id").values(
+        "id", id_field, ts_field, actor_field
+    )[:limit]
+
+    for row in rows:
+        yield {
+            "kind": kind,
+            "label": label,
+            "occurred_at": row[ts_field],
+            "record_id": row["id"],
+            "assessment_id": row[id_field],
+            "actor": row[actor_field],
+        }
+
+
+def build_patient_timeline(assessments, cursor=None, page_size=TIMELINE_PAGE_SIZE):
+    """
+    One page of the chronological timeline across the given assessments.
+    `assessments` is a queryset already narrowed to one patient (and to
+    whatever the caller is allowed to see).
+    """
+    after = decode_cursor(cursor) if cursor else None
+    assessment_ids = list(assessments.order_by().values_list("id", flat=True))
+
+    # k-way merge of the per-table orderings; each stream over-fetches by one
+    # so the merge can tell whether another page exists.
+    streams = [
+        _stream(*definition, assessment_ids, after, page_size + 1)
+        for definition in TIMELINE_STREAMS
+    ]
+    merged = heapq.merge(
+        *streams,
+        key=lambda event: (event["occurred_at"], event["kind"], event["record_id"]),
+    )
+
+    events = []
+    for event in merged:
+        events.append(event)
+        if len(events) > page_size:
+            break
+
+    has_more = len(events) > page_size
+    events = events[:page_size]
+
+    return {
+        "assessment_ids": sorted(assessment_ids),
+        "count": len(events),
+        "next_cursor": encode_cursor(events[-1]) if has_more else None,
+        "events": events,
+    }
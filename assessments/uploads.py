@@ -0,0 +1,309 @@
+"""
+Chunked, resumable attachment uploads.
+
+    POST   api/assessment-attachments/uploads/
+           {"assessment_id", "filename", "size"}  -> {"upload_id", "offset", ...}
+    PUT    api/assessment-attachments/uploads/<upload_id>/
+           raw chunk body, with headers
+               Upload-Offset: <byte offset the chunk starts at>
+               Chunk-SHA256: <hex SHA-256 of the chunk> (optional)
+    GET    api/assessment-attachments/uploads/<upload_id>/  -> {"offset", ...}
+    POST   api/assessment-attachments/uploads/<upload_id>/complete/
+    DELETE api/assessment-attachments/uploads/<upload_id>/
+
+Chunks are copied from the request stream into a partial file under
+ATTACHMENT_UPLOAD_TEMP_DIR a buffer at a time, so a worker never holds a
+whole chunk, let alone a whole file. After a dropped connection the client
+GETs the upload and sends the rest from the returned offset; anything an
+interrupted chunk wrote past that offset is overwritten. A chunk holds a
+lease on the upload while it is read from the client, so a second request
+for the same upload gets a 409 instead of a database lock wait.
+"""
+import hashlib
+import hmac
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import create_attachment
+from .constants import ALLOWED_EXTENSIONS
+from .models import AttachmentUpload
+
+logger = logging.getLogger("assessments")
+
+UPLOAD_OFFSET_HEADER = "Upload-Offset"
+CHUNK_CHECKSUM_HEADER = "Chunk-SHA256"
+
+# Bytes read from the request per write
+READ_SIZE = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    pass
+
+
+class OffsetMismatch(UploadRejected):
+    def __init__(self, offset, message=None):
+        super().__init__(message or f"Expected a chunk starting at byte {offset}")
+        self.offset = offset
+
+
+class ChunkInProgress(OffsetMismatch):
+    def __init__(self, offset):
+        super().__init__(offset, f"Another chunk is being written at byte {offset}")
+
+
+class PartialUploadFile(File):
+    """
+    The finished partial file. FileSystemStorage moves a file that has a
+    temporary_file_path() into place instead of copying it; other storages
+    read it in chunks.
+    """
+
+    def __init__(self, file, name, path):
+        super().__init__(file, name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class HashingUploadMixin:
+    """
+    SHA-256 of each uploaded file, computed as Django receives it and set
+    on the file as .sha256 (used by assessments.blobs).
+    """
+
+    def new_file(self, *args, **kwargs):
+        # Before super(): the memory handler raises StopFutureHandlers
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        data = super().receive_data_chunk(raw_data, start)
+        # None: this handler kept the chunk, later handlers never see it
+        if data is None:
+            self.sha256.update(raw_data)
+        return data
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(
+    HashingUploadMixin, TemporaryFileUploadHandler
+):
+    pass
+
+
+def partial_path(upload):
+    return os.path.join(settings.ATTACHMENT_UPLOAD_TEMP_DIR, f"{upload.upload_id}.part")
+
+
+def _discard_partial(upload):
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+# -----------------------------
+# Protocol steps
+# -----------------------------
+def validate_upload(filename, size):
+    """
+    The declared name and size of a new upload. Returns the bare filename.
+    """
+    filename = os.path.basename(filename or "").strip()
+    if not filename:
+        raise UploadRejected("Filename is required")
+    if os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise UploadRejected(f"{filename} is not an allowed file type")
+    if size <= 0:
+        raise UploadRejected("Size must be greater than zero")
+    if size > settings.ATTACHMENT_MAX_UPLOAD_SIZE:
+        raise UploadRejected(
+            f"{filename} exceeds {settings.ATTACHMENT_MAX_UPLOAD_SIZE // (1024 * 1024)} MB"
+        )
+    return filename
+
+
+def start_upload(assessment, profile, filename, size):
+    filename = validate_upload(filename, size)
+
+    upload = AttachmentUpload.objects.create(
+        assessment=assessment,
+        uploaded_by=profile,
+        filename=filename,
+        size=size,
+    )
+    os.makedirs(settings.ATTACHMENT_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(partial_path(upload), "wb").close()
+    return upload
+
+
+def _claim_chunk(upload, offset, length):
+    """
+    Check a chunk against the upload and take the chunk lease in a short
+    locked transaction. Returns (upload, lease).
+    """
+    with transaction.atomic():
+        upload = AttachmentUpload.objects.select_for_update().get(pk=upload.pk)
+
+        if upload.status != AttachmentUpload.UPLOADING:
+            raise UploadRejected("Upload is already complete")
+        now = timezone.now()
+        if upload.chunk_lease_until and upload.chunk_lease_until > now:
+            raise ChunkInProgress(upload.offset)
+        if offset != upload.offset:
+            raise OffsetMismatch(upload.offset)
+        if length <= 0:
+            raise UploadRejected("Chunk is empty")
+        if length > settings.ATTACHMENT_UPLOAD_CHUNK_SIZE:
+            raise UploadRejected(
+                f"Chunks are at most {settings.ATTACHMENT_UPLOAD_CHUNK_SIZE} bytes"
+            )
+        if offset + length > upload.size:
+            raise UploadRejected("Chunk goes past the declared size")
+
+        lease = now + timedelta(seconds=settings.ATTACHMENT_UPLOAD_CHUNK_LEASE_SECONDS)
+        upload.chunk_lease_until = lease
+        upload.save(update_fields=["chunk_lease_until", "updated_at"])
+
+    return upload, lease
+
+
+def _write_chunk(upload, offset, stream, length, checksum):
+    digest = hashlib.sha256()
+    written = 0
+    with open(partial_path(upload), "r+b") as f:
+        f.seek(offset)
+        # Drops whatever an interrupted attempt left behind
+        f.truncate()
+        try:
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                digest.update(data)
+                written += len(data)
+        except OSError:
+            # Client went away mid-chunk
+            pass
+
+        if written != length:
+            f.truncate(offset)
+            raise UploadRejected(f"Chunk ended after {written} of {length} bytes")
+        if checksum and not hmac.compare_digest(
+            digest.hexdigest(), checksum.strip().lower()
+        ):
+            f.truncate(offset)
+            raise UploadRejected("Chunk checksum does not match")
+
+
+def append_chunk(upload, offset, stream, length, checksum=None):
+    """
+    Write `length` bytes from `stream` at `offset`. The row is only locked
+    to claim the chunk and to record the new offset; the chunk lease keeps
+    other requests off the file while it is read from the client.
+    Returns the updated upload.
+    """
+    upload, lease = _claim_chunk(upload, offset, length)
+
+    # Only the lease holder's update matches, so an upload aborted or taken
+    # over meanwhile is not moved
+    holding = AttachmentUpload.objects.filter(pk=upload.pk, chunk_lease_until=lease)
+    try:
+        _write_chunk(upload, offset, stream, length, checksum)
+    except BaseException:
+        holding.update(chunk_lease_until=None, updated_at=timezone.now())
+        raise
+
+    upload.offset = offset + length
+    upload.chunk_lease_until = None
+    upload.updated_at = timezone.now()
+    if not holding.update(
+        offset=upload.offset, chunk_lease_until=None, updated_at=upload.updated_at
+    ):
+        raise UploadRejected("Upload was aborted or its chunk lease expired")
+
+    return upload
+
+
+def complete_upload(upload):
+    """
+    Turn a fully received upload into an AssessmentAttachment.
+    """
+    with transaction.atomic():
+        upload = AttachmentUpload.objects.select_for_update().get(pk=upload.pk)
+
+        if upload.status == AttachmentUpload.COMPLETED:
+            return upload.attachment
+        if upload.offset != upload.size:
+            raise OffsetMismatch(upload.offset)
+
+        path = partial_path(upload)
+        with open(path, "rb") as f:
+            attachment = create_attachment(
+                upload.assessment,
+                upload.uploaded_by,
+                PartialUploadFile(f, upload.filename, path),
+                upload.filename,
+            )
+
+        upload.status = AttachmentUpload.COMPLETED
+        upload.attachment = attachment
+        upload.save(update_fields=["status", "attachment", "updated_at"])
+
+    # Left behind when the bytes were already stored, or the storage copied
+    # instead of moving
+    _discard_partial(upload)
+    return attachment
+
+
+def abort_upload(upload):
+    if upload.storage_name:
+        # Sent straight to storage (assessments.direct_uploads)
+        default_storage.delete(upload.storage_name)
+    else:
+        _discard_partial(upload)
+    upload.delete()
+
+
+def expire_uploads(hours=None):
+    """
+    Remove unfinished uploads not touched for `hours`, and their partial
+    files. Returns the number removed.
+    """
+    hours = settings.ATTACHMENT_UPLOAD_EXPIRY_HOURS if hours is None else hours
+    cutoff = timezone.now() - timedelta(hours=hours)
+
+    stale = AttachmentUpload.objects.filter(
+        status=AttachmentUpload.UPLOADING, updated_at__lt=cutoff
+    )
+    removed = 0
+    for upload in stale.iterator():
+        abort_upload(upload)
+        removed += 1
+
+    if removed:
+        logger.info(f"EXPIRE - Attachment uploads | removed={removed}")
+    return removed
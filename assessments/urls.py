@@ -83,6 +83,26 @@ urlpatterns = [
         views.NotesPDFView.as_view(),
         name="assessment_notes_pdf",
     ),
+    path(
+        "files/<str:model_name>/<int:pk>/<str:field_name>/<str:filename>",
+        views.AssessmentFileView.as_view(),
+        name="assessment_file",
+    ),
+    path(
+        "files/drawings/<int:pk>/<str:field_name>.<slug:fmt>",
+        views.AssessmentDrawingView.as_view(),
+        name="assessment_drawing",
+    ),
+    path(
+        "files/<int:pk>/all.zip",
+        views.AssessmentArchiveView.as_view(),
+        name="assessment_files_zip",
+    ),
+    path(
+        "student-progress/",
+        views.StudentProgressView.as_view(),
+        name="student_progress",
+    ),
 
     # API endpoints
     path(
@@ -110,6 +130,31 @@ urlpatterns = [
         api.AssessmentAttachmentAPIView.as_view(),
         name="assessment_attachment_api",
     ),
+    path(
+        "api/assessment-attachments/uploads/",
+        api.AttachmentUploadAPIView.as_view(),
+        name="attachment_upload_api",
+    ),
+    path(
+        "api/assessment-attachments/uploads/<uuid:upload_id>/",
+        api.AttachmentUploadDetailAPIView.as_view(),
+        name="attachment_upload_detail_api",
+    ),
+    path(
+        "api/assessment-attachments/uploads/<uuid:upload_id>/complete/",
+        api.AttachmentUploadCompleteAPIView.as_view(),
+        name="attachment_upload_complete_api",
+    ),
+    path(
+        "api/assessment-attachments/direct-uploads/",
+        api.DirectUploadAPIView.as_view(),
+        name="direct_upload_api",
+    ),
+    path(
+        "api/assessment-attachments/direct-uploads/<uuid:upload_id>/complete/",
+        api.DirectUploadCompleteAPIView.as_view(),
+        name="direct_upload_complete_api",
+    ),
     path(
         "api/assessments/consent/",
         api.AssessmentConsentAPIView.as_view(),
@@ -140,4 +185,24 @@ urlpatterns = [
         api.AssessmentNotesAPIView.as_view(),
         name="assessment_notes_api",
     ),
+    path(
+        "api/assessments/pending-sign-offs/",
+        api.PendingSignOffAPIView.as_view(),
+        name="assessment_pending_sign_offs_api",
+    ),
+    path(
+        "api/assessments/student-progress/",
+        api.StudentProgressAPIView.as_view(),
+        name="assessment_student_progress_api",
+    ),
+    path(
+        "api/assessments/patient-timeline/",
+        api.PatientTimelineAPIView.as_view(),
+        name="assessment_patient_timeline_api",
+    ),
+    path(
+        "api/reports/clinic-monthly/",
+        api.ClinicMonthlyReportAPIView.as_view(),
+        name="clinic_monthly_report_api",
+    ),
 ]
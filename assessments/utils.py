@@ -15,6 +15,13 @@ def clinician_is_readonly(profile, assessment):
     )
 
 
+def can_view_assessment(profile, assessment):
+    """
+    Students only see their own assessments; clinicians and admins see all.
+    """
+    return profile.role != "student" or assessment.student_id == profile.id
+
+
 # Check if assessment section has all required fields filled
 def is_section_complete(obj, fields):
     for field in fields:
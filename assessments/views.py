@@ -1,20 +1,46 @@
-from django.http import HttpResponseForbidden, HttpResponse
+import json
+import os
+import posixpath
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
 from django.urls import reverse
 from django.shortcuts import (
     get_object_or_404,
     render,
 )
 from django.views import View
+from accounts.choices import COHORT_CODE_CHOICES
 from accounts.models import Profile
+from imu_chiropractic_form.downloads import IMMUTABLE_MAX_AGE, serve_file, stream_zip
 from .models import (
     Assessments,
+    AssessmentAttachment,
+    ProtectedFieldFileMixin,
     PatientNewComplaint,
     Soaps,
     SoapModality,
     PatientReevaluation,
+    StrokeDrawing,
 )
 from .choices import INITIAL_PATIENT_CONSENT_CHOICES
+from .constants import DRAWING_FIELDS
+from .direct_uploads import direct_uploads_enabled
+from .strokes import png_width, render_drawing, unpack_strokes
 from .utils import (
+    can_view_assessment,
     clinician_is_readonly,
     generate_pdf,
 )
@@ -135,6 +161,12 @@ class AssessmentConsentsFormView(BaseAssessmentFormView):
 class AssessmentTreatmentPlanFormView(BaseAssessmentFormView):
     template_name = "assessments/treatment_plan_form.html"
 
+    def get_extra_context(self):
+        return {
+            "attachment_max_upload_size": settings.ATTACHMENT_MAX_UPLOAD_SIZE,
+            "attachment_direct_uploads": direct_uploads_enabled(),
+        }
+
 
 class SoapFormView(View):
     template_name = "assessments/soap_form.html"
@@ -404,3 +436,216 @@ class NotesPDFView(View):
         )
 
         return response
+
+
+class StudentProgressView(View):
+    template_name = "assessments/student_progress.html"
+
+    def get(self, request):
+        profile = request.user.profile
+        if profile.role not in ["clinician", "admin"]:
+            return HttpResponseForbidden("You cannot access student progress.")
+
+        context = {
+            "profile": profile,
+            "cohort_codes": [code for code, _ in COHORT_CODE_CHOICES],
+        }
+        return render(request, self.template_name, context)
+
+
+class AssessmentFileView(View):
+    """
+    Serve a signature, ROM drawing or attachment after checking the user
+    may see its assessment. Linked from the file fields' .url.
+    """
+
+    def get(self, request, model_name, pk, field_name, filename):
+        profile = request.user.profile
+
+        try:
+            model = apps.get_model("assessments", model_name)
+            field = model._meta.get_field(field_name)
+        except (LookupError, FieldDoesNotExist):
+            raise Http404("Unknown file")
+        attr_class = getattr(field, "attr_class", object)
+        if not issubclass(attr_class, ProtectedFieldFileMixin):
+            raise Http404("Unknown file")
+
+        # Only the columns needed; assessments carry encrypted fields
+        if model is Assessments:
+            instance = get_object_or_404(
+                Assessments.objects.only("student", field_name), pk=pk
+            )
+            assessment = instance
+        else:
+            columns = [field_name, "assessment__student"]
+            if model is AssessmentAttachment:
+                columns.append("label")
+            instance = get_object_or_404(
+                model.objects.select_related("assessment").only(*columns), pk=pk
+            )
+            assessment = instance.assessment
+
+        fieldfile = getattr(instance, field_name)
+        # An old URL of a file that has since been replaced
+        if not fieldfile or os.path.basename(fieldfile.name) != filename:
+            raise Http404("File not found")
+
+        if not can_view_assessment(profile, assessment):
+            return HttpResponseForbidden("You cannot access this file.")
+
+        # Blob names are hashes; attachments keep the uploaded name as label
+        download_name = None
+        label = getattr(instance, "label", "")
+        extension = os.path.splitext(filename)[1]
+        if label and os.path.splitext(label)[1].lower() == extension:
+            download_name = label
+
+        return serve_file(
+            request,
+            fieldfile,
+            as_attachment=request.GET.get("download") == "1",
+            download_name=download_name,
+        )
+
+
+class AssessmentDrawingView(View):
+    """
+    A signature or ROM drawing kept as strokes, as SVG, as PNG (?width= in
+    pixels, rounded up to one of PNG_WIDTHS) or as its stroke data (json,
+    to redraw it). Linked from StrokeDrawing.url().
+    """
+
+    CONTENT_TYPES = {
+        "svg": "image/svg+xml",
+        "png": "image/png",
+        "json": "application/json",
+    }
+
+    def get(self, request, pk, field_name, fmt):
+        profile = request.user.profile
+
+        if fmt not in self.CONTENT_TYPES:
+            raise Http404("Unknown format")
+
+        drawing = get_object_or_404(
+            StrokeDrawing.objects.select_related("assessment").only(
+                "data", "digest", "assessment__student"
+            ),
+            assessment_id=pk,
+            field=field_name,
+        )
+        if not can_view_assessment(profile, drawing.assessment):
+            return HttpResponseForbidden("You cannot access this file.")
+
+        width = None
+        if fmt == "png" and request.GET.get("width"):
+            try:
+                width = int(request.GET["width"])
+            except ValueError:
+                return HttpResponseBadRequest("Width must be a number of pixels.")
+            width = png_width(width)
+
+        etag = f'"{drawing.digest[:16]}-{fmt}-{width or ""}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        if fmt == "json":
+            content = json.dumps(unpack_strokes(drawing.data).to_payload())
+        else:
+            content = render_drawing(drawing, fmt, width)
+
+        response = HttpResponse(content, content_type=self.CONTENT_TYPES[fmt])
+        response["ETag"] = etag
+        # A URL with the current digest always gets the same drawing
+        if request.GET.get("v") == drawing.digest[:12]:
+            patch_cache_control(
+                response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+            )
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class AssessmentArchiveView(View):
+    """
+    Every attachment, signature and ROM drawing of an assessment in one ZIP,
+    streamed from storage as it is built. Drawings kept as strokes are
+    rendered as PNG.
+    """
+
+    def get(self, request, pk):
+        profile = request.user.profile
+
+        assessment = get_object_or_404(
+            Assessments.objects.only("student", *DRAWING_FIELDS), pk=pk
+        )
+        if not can_view_assessment(profile, assessment):
+            return HttpResponseForbidden("You cannot access these files.")
+
+        attachments = list(
+            assessment.attachments.only("file", "label", "uploaded_at").order_by(
+                "uploaded_at", "id"
+            )
+        )
+        stroke_drawings = {
+            drawing.field: drawing
+            for drawing in assessment.stroke_drawings.only(
+                "field", "data", "digest", "updated_at"
+            )
+        }
+
+        response = StreamingHttpResponse(
+            stream_zip(self._entries(assessment, attachments, stroke_drawings)),
+            content_type="application/zip",
+        )
+        response["Content-Disposition"] = content_disposition_header(
+            True, f"assessment_{assessment.id}_files.zip"
+        )
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+    def _entries(self, assessment, attachments, stroke_drawings):
+        used = set()
+
+        for attachment in attachments:
+            name = attachment.label or os.path.basename(attachment.file.name)
+            yield from self._file_entry(
+                attachment.file, self._unique(f"attachments/{name}", used)
+            )
+
+        for field, label in DRAWING_FIELDS.items():
+            fieldfile = getattr(assessment, field)
+            if fieldfile:
+                ext = os.path.splitext(fieldfile.name)[1].lower()
+                yield from self._file_entry(
+                    fieldfile, self._unique(f"drawings/{slugify(label)}{ext}", used)
+                )
+            elif field in stroke_drawings:
+                drawing = stroke_drawings[field]
+                png = render_drawing(drawing, "png")
+                name = self._unique(f"drawings/{slugify(label)}.png", used)
+                yield name, timezone.localtime(drawing.updated_at), len(png), [png]
+
+    def _file_entry(self, fieldfile, name):
+        storage = fieldfile.storage
+        try:
+            size = storage.size(fieldfile.name)
+            modified = storage.get_modified_time(fieldfile.name)
+            f = storage.open(fieldfile.name, "rb")
+        except OSError:
+            # Missing from storage; the rest of the archive is still useful
+            return
+        with f:
+            yield name, timezone.localtime(modified), size, f.chunks()
+
+    def _unique(self, name, used):
+        # Two attachments may share a label
+        stem, ext = posixpath.splitext(name)
+        candidate, n = name, 1
+        while candidate in used:
+            n += 1
+            candidate = f"{stem} ({n}){ext}"
+        used.add(candidate)
+        return candidate
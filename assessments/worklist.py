@@ -0,0 +1,180 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .constants import ASSESSMENT_SIGN_OFFS
+from .models import (
+    Assessments,
+    PatientNewComplaint,
+    PatientReevaluation,
+    Soaps,
+)
+
+WORKLIST_CACHE_KEY = "assessments:worklist:{evaluator_id}"
+
+
+def worklist_cache_key(evaluator_id):
+    return WORKLIST_CACHE_KEY.format(evaluator_id=evaluator_id)
+
+
+def invalidate_worklist(*evaluator_ids):
+    keys = {worklist_cache_key(e) for e in evaluator_ids if e}
+    if keys:
+        cache.delete_many(list(keys))
+
+
+def record_evaluator_ids(assessment_id):
+    """
+    Evaluators of the SOAPs, reevaluations and new complaints under an
+    assessment, whose worklists show its patient and discharge state.
+    """
+    querysets = [
+        model.objects.filter(assessment_id=assessment_id)
+        .order_by()
+        .values_list("evaluator_id", flat=True)
+        for model in (Soaps, PatientReevaluation, PatientNewComplaint)
+    ]
+    return set(querysets[0].union(*querysets[1:]))
+
+
+def get_pending_sign_offs(evaluator_id):
+    """
+    Cached worklist of everything awaiting sign-off by an evaluator.
+    The cache entry is dropped by assessments.signals whenever one of the
+    underlying records is saved or deleted.
+    """
+    key = worklist_cache_key(evaluator_id)
+    worklist = cache.get(key)
+
+    if worklist is None:
+        worklist = build_pending_sign_offs(evaluator_id)
+        cache.set(key, worklist, settings.WORKLIST_CACHE_TIMEOUT)
+
+    return worklist
+
+
+def build_pending_sign_offs(evaluator_id):
+    """
+    Build the worklist with one set-based query per table.
+    Discharged assessments are locked, so nothing under them is listed.
+    """
+    items = []
+    items.extend(_pending_assessment_sections(evaluator_id))
+    items.extend(
+        _pending_records(
+            Soaps,
+            evaluator_id,
+            signed_field="is_soap_signed",
+            record_type="soap",
+            label="S.O.A.P.",
+        )
+    )
+    items.extend(
+        _pending_records(
+            PatientReevaluation,
+            evaluator_id,
+            signed_field="is_reevaluation_signed",
+            record_type="reevaluation",
+            label="Patient Reevaluation",
+        )
+    )
+    items.extend(
+        _pending_records(
+            PatientNewComplaint,
+            evaluator_id,
+            signed_field="is_new_complaint_signed",
+            record_type="new_complaint",
+            label="Patient New Complaint",
+        )
+    )
+
+    items.sort(key=lambda item: (item["created_at"], item["record_id"]))
+
+    counts = {}
+    for item in items:
+        counts[item["section"]] = counts.get(item["section"], 0) + 1
+
+    return {
+        "evaluator_id": evaluator_id,
+        "generated_at": timezone.now(),
+        "total": len(items),
+        "counts": counts,
+        "items": items,
+    }
+
+
+def _pending_assessment_sections(evaluator_id):
+    flag_fields = [flag for key, _, flag, _ in ASSESSMENT_SIGN_OFFS if key != "discharge"]
+
+    # Discharge only waits on a sign-off once a reason has been recorded
+    pending = Q(reason_for_discharge__gt="")
+    for flag in flag_fields:
+        pending |= Q(**{flag: False})
+
+    rows = (
+        Assessments.objects.filter(evaluator_id=evaluator_id, is_discharged=False)
+        .filter(pending)
+        .order_by()
+        .values(
+            "id",
+            "patient_name",
+            "mrn_number",
+            "created_at",
+            "student__official_name",
+            "reason_for_discharge",
+            *flag_fields,
+        )
+    )
+
+    for row in rows:
+        for key, label, flag, _ in ASSESSMENT_SIGN_OFFS:
+            if key == "discharge":
+                if not row["reason_for_discharge"]:
+                    continue
+            elif row[flag]:
+                continue
+
+            yield {
+                "type": "assessment",
+                "section": key,
+                "label": label,
+                "record_id": row["id"],
+                "assessment_id": row["id"],
+                "patient_name": row["patient_name"],
+                "mrn_number": row["mrn_number"],
+                "student_name": row["student__official_name"],
+                "created_at": row["created_at"],
+            }
+
+
+def _pending_records(model, evaluator_id, signed_field, record_type, label):
+    rows = (
+        model.objects.filter(
+            evaluator_id=evaluator_id,
+            assessment__is_discharged=False,
+            **{signed_field: False},
+        )
+        .order_by()
+        .values(
+            "id",
+            "assessment_id",
+            "assessment__patient_name",
+            "assessment__mrn_number",
+            "student__official_name",
+            "created_at",
+        )
+    )
+
+    for row in rows:
+        yield {
+            "type": record_type,
+            "section": record_type,
+            "label": label,
+            "record_id": row["id"],
+            "assessment_id": row["assessment_id"],
+            "patient_name": row["assessment__patient_name"],
+            "mrn_number": row["assessment__mrn_number"],
+            "student_name": row["student__official_name"],
+            "created_at": row["created_at"],
+        }
@@ -0,0 +1,35 @@
+import logging
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .widgets import get_dashboard_summary
+
+logger = logging.getLogger("assessments")
+
+
+class DashboardSummaryAPIView(APIView):
+    # ^dashboard/ is login exempt, so authentication is enforced here
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = request.user.profile
+
+        # -----------------------------
+        # Permission check
+        # -----------------------------
+        if profile.role != "admin":
+            return Response(
+                {"detail": "You are not allowed to view the dashboard"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        summary = get_dashboard_summary()
+
+        logger.info(
+            f"VIEW - Dashboard Summary | "
+            f"user={profile.official_name} ({profile.role})"
+        )
+
+        return Response(summary, status=status.HTTP_200_OK)
@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from assessments.signals import SIGN_OFF_MODELS
+
+from .widgets import invalidate_dashboard
+
+
+def _invalidate_dashboard(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_dashboard)
+
+
+for model in SIGN_OFF_MODELS:
+    post_save.connect(_invalidate_dashboard, sender=model)
+    post_delete.connect(_invalidate_dashboard, sender=model)
@@ -0,0 +1,12 @@
+from django.urls import path
+from dashboard import views, api
+
+urlpatterns = [
+    path("", views.DashboardView.as_view(), name="dashboard"),
+    # API
+    path(
+        "api/summary/",
+        api.DashboardSummaryAPIView.as_view(),
+        name="dashboard_summary_api",
+    ),
+]
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib import messages
+from django.shortcuts import redirect, render
+from django.views import View
+
+from .widgets import get_dashboard_summary
+
+
+class DashboardView(View):
+    template_name = "dashboard/dashboard.html"
+
+    def get(self, request):
+        # ^dashboard/ is login exempt, so authentication is enforced here
+        if not request.user.is_authenticated:
+            return redirect(f"{settings.LOGIN_URL}?next={request.path}")
+
+        if request.user.profile.role != "admin":
+            messages.error(request, "You are not authorized to access this page.")
+            return redirect("/assessments")
+
+        # Rendered server-side from the cached widgets: one round-trip
+        context = {
+            "profile": request.user.profile,
+            "summary": get_dashboard_summary(),
+            "refresh_seconds": settings.DASHBOARD_CACHE_TIMEOUT,
+        }
+        return render(request, self.template_name, context)
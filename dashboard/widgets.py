@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from assessments.constants import ASSESSMENT_SIGN_OFFS
+from assessments.models import (
+    Assessments,
+    PatientNewComplaint,
+    PatientReevaluation,
+    Soaps,
+)
+
+DASHBOARD_CACHE_KEY = "dashboard:{widget}"
+
+
+def widget_cache_key(widget, day=None):
+    key = DASHBOARD_CACHE_KEY.format(widget=widget)
+    return f"{key}:{day.isoformat()}" if day else key
+
+
+def _cached(key, build):
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.DASHBOARD_CACHE_TIMEOUT)
+    return value
+
+
+# =========================
+# Widgets
+# Each one is a single aggregate query (or one per table)
+# =========================
+def assessment_status():
+    return Assessments.objects.order_by().aggregate(
+        active=Count("id", filter=Q(is_discharged=False)),
+        discharged=Count("id", filter=Q(is_discharged=True)),
+    )
+
+
+def todays_appointments(day):
+    counts = {
+        "soap": Soaps.objects.filter(next_appointment=day).count(),
+        "reevaluation": PatientReevaluation.objects.filter(
+            next_reevaluation=day
+        ).count(),
+        "new_complaint": PatientNewComplaint.objects.filter(
+            next_reevaluation=day
+        ).count(),
+    }
+    return {"date": day, "total": sum(counts.values()), **counts}
+
+
+def unsigned_by_section():
+    # Discharged assessments are locked, so they never count as unsigned
+    sections = Assessments.objects.filter(is_discharged=False).order_by().aggregate(
+        **{
+            key: Count("id", filter=Q(**{flag: False}))
+            for key, _, flag, _ in ASSESSMENT_SIGN_OFFS
+            if key != "discharge"
+        }
+    )
+
+    for key, model, flag in [
+        ("soap", Soaps, "is_soap_signed"),
+        ("reevaluation", PatientReevaluation, "is_reevaluation_signed"),
+        ("new_complaint", PatientNewComplaint, "is_new_complaint_signed"),
+    ]:
+        sections[key] = model.objects.filter(
+            assessment__is_discharged=False, **{flag: False}
+        ).count()
+
+    return sections
+
+
+def clinician_caseload():
+    return list(
+        Assessments.objects.filter(is_discharged=False, evaluator__isnull=False)
+        .order_by()
+        .values("evaluator_id", "evaluator__official_name")
+        .annotate(open_assessments=Count("id"))
+        .order_by("-open_assessments", "evaluator__official_name")
+    )
+
+
+def get_dashboard_summary():
+    today = timezone.localdate()
+    return {
+        "generated_at": timezone.now(),
+        "assessment_status": _cached(
+            widget_cache_key("assessment_status"), assessment_status
+        ),
+        "todays_appointments": _cached(
+            widget_cache_key("todays_appointments", today),
+            lambda: todays_appointments(today),
+        ),
+        "unsigned_by_section": _cached(
+            widget_cache_key("unsigned_by_section"), unsigned_by_section
+        ),
+        "clinician_caseload": _cached(
+            widget_cache_key("clinician_caseload"), clinician_caseload
+        ),
+    }
+
+
+def invalidate_dashboard():
+    cache.delete_many(
+        [
+            widget_cache_key("assessment_status"),
+            widget_cache_key("todays_appointments", timezone.localdate()),
+            widget_cache_key("unsigned_by_section"),
+            widget_cache_key("clinician_caseload"),
+        ]
+    )
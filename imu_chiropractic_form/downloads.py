@@ -0,0 +1,229 @@
+"""
+Sending a stored file once a view has checked the user may see it.
+
+MEDIA_SERVE_MODE decides who sends the bytes:
+
+- "django": streamed from this process, with single-range requests answered
+  206 so large PDFs can be resumed and scrubbed.
+- "x-accel": an X-Accel-Redirect to MEDIA_ACCEL_REDIRECT_PREFIX, which nginx
+  maps to MEDIA_ROOT in an `internal` location and serves itself.
+- "x-sendfile": an X-Sendfile header with the file's path, for Apache or
+  lighttpd with mod_xsendfile.
+- "redirect": a redirect to the storage's own URL for the file, signed and
+  short-lived with object storage (MEDIA_STORAGE = "s3").
+
+Other files without a local path (remote storages) are streamed.
+
+stream_zip() builds an archive of several files while it is being sent.
+"""
+import mimetypes
+import os
+import re
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+
+# Upload names start with 8 hex digits of a UUID, and attachment blobs are
+# named by their SHA-256, so a name is never reused for different content
+IMMUTABLE_NAME_RE = re.compile(r"^([0-9a-f]{8}-|[0-9a-f]{64}\.)")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range Range header, or None to send
+    the whole file. Multiple ranges are answered with the whole file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            # Malformed, so ignored
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+
+    if start >= size or size == 0:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def _read_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def _local_path(fieldfile):
+    try:
+        return fieldfile.path
+    except NotImplementedError:
+        return None
+
+
+def _redirect_to_storage(storage, name, as_attachment, download_name):
+    disposition = content_disposition_header(as_attachment, download_name)
+    try:
+        # django-storages: the bucket sends the Content-Disposition
+        url = storage.url(
+            name, parameters={"ResponseContentDisposition": disposition}
+        )
+    except TypeError:
+        url = storage.url(name)
+
+    response = HttpResponseRedirect(url)
+    # The signed URL expires, so the redirect is never reused
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+def serve_file(request, fieldfile, as_attachment=False, download_name=None):
+    storage = fieldfile.storage
+    name = fieldfile.name
+    filename = os.path.basename(name)
+    path = _local_path(fieldfile)
+
+    if settings.MEDIA_SERVE_MODE == "redirect" and not path:
+        return _redirect_to_storage(
+            storage, name, as_attachment, download_name or filename
+        )
+
+    try:
+        size = storage.size(name)
+        modified = int(storage.get_modified_time(name).timestamp())
+    except (OSError, NotImplementedError):
+        raise Http404("File not found")
+
+    etag = f'"{modified:x}-{size:x}"'
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+    if not_modified is not None:
+        return not_modified
+
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    mode = settings.MEDIA_SERVE_MODE
+
+    if mode == "x-accel" and path:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+    elif mode == "x-sendfile" and path:
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+    else:
+        # If-Range: only honour the range if the client's copy is current
+        if_range = request.headers.get("If-Range")
+        byte_range = None
+        if not if_range or if_range in (etag, http_date(modified)):
+            try:
+                byte_range = parse_range(request.headers.get("Range"), size)
+            except RangeNotSatisfiable:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+
+        f = storage.open(name, "rb")
+        if byte_range is None:
+            response = FileResponse(f, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(f, start, end - start + 1),
+                status=206,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(end - start + 1)
+        response["Accept-Ranges"] = "bytes"
+
+    response["Content-Disposition"] = content_disposition_header(
+        as_attachment, download_name or filename
+    )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(modified)
+
+    # private: never kept by shared caches, the files are patient records
+    if IMMUTABLE_NAME_RE.match(filename):
+        patch_cache_control(
+            response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class _ZipBuffer:
+    """
+    Where zipfile writes a streamed archive: it has no seek() or tell(), so
+    zipfile writes each entry's sizes after its data, and stream_zip() sends
+    whatever was written so far after every chunk.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    """
+    Yield a ZIP archive of `entries`, (name, modified datetime, size, chunks)
+    tuples read one at a time, as it is built: memory stays at about one
+    chunk however many files there are. Entries are stored, not compressed;
+    PDFs, images and Office files are compressed already.
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, modified, size, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=modified.timetuple()[:6])
+            # Lets zipfile add ZIP64 fields for files over 4 GB
+            info.file_size = size
+            with archive.open(info, "w") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+    # The rest of the last entry and the central directory
+    yield buffer.drain()
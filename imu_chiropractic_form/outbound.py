@@ -0,0 +1,290 @@
+"""
+Shared policy for calls to external services (the IMU Azure API, SMTP):
+per-attempt timeouts bounded by a total deadline, retries with jittered
+backoff, and one circuit breaker per upstream that fails fast while the
+service is down. Each upstream keeps latency and breaker metrics.
+
+    azure = get_upstream("azure")
+    data = azure.call(
+        lambda deadline: session.get(url, timeout=deadline.timeout(5, 30))
+    )
+"""
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("userprofile")
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_in):
+        super().__init__(f"Circuit for {name} is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+# -----------------------------
+# Deadline
+# -----------------------------
+class Deadline:
+    """
+    A total time budget shared by every attempt of one logical call.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        if self.expires_at is None:
+            return math.inf
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, connect, read=None):
+        """
+        Socket timeout(s) clamped to the budget left: a (connect, read)
+        tuple for requests, or a single number when `read` is omitted.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline of {self.seconds}s exceeded")
+        if read is None:
+            return min(connect, remaining)
+        return (min(connect, remaining), min(read, remaining))
+
+
+# -----------------------------
+# Circuit breaker
+# -----------------------------
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, calls
+    fail immediately; after `reset_timeout` one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                self.state = self.HALF_OPEN
+                logger.info(f"CIRCUIT HALF-OPEN - upstream={self.name}")
+
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+
+            raise CircuitOpenError(self.name, max(retry_in, 0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"CIRCUIT CLOSED - upstream={self.name}")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def release_trial(self):
+        # The trial call ended without an outcome (e.g. KeyboardInterrupt);
+        # the next caller runs a new one
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning(
+                    f"CIRCUIT OPEN - upstream={self.name} "
+                    f"failures={self.failures} trips={self.trips}"
+                )
+
+
+# -----------------------------
+# Upstream
+# -----------------------------
+class Upstream:
+    """
+    Call policy and metrics for one external service.
+
+    `is_transient(exc)` decides which errors are retried and counted
+    against the circuit; anything else (e.g. a 404) is raised as is.
+    """
+
+    def __init__(
+        self,
+        name,
+        retries=2,
+        deadline=60,
+        failure_threshold=5,
+        reset_timeout=30,
+        base_delay=0.5,
+        max_delay=5,
+        is_transient=None,
+        latency_window=500,
+    ):
+        self.name = name
+        self.retries = retries
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_transient = is_transient or (lambda exc: True)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+        self.calls = 0
+        self.errors = 0
+        self.retried = 0
+        self.rejected = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._metrics_lock = threading.Lock()
+
+    def call(self, func, deadline=None):
+        """
+        Run `func(deadline)` under the policy. `func` must derive its socket
+        timeouts from the Deadline it is given.
+        """
+        if not isinstance(deadline, Deadline):
+            deadline = Deadline(self.deadline if deadline is None else deadline)
+
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                with self._metrics_lock:
+                    self.rejected += 1
+                raise
+
+            started = time.monotonic()
+            try:
+                result = func(deadline)
+            except Exception as exc:
+                transient = isinstance(exc, DeadlineExceeded) or self.is_transient(exc)
+                self._observe(started, failed=True)
+                if not transient:
+                    # The upstream answered; it is not down
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+
+                delay = self._backoff(attempt)
+                if attempt >= self.retries or delay >= deadline.remaining():
+                    raise
+                logger.warning(
+                    f"OUTBOUND RETRY - upstream={self.name} attempt={attempt + 1} "
+                    f"delay={delay:.2f}s error={exc}"
+                )
+                with self._metrics_lock:
+                    self.retried += 1
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release_trial()
+                raise
+
+            self._observe(started, failed=False)
+            self.breaker.record_success()
+            return result
+
+    def _backoff(self, attempt):
+        # Full jitter: concurrent callers do not retry in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _observe(self, started, failed):
+        with self._metrics_lock:
+            self.calls += 1
+            if failed:
+                self.errors += 1
+            self._latencies.append(time.monotonic() - started)
+
+    def snapshot(self):
+        with self._metrics_lock:
+            latencies = sorted(self._latencies)
+            calls, errors = self.calls, self.errors
+            retried, rejected = self.retried, self.rejected
+
+        def percentile(p):
+            if not latencies:
+                return None
+            index = min(int(len(latencies) * p / 100), len(latencies) - 1)
+            return round(latencies[index], 4)
+
+        return {
+            "upstream": self.name,
+            "calls": calls,
+            "errors": errors,
+            "retries": retried,
+            "rejected": rejected,
+            "p50_seconds": percentile(50),
+            "p95_seconds": percentile(95),
+            "max_seconds": round(latencies[-1], 4) if latencies else None,
+            "circuit": self.breaker.state,
+            "trips": self.breaker.trips,
+        }
+
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+def get_upstream(name, **options):
+    """
+    The process-wide Upstream for `name`, created with `options` on first
+    use so the breaker state and metrics are shared by every caller.
+    """
+    with _upstreams_lock:
+        if name not in _upstreams:
+            _upstreams[name] = Upstream(name, **options)
+        return _upstreams[name]
+
+
+def reset_upstreams():
+    with _upstreams_lock:
+        _upstreams.clear()
+
+
+def log_metrics():
+    for upstream in list(_upstreams.values()):
+        snapshot = upstream.snapshot()
+        if not snapshot["calls"] and not snapshot["rejected"]:
+            continue
+        logger.info(
+            "OUTBOUND METRICS | "
+            + " ".join(f"{key}={value}" for key, value in snapshot.items())
+        )
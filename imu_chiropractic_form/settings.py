@@ -45,6 +45,7 @@ ALLOWED_HOSTS = [
 INSTALLED_APPS = [
     "accounts",
     "assessments",
+    "dashboard",
     "rest_framework",  # for API
     "django.contrib.admin",
     "django.contrib.auth",
@@ -141,12 +142,57 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Cache config
+# Local memory cache by default. Point CACHE_BACKEND / CACHE_LOCATION at a
+# shared cache (database, Redis, ...) when running more than one worker.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "imu-chiropractic-form"),
+    }
+}
+
+# Seconds a clinician's pending sign-off worklist stays cached
+WORKLIST_CACHE_TIMEOUT = 300
+# Seconds each admin dashboard widget stays cached
+DASHBOARD_CACHE_TIMEOUT = 60
+
+# Processes used to hash passwords when accounts are created in bulk
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+
 # AZURE API config
 AZURE_FUNCTION_KEY = os.environ["AZURE_FUNCTION_KEY"]
 AZURE_BASE_URL = os.environ["AZURE_BASE_URL"]
+# Parallel by-ID requests and (connect, read) timeouts in seconds
+AZURE_MAX_WORKERS = int(os.getenv("AZURE_MAX_WORKERS", "8"))
+AZURE_CONNECT_TIMEOUT = float(os.getenv("AZURE_CONNECT_TIMEOUT", "5"))
+AZURE_READ_TIMEOUT = float(os.getenv("AZURE_READ_TIMEOUT", "30"))
+# Total seconds one call may take across all its retries, and the retries
+AZURE_DEADLINE = float(os.getenv("AZURE_DEADLINE", "60"))
+AZURE_RETRIES = int(os.getenv("AZURE_RETRIES", "2"))
+# Consecutive failures that open the circuit, and seconds before a trial call
+AZURE_CIRCUIT_THRESHOLD = int(os.getenv("AZURE_CIRCUIT_THRESHOLD", "5"))
+AZURE_CIRCUIT_RESET_TIMEOUT = float(os.getenv("AZURE_CIRCUIT_RESET_TIMEOUT", "30"))
+# Upstream "last updated" field used by the sync commands' --since/--incremental
+AZURE_LAST_UPDATED_FIELD = os.getenv("AZURE_LAST_UPDATED_FIELD", "LASTUPDDTTM")
+
+# Profile change webhook (accounts/api/profile-webhook/). Requests must be
+# signed with this shared secret; the endpoint is disabled while it is empty.
+PROFILE_WEBHOOK_SECRET = os.getenv("PROFILE_WEBHOOK_SECRET", "")
+# Seconds a signed request stays valid, against replays
+PROFILE_WEBHOOK_TOLERANCE = 300
+PROFILE_WEBHOOK_MAX_EVENTS = 1000
+PROFILE_CHANGE_MAX_ATTEMPTS = 5
+# Seconds before events claimed by a worker that died are applied again
+PROFILE_CHANGE_CLAIM_TIMEOUT = 600
 
 # E-mail sending config
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# Set EMAIL_BACKEND to django.core.mail.backends.console.EmailBackend or
+# django.core.mail.backends.filebased.EmailBackend to keep mail local
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_FILE_PATH = os.getenv("EMAIL_FILE_PATH", str(BASE_DIR / "logs" / "emails"))
 
 EMAIL_HOST = "smtp.office365.com"
 EMAIL_PORT = 587
@@ -157,6 +203,21 @@ EMAIL_HOST_PASSWORD = os.environ["EMAIL_HOST_PASSWORD"]
 
 DEFAULT_FROM_EMAIL = os.environ["DEFAULT_FROM_EMAIL"]
 
+# SMTP socket timeout in seconds, and the total budget for connecting or
+# sending one message
+EMAIL_TIMEOUT = int(os.getenv("EMAIL_TIMEOUT", "10"))
+EMAIL_DEADLINE = float(os.getenv("EMAIL_DEADLINE", "30"))
+EMAIL_CIRCUIT_THRESHOLD = int(os.getenv("EMAIL_CIRCUIT_THRESHOLD", "3"))
+EMAIL_CIRCUIT_RESET_TIMEOUT = float(os.getenv("EMAIL_CIRCUIT_RESET_TIMEOUT", "60"))
+
+# Outbox worker (python manage.py send_outbox_emails)
+EMAIL_OUTBOX_RATE_PER_MINUTE = int(os.getenv("EMAIL_OUTBOX_RATE_PER_MINUTE", "30"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# First retry delay in seconds, doubled on every further attempt
+EMAIL_OUTBOX_RETRY_SECONDS = 60
+# Seconds before an email claimed by a worker that died is retried
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 600
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
@@ -173,6 +234,109 @@ if DEBUG:
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+# Served without a login (logos on the login page, anatomy charts). Every
+# other media file goes through assessments.views.AssessmentFileView.
+MEDIA_PUBLIC_DIRS = ("base/", "assessments/anatomy/")
+
+# Where uploaded files are stored: "local" (MEDIA_ROOT) or "s3", any
+# S3-compatible object store through django-storages. Objects stay
+# private: the download view redirects to a signed URL and the browser
+# uploads attachments on one (assessments.direct_uploads), valid for
+# MEDIA_SIGNED_URL_EXPIRY seconds. `python manage.py run_s3_stub` serves a
+# local stand-in bucket.
+MEDIA_STORAGE = os.getenv("MEDIA_STORAGE", "local")
+MEDIA_SIGNED_URL_EXPIRY = int(os.getenv("MEDIA_SIGNED_URL_EXPIRY", "300"))
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+    },
+}
+if MEDIA_STORAGE == "s3":
+    STORAGES["default"] = {
+        "BACKEND": "storages.backends.s3.S3Storage",
+        "OPTIONS": {
+            "bucket_name": os.getenv("S3_BUCKET_NAME"),
+            # Empty for AWS; the server's URL for MinIO, Ceph, R2 and others
+            "endpoint_url": os.getenv("S3_ENDPOINT_URL") or None,
+            "region_name": os.getenv("S3_REGION_NAME") or None,
+            "access_key": os.getenv("S3_ACCESS_KEY_ID"),
+            "secret_key": os.getenv("S3_SECRET_ACCESS_KEY"),
+            # "path" for most stores other than AWS
+            "addressing_style": os.getenv("S3_ADDRESSING_STYLE") or None,
+            # Key prefix, to share a bucket
+            "location": os.getenv("S3_LOCATION", ""),
+            # SigV4 signs the size and checksum of direct uploads
+            "signature_version": "s3v4",
+            "default_acl": None,
+            "querystring_auth": True,
+            "querystring_expire": MEDIA_SIGNED_URL_EXPIRY,
+            "file_overwrite": False,
+        },
+    }
+
+# Who sends a media file once the download view has checked access:
+# "django" (streamed by the app), "x-accel" (nginx, internal location at
+# MEDIA_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT), "x-sendfile"
+# (Apache/lighttpd with mod_xsendfile) or "redirect" (to a signed storage
+# URL; the default with S3). See imu_chiropractic_form.downloads.
+MEDIA_SERVE_MODE = os.getenv(
+    "MEDIA_SERVE_MODE", "redirect" if MEDIA_STORAGE == "s3" else "django"
+)
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv(
+    "MEDIA_ACCEL_REDIRECT_PREFIX", "/protected-media/"
+)
+
+# Hash uploaded files while they are received, for content-addressed
+# attachment storage (assessments.blobs)
+FILE_UPLOAD_HANDLERS = [
+    "assessments.uploads.HashingMemoryFileUploadHandler",
+    "assessments.uploads.HashingTemporaryFileUploadHandler",
+]
+
+# Chunked attachment uploads (assessments.uploads). Partial files are kept
+# outside MEDIA_ROOT so they are never served.
+ATTACHMENT_MAX_UPLOAD_SIZE = int(
+    os.getenv("ATTACHMENT_MAX_UPLOAD_SIZE", 200 * 1024 * 1024)
+)
+ATTACHMENT_UPLOAD_CHUNK_SIZE = int(
+    os.getenv("ATTACHMENT_UPLOAD_CHUNK_SIZE", 5 * 1024 * 1024)
+)
+ATTACHMENT_UPLOAD_TEMP_DIR = os.getenv(
+    "ATTACHMENT_UPLOAD_TEMP_DIR", str(BASE_DIR / "upload_parts")
+)
+# Hours before an unfinished upload is removed by clean_attachment_uploads
+ATTACHMENT_UPLOAD_EXPIRY_HOURS = 24
+# Seconds a chunk request may take before another request can write to the
+# same upload (only reached if the first worker died mid-chunk)
+ATTACHMENT_UPLOAD_CHUNK_LEASE_SECONDS = 300
+
+# Attachment photos normalized after upload (assessments.normalize): EXIF
+# orientation applied, metadata dropped, longest side capped at this many
+# pixels (0: never downscaled) and re-encoded at this quality, on background
+# threads. With ATTACHMENT_IMAGE_WORKERS=0 only normalize_attachments runs.
+# ATTACHMENT_KEEP_ORIGINAL_IMAGES=1 keeps each photo as uploaded too.
+ATTACHMENT_IMAGE_MAX_DIMENSION = int(os.getenv("ATTACHMENT_IMAGE_MAX_DIMENSION", "2560"))
+ATTACHMENT_IMAGE_QUALITY = 85
+ATTACHMENT_IMAGE_WORKERS = int(os.getenv("ATTACHMENT_IMAGE_WORKERS", "2"))
+ATTACHMENT_KEEP_ORIGINAL_IMAGES = os.getenv("ATTACHMENT_KEEP_ORIGINAL_IMAGES") == "1"
+
+# Thumbnails and previews of uploaded images (assessments.derivatives):
+# longest side in pixels per kind, WEBP or JPEG, and background threads.
+# With MEDIA_DERIVATIVE_WORKERS=0 only generate_media_derivatives renders.
+MEDIA_DERIVATIVE_SIZES = {"thumbnail": 256, "preview": 1280}
+MEDIA_DERIVATIVE_FORMAT = os.getenv("MEDIA_DERIVATIVE_FORMAT", "WEBP")
+MEDIA_DERIVATIVE_QUALITY = 80
+MEDIA_DERIVATIVE_WORKERS = int(os.getenv("MEDIA_DERIVATIVE_WORKERS", "2"))
+
+# Signature and ROM drawing canvases (assessments.drawings): largest upload,
+# longest side kept, and palette size of the stored PNG
+DRAWING_MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+DRAWING_MAX_DIMENSION = 2000
+DRAWING_PNG_COLORS = {"signature": 16, "rom_drawing": 64}
+# Seconds a drawing rendered from strokes (assessments.strokes) stays cached
+DRAWING_RENDER_CACHE_TIMEOUT = 24 * 60 * 60
 
 STATIC_URL = "static/"
 
@@ -185,7 +349,7 @@ LOGIN_EXEMPT_URLS = (
     r"^api/*",
     r"^v\d/api/*",
     r"^accounts/api/*",
-    r"^media/",
+    r"^media/base/",
     r"^dashboard/",
     r"^reset-password/",
     r"^reset-password(?:/.*)?$",
@@ -1,3 +1,5 @@
+import os
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
@@ -13,6 +15,7 @@ urlpatterns = [
     ),
     path("accounts/", include("accounts.urls")),
     path("assessments/", include("assessments.urls")),
+    path("dashboard/", include("dashboard.urls")),
     path("login/", views.LoginView.as_view(), name="login"),
     path("change-password/", views.ChangePasswordView.as_view(), name="change_password"),
     path(
@@ -29,4 +32,10 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Only the public assets; assessment files are served by
+    # assessments.views.AssessmentFileView after a permission check
+    for public_dir in settings.MEDIA_PUBLIC_DIRS:
+        urlpatterns += static(
+            settings.MEDIA_URL + public_dir,
+            document_root=os.path.join(settings.MEDIA_ROOT, public_dir),
+        )
@@ -0,0 +1,507 @@
+"""
+Local stand-in for an S3-compatible object store, used by the tests of
+MEDIA_STORAGE = "s3" (django-storages and the browser's direct uploads)
+and by `python manage.py run_s3_stub` for manual testing without a real
+bucket.
+
+    with S3StubServer() as stub:
+        with override_settings(
+            MEDIA_STORAGE="s3",
+            MEDIA_SERVE_MODE="redirect",
+            STORAGES={**settings.STORAGES, "default": stub.storage_settings()},
+        ):
+            ...
+
+Objects are kept in memory. Path-style requests (/bucket/key) only; any
+bucket name is accepted. Signatures are not checked, but expired signed
+URLs are refused and uploaded bodies are checked against their
+x-amz-checksum-sha256 and Content-MD5, as S3 does. Enough of the API is
+served for django-storages: objects (with ranges), listings and
+multipart uploads. CORS is open, so a browser page on any origin can PUT.
+"""
+import base64
+import hashlib
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+from xml.etree import ElementTree
+
+from imu_chiropractic_form.downloads import RangeNotSatisfiable, parse_range
+
+S3_XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+LIST_MAX_KEYS = 1000
+
+
+class _StoredObject:
+    def __init__(self, data, content_type, checksum_sha256=None):
+        self.data = data
+        self.content_type = content_type or "binary/octet-stream"
+        self.etag = f'"{hashlib.md5(data).hexdigest()}"'
+        # S3 only keeps a checksum the uploader asked for
+        self.checksum_sha256 = checksum_sha256
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _xml(root_tag, children):
+    """
+    An S3 response document. `children` is a list of (tag, text or list of
+    children) pairs.
+    """
+
+    def add(parent, items):
+        for tag, value in items:
+            element = ElementTree.SubElement(parent, tag)
+            if isinstance(value, list):
+                add(element, value)
+            else:
+                element.text = str(value)
+
+    root = ElementTree.Element(root_tag, xmlns=S3_XMLNS)
+    add(root, children)
+    return b'<?xml version="1.0" encoding="UTF-8"?>' + ElementTree.tostring(root)
+
+
+def _iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _decode_aws_chunked(body):
+    """
+    The payload and trailing headers of a streaming (aws-chunked) upload.
+    """
+    data = []
+    trailers = {}
+    position = 0
+    while True:
+        line_end = body.index(b"\r\n", position)
+        size = int(body[position:line_end].split(b";")[0], 16)
+        position = line_end + 2
+        if size == 0:
+            break
+        data.append(body[position : position + size])
+        position += size + 2
+
+    for line in body[position:].split(b"\r\n"):
+        if b":" in line:
+            name, value = line.decode().split(":", 1)
+            trailers[name.strip().lower()] = value.strip()
+    return b"".join(data), trailers
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    # -----------------------------
+    # Request parsing
+    # -----------------------------
+    def _parse(self):
+        url = urlparse(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(url.query, True).items()}
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        self.bucket = unquote(bucket)
+        self.key = unquote(key)
+
+    def _expired(self):
+        # SigV4 (X-Amz-Date + X-Amz-Expires) or SigV2 (Expires) signed URLs
+        if "X-Amz-Date" in self.query:
+            signed_at = datetime.strptime(
+                self.query["X-Amz-Date"], "%Y%m%dT%H%M%SZ"
+            ).replace(tzinfo=timezone.utc)
+            expires = int(self.query.get("X-Amz-Expires", "604800"))
+            return datetime.now(timezone.utc) > signed_at + timedelta(seconds=expires)
+        if "Expires" in self.query:
+            return datetime.now(timezone.utc).timestamp() > int(self.query["Expires"])
+        return False
+
+    def _read_body(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        streaming = headers.get("x-amz-content-sha256", "").startswith("STREAMING-")
+        if streaming or "aws-chunked" in headers.get("content-encoding", ""):
+            body, trailers = _decode_aws_chunked(body)
+            headers.update(trailers)
+        return body, headers
+
+    def _check_body(self, body, headers):
+        """
+        The SHA-256 checksum to keep for the body (or None), or False once a
+        BadDigest error has been sent.
+        """
+        checksum = headers.get("x-amz-checksum-sha256") or self.query.get(
+            "x-amz-checksum-sha256"
+        )
+        if checksum and checksum != base64.b64encode(
+            hashlib.sha256(body).digest()
+        ).decode():
+            self._send_error(
+                400, "BadDigest", "The SHA256 you specified did not match the calculated checksum."
+            )
+            return False
+
+        md5 = headers.get("content-md5")
+        if md5 and md5 != base64.b64encode(hashlib.md5(body).digest()).decode():
+            self._send_error(
+                400, "BadDigest", "The Content-MD5 you specified did not match what we received."
+            )
+            return False
+        return checksum
+
+    def _begin(self):
+        self._parse()
+        if not self.bucket:
+            self._send_error(400, "InvalidRequest", "Path-style requests only.")
+            return False
+        if self._expired():
+            self._send_error(403, "AccessDenied", "Request has expired")
+            return False
+        return True
+
+    # -----------------------------
+    # Responses
+    # -----------------------------
+    def _cors_headers(self):
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header(
+            "Access-Control-Allow-Methods", "GET, HEAD, PUT, POST, DELETE"
+        )
+        self.send_header(
+            "Access-Control-Allow-Headers",
+            self.headers.get("Access-Control-Request-Headers", "*"),
+        )
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+
+    def _send(self, status_code, body=b"", headers=None, send_body=True):
+        self.send_response(status_code)
+        self._cors_headers()
+        self.send_header("x-amz-request-id", uuid.uuid4().hex[:16].upper())
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _send_error(self, status_code, code, message):
+        body = _xml(
+            "Error",
+            [("Code", code), ("Message", message), ("Resource", self.path)],
+        )
+        # HEAD responses carry no body, so boto3 reads the status alone
+        self._send(
+            status_code,
+            body,
+            {"Content-Type": "application/xml"},
+            send_body=self.command != "HEAD",
+        )
+
+    def _get_object(self):
+        with self.server.lock:
+            return self.server.objects.get((self.bucket, self.key))
+
+    # -----------------------------
+    # Methods
+    # -----------------------------
+    def do_OPTIONS(self):
+        # CORS preflight from a browser's direct upload
+        self._send(200)
+
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        if not self._begin():
+            return
+        if not self.key:
+            self._list_objects()
+            return
+
+        stored = self._get_object()
+        if stored is None:
+            self._send_error(404, "NoSuchKey", "The specified key does not exist.")
+            return
+
+        size = len(stored.data)
+        headers = {
+            "Content-Type": self.query.get("response-content-type", stored.content_type),
+            "ETag": stored.etag,
+            "Last-Modified": format_datetime(stored.last_modified, usegmt=True),
+            "Accept-Ranges": "bytes",
+        }
+        if "response-content-disposition" in self.query:
+            headers["Content-Disposition"] = self.query["response-content-disposition"]
+
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            self._send_error(416, "InvalidRange", "The requested range is not satisfiable")
+            return
+
+        if byte_range is None:
+            status_code, body = 200, stored.data
+            checksum_mode = self.headers.get("x-amz-checksum-mode", "").upper()
+            if checksum_mode == "ENABLED" and stored.checksum_sha256:
+                headers["x-amz-checksum-sha256"] = stored.checksum_sha256
+                headers["x-amz-checksum-type"] = "FULL_OBJECT"
+        else:
+            start, end = byte_range
+            status_code, body = 206, stored.data[start : end + 1]
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        self._send(status_code, body, headers, send_body=send_body)
+
+    def do_PUT(self):
+        if not self._begin():
+            return
+        body, headers = self._read_body()
+        if not self.key:
+            # CreateBucket: every bucket already exists
+            self._send(200)
+            return
+
+        checksum = self._check_body(body, headers)
+        if checksum is False:
+            return
+
+        if "uploadId" in self.query:
+            self._upload_part(body)
+            return
+
+        stored = _StoredObject(body, headers.get("content-type"), checksum or None)
+        with self.server.lock:
+            self.server.objects[(self.bucket, self.key)] = stored
+        response_headers = {"ETag": stored.etag}
+        if checksum:
+            response_headers["x-amz-checksum-sha256"] = checksum
+        self._send(200, headers=response_headers)
+
+    def do_POST(self):
+        if not self._begin():
+            return
+        body, headers = self._read_body()
+        if "uploads" in self.query:
+            self._create_multipart_upload(headers)
+        elif "uploadId" in self.query:
+            self._complete_multipart_upload()
+        else:
+            self._send_error(501, "NotImplemented", "Not served by the stub.")
+
+    def do_DELETE(self):
+        if not self._begin():
+            return
+        with self.server.lock:
+            if "uploadId" in self.query:
+                self.server.multipart.pop(self.query["uploadId"], None)
+            else:
+                self.server.objects.pop((self.bucket, self.key), None)
+        self._send(204)
+
+    # -----------------------------
+    # Listing
+    # -----------------------------
+    def _list_objects(self):
+        prefix = self.query.get("prefix", "")
+        delimiter = self.query.get("delimiter", "")
+        max_keys = min(int(self.query.get("max-keys", LIST_MAX_KEYS)), LIST_MAX_KEYS)
+        # ListObjectsV2, or the original ListObjects (django-storages' listdir)
+        v2 = self.query.get("list-type") == "2"
+        if v2:
+            after = self.query.get("continuation-token") or self.query.get(
+                "start-after", ""
+            )
+        else:
+            after = self.query.get("marker", "")
+        url_encoded = self.query.get("encoding-type") == "url"
+
+        def encode(value):
+            return quote(value, safe="/") if url_encoded else value
+
+        with self.server.lock:
+            keys = sorted(
+                (key, stored)
+                for (bucket, key), stored in self.server.objects.items()
+                if bucket == self.bucket and key.startswith(prefix) and key > after
+            )
+
+        contents = []
+        common_prefixes = []
+        seen_prefixes = set()
+        last_key = None
+        truncated = False
+        for key, stored in keys:
+            if len(contents) + len(common_prefixes) >= max_keys:
+                truncated = True
+                break
+            rest = key[len(prefix) :]
+            if delimiter and delimiter in rest:
+                common = prefix + rest.split(delimiter, 1)[0] + delimiter
+                if common not in seen_prefixes:
+                    seen_prefixes.add(common)
+                    common_prefixes.append(("CommonPrefixes", [("Prefix", encode(common))]))
+            else:
+                contents.append(
+                    (
+                        "Contents",
+                        [
+                            ("Key", encode(key)),
+                            ("LastModified", _iso(stored.last_modified)),
+                            ("ETag", stored.etag),
+                            ("Size", len(stored.data)),
+                            ("StorageClass", "STANDARD"),
+                        ],
+                    )
+                )
+            last_key = key
+
+        children = [("Name", self.bucket), ("Prefix", encode(prefix))]
+        if v2:
+            children.append(("KeyCount", len(contents) + len(common_prefixes)))
+        else:
+            children.append(("Marker", encode(after)))
+        children += [
+            ("MaxKeys", max_keys),
+            ("IsTruncated", "true" if truncated else "false"),
+        ]
+        if delimiter:
+            children.append(("Delimiter", encode(delimiter)))
+        if url_encoded:
+            children.append(("EncodingType", "url"))
+        if truncated:
+            # Skips the rest of a common prefix already listed
+            token = last_key
+            if delimiter and delimiter in last_key[len(prefix) :]:
+                token = prefix + last_key[len(prefix) :].split(delimiter, 1)[0]
+                token += delimiter + "\U0010ffff"
+            if v2:
+                children.append(("NextContinuationToken", token))
+            else:
+                children.append(("NextMarker", encode(token)))
+        self._send(
+            200,
+            _xml("ListBucketResult", children + contents + common_prefixes),
+            {"Content-Type": "application/xml"},
+        )
+
+    # -----------------------------
+    # Multipart uploads
+    # -----------------------------
+    def _create_multipart_upload(self, headers):
+        upload_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.multipart[upload_id] = {
+                "content_type": headers.get("content-type"),
+                "parts": {},
+            }
+        self._send(
+            200,
+            _xml(
+                "InitiateMultipartUploadResult",
+                [("Bucket", self.bucket), ("Key", self.key), ("UploadId", upload_id)],
+            ),
+            {"Content-Type": "application/xml"},
+        )
+
+    def _upload_part(self, body):
+        with self.server.lock:
+            upload = self.server.multipart.get(self.query["uploadId"])
+            if upload is not None:
+                upload["parts"][int(self.query.get("partNumber", 1))] = body
+        if upload is None:
+            self._send_error(404, "NoSuchUpload", "The specified upload does not exist.")
+            return
+        self._send(200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+
+    def _complete_multipart_upload(self):
+        with self.server.lock:
+            upload = self.server.multipart.pop(self.query["uploadId"], None)
+            if upload is not None:
+                parts = upload["parts"]
+                data = b"".join(parts[number] for number in sorted(parts))
+                stored = _StoredObject(data, upload["content_type"])
+                self.server.objects[(self.bucket, self.key)] = stored
+        if upload is None:
+            self._send_error(404, "NoSuchUpload", "The specified upload does not exist.")
+            return
+        self._send(
+            200,
+            _xml(
+                "CompleteMultipartUploadResult",
+                [
+                    ("Location", f"/{self.bucket}/{quote(self.key)}"),
+                    ("Bucket", self.bucket),
+                    ("Key", self.key),
+                    ("ETag", stored.etag),
+                ],
+            ),
+            {"Content-Type": "application/xml"},
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+class S3StubServer:
+    def __init__(self, bucket="media", host="127.0.0.1", port=0):
+        self.bucket = bucket
+        self.httpd = ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpd.daemon_threads = True
+        # (bucket, key) -> _StoredObject, and upload ID -> parts
+        self.httpd.objects = {}
+        self.httpd.multipart = {}
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def objects(self):
+        with self.httpd.lock:
+            return {
+                key: stored.data
+                for (bucket, key), stored in self.httpd.objects.items()
+                if bucket == self.bucket
+            }
+
+    def storage_settings(self):
+        """
+        A STORAGES entry for django-storages pointed at the stub.
+        """
+        return {
+            "BACKEND": "storages.backends.s3.S3Storage",
+            "OPTIONS": {
+                "bucket_name": self.bucket,
+                "endpoint_url": self.url,
+                "region_name": "us-east-1",
+                "access_key": "stub",
+                "secret_key": "stub",
+                "addressing_style": "path",
+                "signature_version": "s3v4",
+                "default_acl": None,
+                "querystring_auth": True,
+                "file_overwrite": False,
+            },
+        }
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.httpd.serve_forever, name="s3-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()